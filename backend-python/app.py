@@ -1,12 +1,9 @@
 import os
 
-from flask import Flask, send_from_directory
+from flask import Flask
 
 import config
 
-# Path to the frontend SPA directory (sibling of backend-python)
-FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend")
-
 
 def create_app(url_prefix: str = ""):
     """Create the DocEditor Flask app.
@@ -19,9 +16,10 @@ def create_app(url_prefix: str = ""):
     app.config["MAX_CONTENT_LENGTH"] = config.MAX_UPLOAD_SIZE
 
     # Initialize database
-    from models.database import init_db
+    from models.database import init_db, remove_session
     from models import db_models  # noqa: F401 - ensure models are registered
     init_db(config.DATABASE_URL)
+    app.teardown_appcontext(remove_session)
 
     prefix = url_prefix or config.URL_PREFIX
 
@@ -30,44 +28,44 @@ def create_app(url_prefix: str = ""):
     from routes.image_routes import image_bp
     from routes.version_routes import version_bp
     from routes.annotation_routes import annotation_bp
+    from routes.search_routes import search_bp
+    from routes.metrics_routes import metrics_bp
+    from routes.errors import errors_bp
 
+    app.register_blueprint(errors_bp)
     app.register_blueprint(files_bp, url_prefix=prefix)
     app.register_blueprint(pdf_bp, url_prefix=prefix)
     app.register_blueprint(image_bp, url_prefix=prefix)
     app.register_blueprint(version_bp, url_prefix=prefix)
     app.register_blueprint(annotation_bp, url_prefix=prefix)
+    app.register_blueprint(search_bp, url_prefix=prefix)
+    app.register_blueprint(metrics_bp, url_prefix=prefix)
+    if config.PROFILE_TOKEN:
+        from routes.profiling_routes import profiling_bp
+        app.register_blueprint(profiling_bp, url_prefix=prefix)
 
-    # Serve the SPA frontend
-    @app.route("/")
-    def serve_index():
-        return send_from_directory(FRONTEND_DIR, "index.html")
-
-    @app.route("/<path:path>")
-    def serve_frontend(path):
-        # Serve frontend files (js/, css/, etc.)
-        full_path = os.path.join(FRONTEND_DIR, path)
-        if os.path.isfile(full_path):
-            return send_from_directory(FRONTEND_DIR, path)
-        # Only serve index.html for navigational routes, not missing assets
-        if path.endswith((".js", ".css", ".map", ".png", ".jpg", ".ico")):
-            return "Not found", 404
-        # Fallback to index.html for SPA routing (e.g. old /view/... bookmarks)
-        return send_from_directory(FRONTEND_DIR, "index.html")
+    # Serve the SPA frontend (hashed, pre-compressed assets from memory)
+    from routes.frontend import frontend_bp
+    app.register_blueprint(frontend_bp)
 
     # Optional CORS headers for cross-origin frontend hosting
     @app.after_request
     def add_cors_headers(response):
         response.headers["Access-Control-Allow-Origin"] = "*"
-        response.headers["Access-Control-Allow-Methods"] = "GET, POST, DELETE, OPTIONS"
-        response.headers["Access-Control-Allow-Headers"] = "Content-Type"
+        response.headers["Access-Control-Allow-Methods"] = "GET, POST, PATCH, DELETE, OPTIONS"
+        response.headers["Access-Control-Allow-Headers"] = "Content-Type, Upload-Offset, Range"
+        response.headers["Access-Control-Expose-Headers"] = (
+            "X-Next-Cursor, Retry-After, Accept-Ranges, Content-Range, Content-Length")
         return response
 
     return app
 
 
-def register_blueprints(app: Flask, url_prefix: str = "/doceditor"):
+def register_blueprints(app: Flask, url_prefix: str = "/doceditor", serve_frontend: bool = False):
     """Register DocEditor blueprints into an existing Flask app.
 
+    With serve_frontend=True the SPA is served under url_prefix as well.
+
     Usage in another project:
         import sys
         sys.path.insert(0, "path/to/doceditor/backend-python")
@@ -77,17 +75,34 @@ def register_blueprints(app: Flask, url_prefix: str = "/doceditor"):
     import sys
     sys.path.insert(0, os.path.dirname(__file__))
 
+    from models import database
+    from models import db_models  # noqa: F401 - ensure models are registered
     from routes.files import files_bp
     from routes.pdf_routes import pdf_bp
     from routes.image_routes import image_bp
     from routes.version_routes import version_bp
     from routes.annotation_routes import annotation_bp
+    from routes.search_routes import search_bp
+    from routes.metrics_routes import metrics_bp
+    from routes.errors import errors_bp
 
+    app.register_blueprint(errors_bp)
     app.register_blueprint(files_bp, url_prefix=url_prefix)
     app.register_blueprint(pdf_bp, url_prefix=url_prefix)
     app.register_blueprint(image_bp, url_prefix=url_prefix)
     app.register_blueprint(version_bp, url_prefix=url_prefix)
     app.register_blueprint(annotation_bp, url_prefix=url_prefix)
+    app.register_blueprint(search_bp, url_prefix=url_prefix)
+    app.register_blueprint(metrics_bp, url_prefix=url_prefix)
+    if config.PROFILE_TOKEN:
+        from routes.profiling_routes import profiling_bp
+        app.register_blueprint(profiling_bp, url_prefix=url_prefix)
+    if serve_frontend:
+        from routes.frontend import frontend_bp
+        app.register_blueprint(frontend_bp, url_prefix=url_prefix)
+    if database.engine is None:
+        database.init_db(config.DATABASE_URL)
+    app.teardown_appcontext(database.remove_session)
 
 
 if __name__ == "__main__":
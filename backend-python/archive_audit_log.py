@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""Move aged audit log entries into compressed archive segments.
+
+Run periodically (e.g. nightly via cron) from the backend-python directory:
+    python archive_audit_log.py [--days N]
+
+Entries older than N days (default: DOCEDITOR_AUDIT_RETENTION_DAYS) are
+written to gzip-compressed JSONL segments in storage/audit_archive/ and
+removed from the audit_log table. /api/audit-log keeps returning them.
+Safe to re-run after an interruption.
+"""
+
+import argparse
+import os
+import sys
+from datetime import timedelta
+
+# Ensure backend-python is on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from models.database import init_db
+from models import db_models  # noqa: F401 - ensure models are registered
+from models.audit_archive import AuditArchive
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, default=config.AUDIT_RETENTION_DAYS,
+                        help="archive entries older than this many days")
+    args = parser.parse_args()
+
+    init_db(config.DATABASE_URL)
+    result = AuditArchive.archive(timedelta(days=args.days))
+    print(f"Archived {result['entries']} entr(y/ies) into {result['segments']} segment(s)")
+
+
+if __name__ == "__main__":
+    main()
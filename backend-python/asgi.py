@@ -0,0 +1,39 @@
+"""ASGI entry point.
+
+    pip install asgiref uvicorn
+    uvicorn asgi:app --workers 4
+
+asgiref's WsgiToAsgi runs every request of a process on one shared thread
+(``thread_sensitive=True``), so a slow request would hold up all others.
+Here each request gets a thread from a pool of ASGI_THREADS
+(DOCEDITOR_ASGI_THREADS) instead. CPU-heavy processor calls (enhance, export,
+merge, photo-to-pdf, page/image edits) are shipped to the shared process pool
+in models.cpu_pool, so request threads mostly wait on I/O and cheap endpoints
+keep answering while heavy jobs run.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+
+import config
+from app import create_app
+
+_executor = ThreadPoolExecutor(config.ASGI_THREADS, thread_name_prefix="asgi")
+
+
+class _PooledInstance(WsgiToAsgiInstance):
+    # The same WSGI call, without asgiref's single shared thread
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__["run_wsgi_app"].func,
+                                 thread_sensitive=False, executor=_executor)
+
+
+class PooledWsgiToAsgi(WsgiToAsgi):
+    """WsgiToAsgi with one pool thread per request instead of one thread per process."""
+
+    async def __call__(self, scope, receive, send):
+        await _PooledInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+flask_app = create_app()
+app = PooledWsgiToAsgi(flask_app)
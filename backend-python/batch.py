@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""Run bulk jobs directly on storage and database, without the web server.
+
+Run from the backend-python directory:
+    python batch.py [--workers N] [--user NAME] [--journal FILE] [--fresh]
+                    [--report FILE] COMMAND ...
+
+Commands:
+    import PATH...                  upload files (directories recursively, .zip per entry)
+    enhance ID... | @FILE | --all   enhance scanned PDFs (--no-deskew, --threshold, ...)
+    optimize ID... | @FILE | --all  compact PDFs (--dpi N downsamples images)
+    photo-to-pdf DIR...             one PDF per directory of photos, named after it
+    merge FILE                      one PDF per line of FILE: "[name.pdf:] id id ..."
+
+Everything goes through FileManager, so files, versions, search index and
+audit log end up as if the API had been used (as user --user, default
+"batch"); @FILE reads one file id per line. Items run on --workers threads
+over a CPU pool of the same size (default: all cores), with the
+per-operation limits of the web workers lifted; the memory budget
+(DOCEDITOR_ADMISSION_MEMORY_MB) still applies. Every finished item is
+appended to the journal (default batch-<command>.jsonl): running the same
+command again skips the items already done and retries the failed ones,
+--fresh starts over. A ZIP with rejected entries is journaled as partial:
+it counts as failed, but is not imported again (that would duplicate the
+entries that made it). Exits with status 1 if an item failed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Ensure backend-python is on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from models import db_models  # noqa: F401 - ensure models are registered
+from models.audit_logger import AuditLogger
+from models.database import get_session, init_db, remove_session
+from models.db_models import File
+from models.file_manager import FileManager
+
+ENHANCE_FLAGS = ("deskew", "sharpen", "contrast", "threshold")
+
+
+class PartialFailure(Exception):
+    """Raised by a handler when only part of an item failed; ``result`` is what was done."""
+
+    def __init__(self, message: str, result: dict):
+        super().__init__(message)
+        self.result = result
+
+
+def _ext(name: str) -> str:
+    return name.rsplit(".", 1)[-1].lower() if "." in name else ""
+
+
+def _walk(paths: list[str]) -> list[str]:
+    """Absolute paths of the files given, with supported files found in directories."""
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            files += [os.path.join(root, name) for name in sorted(names)
+                      if not name.startswith(".") and (_ext(name) in config.ALL_ALLOWED or _ext(name) == "zip")]
+    return [os.path.abspath(f) for f in files]
+
+
+def _file_ids(args) -> list[str]:
+    if args.all:
+        session = get_session()
+        ids = [fid for (fid,) in session.query(File.file_id).filter(File.file_type == "pdf")
+               .order_by(File.created_at)]
+        session.close()
+        return ids
+    ids = []
+    for arg in args.ids:
+        if arg.startswith("@"):
+            with open(arg[1:], encoding="utf-8") as fh:
+                ids += [line.strip() for line in fh if line.strip()]
+        else:
+            ids.append(arg)
+    return list(dict.fromkeys(ids))
+
+
+def _packets(path: str) -> list[str]:
+    with open(path, encoding="utf-8") as fh:
+        return [line.strip() for line in fh if line.strip() and not line.startswith("#")]
+
+
+# --- Item handlers: take an item and the arguments, return a JSON-able result ---
+
+def import_file(path: str, args) -> dict:
+    with open(path, "rb") as fh:
+        if _ext(path) == "zip":
+            results = FileManager.upload_zip(fh, args.user)
+            result = {
+                "file_ids": [r["file"]["file_id"] for r in results if r["status"] == 201],
+                "failed": {r["name"]: r["error"] for r in results if r["status"] != 201},
+            }
+            if result["failed"]:
+                raise PartialFailure(f"{len(result['failed'])} of {len(results)} entries failed: "
+                                     + "; ".join(f"{n}: {e}" for n, e in result["failed"].items()), result)
+            return result
+        return {"file_id": FileManager.upload(os.path.basename(path), fh, args.user)["file_id"]}
+
+
+def enhance(file_id: str, args) -> dict:
+    FileManager.pdf_enhance(file_id, args.enhance, args.user)
+    return {}
+
+
+def optimize(file_id: str, args) -> dict:
+    return FileManager.pdf_optimize(file_id, args.dpi, args.jpeg_quality, args.user)
+
+
+def photo_to_pdf(directory: str, args) -> dict:
+    names = sorted(n for n in os.listdir(directory)
+                   if not n.startswith(".") and _ext(n) in config.ALLOWED_EXTENSIONS["image"])
+    if not names:
+        raise ValueError("No images in directory")
+    # Like the photo-to-PDF dialog: the photos become files, then the PDF is built from them
+    photo_ids = []
+    for name in names:
+        with open(os.path.join(directory, name), "rb") as fh:
+            photo_ids.append(FileManager.upload(name, fh, args.user)["file_id"])
+    meta = FileManager.images_to_pdf(photo_ids, args.enhance, args.user,
+                                     name=f"{os.path.basename(directory.rstrip(os.sep))}.pdf")
+    return {"file_id": meta["file_id"], "photos": photo_ids}
+
+
+def merge(line: str, args) -> dict:
+    name, sep, ids = line.partition(":")
+    if not sep:
+        name, ids = "merged.pdf", line
+    file_ids = ids.replace(",", " ").split()
+    if len(file_ids) < 2:
+        raise ValueError("A packet needs at least two file ids")
+    return {"file_id": FileManager.pdf_merge(file_ids, args.user, name=name.strip())["file_id"]}
+
+
+def _unthrottle(workers: int):
+    """This process is the pool's only client: size it to ``workers`` and lift the per-operation caps."""
+    config.CPU_POOL_WORKERS = workers
+    config.CPU_OPERATION_LIMITS = dict.fromkeys(config.CPU_OPERATION_LIMITS, workers)
+    config.ADMISSION_QUEUE_SIZE = workers
+    # Jobs waiting for the memory budget wait, instead of failing after 30 s
+    config.ADMISSION_QUEUE_TIMEOUT = 24 * 3600
+
+
+def _load_journal(path: str) -> set[str]:
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # last line cut off by a crash
+            if record["status"] in ("done", "partial"):
+                done.add(record["item"])
+    return done
+
+
+def run(items: list[str], handler, args) -> dict:
+    """Process ``items`` not done yet in parallel, journaling each; returns the summary."""
+    if args.fresh and os.path.exists(args.journal):
+        os.remove(args.journal)
+    done = _load_journal(args.journal)
+    todo = [item for item in dict.fromkeys(items) if item not in done]
+    print(f"{len(items)} item(s), {len(items) - len(todo)} already done, "
+          f"{len(todo)} to process on {args.workers} worker(s)")
+
+    lock = threading.Lock()
+    records, failures = [], []
+    started = time.monotonic()
+
+    def process(item: str):
+        t = time.monotonic()
+        record = {"item": item}
+        try:
+            record.update(status="done", result=handler(item, args))
+        except PartialFailure as e:
+            record.update(status="partial", result=e.result, error=str(e))
+        except Exception as e:
+            record.update(status="failed", error=f"{type(e).__name__}: {e}")
+        finally:
+            remove_session()
+        record["seconds"] = round(time.monotonic() - t, 3)
+        with lock:
+            journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+            journal.flush()
+            records.append(record)
+            if record["status"] != "done":
+                failures.append(record)
+                print(f"  {item}: {record['error']}")
+            n = len(records)
+            if n % 10 == 0 or n == len(todo):
+                print(f"  {n}/{len(todo)} … {n / (time.monotonic() - started):.2f} item(s)/s", flush=True)
+
+    with open(args.journal, "a", encoding="utf-8") as journal:
+        pool = ThreadPoolExecutor(args.workers)
+        try:
+            for _ in pool.map(process, todo):
+                pass
+        except KeyboardInterrupt:
+            print("Interrupted: finishing the running items; run again to continue")
+            pool.shutdown(cancel_futures=True)
+            raise
+        pool.shutdown()
+    AuditLogger.flush()
+
+    seconds = time.monotonic() - started
+    return {
+        "command": args.command,
+        "items": len(items),
+        "skipped": len(items) - len(todo),
+        "done": len(records) - len(failures),
+        "partial": sum(r["status"] == "partial" for r in failures),
+        "failed": sum(r["status"] == "failed" for r in failures),
+        "seconds": round(seconds, 3),
+        "items_per_second": round(len(records) / seconds, 3) if seconds > 0 else None,
+        "failures": [{"item": r["item"], "status": r["status"], "error": r["error"]} for r in failures],
+        "results": records,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="items processed in parallel and CPU pool size (default: all cores)")
+    parser.add_argument("--user", default="batch", help="user recorded in the audit log and history")
+    parser.add_argument("--journal", default="", help="progress journal (default batch-<command>.jsonl)")
+    parser.add_argument("--fresh", action="store_true", help="ignore an existing journal and start over")
+    parser.add_argument("--report", default="", help="write the summary with per-item results as JSON")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("import", help="upload files and directories")
+    p.add_argument("paths", nargs="+")
+    p.set_defaults(handler=import_file, items=lambda a: _walk(a.paths))
+
+    for name, handler, help_text in (("enhance", enhance, "enhance scanned PDFs"),
+                                     ("optimize", optimize, "compact PDFs")):
+        p = commands.add_parser(name, help=help_text)
+        p.add_argument("ids", nargs="*", help="file ids, or @FILE with one id per line")
+        p.add_argument("--all", action="store_true", help="every PDF")
+        p.set_defaults(handler=handler, items=_file_ids)
+        if name == "optimize":
+            p.add_argument("--dpi", type=int, default=None, help="downsample images above this resolution")
+            p.add_argument("--jpeg-quality", type=int, default=85)
+
+    p = commands.add_parser("photo-to-pdf", help="one PDF per directory of photos")
+    p.add_argument("dirs", nargs="+")
+    p.set_defaults(handler=photo_to_pdf, items=lambda a: [os.path.abspath(d) for d in a.dirs])
+
+    for p in (commands.choices["enhance"], commands.choices["photo-to-pdf"]):
+        for flag in ENHANCE_FLAGS:
+            p.add_argument(f"--{flag}", action=argparse.BooleanOptionalAction, default=None,
+                           help=f"{flag} step (default as in the editor)")
+
+    p = commands.add_parser("merge", help="merge packets of PDFs")
+    p.add_argument("packets", help='file with one packet per line: "[name.pdf:] id id ..."')
+    p.set_defaults(handler=merge, items=lambda a: _packets(a.packets))
+
+    args = parser.parse_args()
+    if args.command in ("enhance", "optimize") and not (args.ids or args.all):
+        parser.error("give file ids, @FILE or --all")
+    args.enhance = {flag: getattr(args, flag) for flag in ENHANCE_FLAGS
+                    if getattr(args, flag, None) is not None}
+    args.journal = args.journal or f"batch-{args.command}.jsonl"
+    args.workers = max(1, args.workers)
+
+    init_db(config.DATABASE_URL)
+    _unthrottle(args.workers)
+    try:
+        summary = run(args.items(args), args.handler, args)
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+    print(f"Done: {summary['done']}, partial: {summary['partial']}, failed: {summary['failed']}, "
+          f"skipped (journal): {summary['skipped']} "
+          f"in {summary['seconds']:.1f} s ({summary['items_per_second'] or 0:.2f} item(s)/s)")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as fh:
+            json.dump(summary, fh, indent=2, ensure_ascii=False)
+        print(f"Wrote report to {args.report}")
+    if summary["failed"] or summary["partial"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""Compare two benchmark result files and flag regressions.
+
+    python -m benchmarks.compare baseline.json candidate.json [--threshold 0.15]
+
+Compares medians per case id. Exits with status 1 if any case got slower by
+more than the threshold (relative), so it can gate an upgrade in CI.
+"""
+
+import argparse
+import json
+import sys
+
+
+def _load(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as fh:
+        report = json.load(fh)
+    return {r["id"]: r for r in report["results"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.15,
+                        help="relative slowdown that counts as a regression (default 0.15)")
+    parser.add_argument("--min-ms", type=float, default=1.0,
+                        help="ignore cases faster than this in both runs (timer noise)")
+    args = parser.parse_args()
+
+    base, cand = _load(args.baseline), _load(args.candidate)
+    regressions = 0
+    print(f"{'case':<60} {'base ms':>10} {'new ms':>10} {'change':>8}")
+    for case_id in sorted(set(base) | set(cand)):
+        if case_id not in base or case_id not in cand:
+            print(f"{case_id:<60} {'(only in ' + ('baseline' if case_id in base else 'candidate') + ')':>30}")
+            continue
+        old, new = base[case_id]["median"] * 1000, cand[case_id]["median"] * 1000
+        change = (new - old) / old if old else 0.0
+        flag = ""
+        if change > args.threshold and max(old, new) >= args.min_ms:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif change < -args.threshold and max(old, new) >= args.min_ms:
+            flag = "  faster"
+        print(f"{case_id:<60} {old:10.2f} {new:10.2f} {change:+8.1%}{flag}")
+
+    if regressions:
+        print(f"\n{regressions} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
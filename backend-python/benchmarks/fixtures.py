@@ -0,0 +1,105 @@
+"""Deterministic synthetic inputs: vector/scanned PDFs, document photos, overlays."""
+import base64
+import io
+import random
+
+import fitz
+import numpy as np
+from PIL import Image, ImageDraw
+
+A4 = (595, 842)  # points
+WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+         "tempor incididunt ut labore et dolore magna aliqua rechnung betrag datum").split()
+
+
+def _lines(rng: random.Random, count: int, width: int = 9) -> list[str]:
+    return [" ".join(rng.choice(WORDS) for _ in range(width)) for _ in range(count)]
+
+
+def vector_pdf(pages: int, seed: int = 0) -> bytes:
+    """Text-only PDF, ~40 lines per page."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page(width=A4[0], height=A4[1])
+        page.insert_text((72, 60), f"Page {i + 1}", fontsize=16)
+        y = 90
+        for line in _lines(rng, 40):
+            page.insert_text((72, y), line, fontsize=10)
+            y += 18
+    data = doc.tobytes(deflate=True)
+    doc.close()
+    return data
+
+
+def document_image(width: int, height: int, seed: int = 0, skew: float = 2.5) -> Image.Image:
+    """Greyish, noisy, slightly rotated 'photo' of a text page."""
+    rng = random.Random(seed)
+    img = Image.new("L", (width, height), 235)
+    draw = ImageDraw.Draw(img)
+    line_height = max(12, height // 45)
+    y = line_height * 2
+    for line in _lines(rng, 40):
+        if y > height - line_height * 2:
+            break
+        draw.text((width // 10, y), line, fill=30)
+        # Thick rules give deskew's Hough transform something to find
+        draw.line((width // 10, y + line_height - 3, width * 9 // 10, y + line_height - 3), fill=60, width=2)
+        y += line_height
+    img = img.rotate(skew, fillcolor=235)
+    noise = np.random.default_rng(seed).normal(0, 8, (height, width))
+    arr = np.clip(np.asarray(img, dtype=np.float32) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(arr).convert("RGB")
+
+
+def photo(megapixels: float, fmt: str = "JPEG", seed: int = 0) -> bytes:
+    """Encoded document photo with 3:4 aspect ratio and the given pixel count."""
+    height = int((megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    width = height * 3 // 4
+    buf = io.BytesIO()
+    kwargs = {"quality": 90} if fmt == "JPEG" else {}
+    document_image(width, height, seed).save(buf, fmt, **kwargs)
+    return buf.getvalue()
+
+
+def scanned_pdf(pages: int, dpi: int = 150, seed: int = 0) -> bytes:
+    """One full-page JPEG per page, like the output of a document scanner."""
+    width, height = int(A4[0] / 72 * dpi), int(A4[1] / 72 * dpi)
+    doc = fitz.open()
+    for i in range(pages):
+        buf = io.BytesIO()
+        document_image(width, height, seed + i, skew=0.8).save(buf, "JPEG", quality=80)
+        page = doc.new_page(width=A4[0], height=A4[1])
+        page.insert_image(page.rect, stream=buf.getvalue())
+    data = doc.tobytes(deflate=True)
+    doc.close()
+    return data
+
+
+def overlay_data_url(width: int, height: int, seed: int = 0) -> str:
+    """Transparent PNG with a few strokes, as produced by the Fabric.js canvas."""
+    rng = random.Random(seed)
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for _ in range(20):
+        pts = [(rng.randrange(width), rng.randrange(height)) for _ in range(2)]
+        draw.line(pts, fill=(220, 30, 30, 255), width=4)
+    buf = io.BytesIO()
+    img.save(buf, "PNG")
+    return "data:image/png;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def annotation_layers(pages: int, per_page: int = 5, seed: int = 0) -> list[dict]:
+    """Mixed text and image layers as sent to export-annotated."""
+    rng = random.Random(seed)
+    overlay = overlay_data_url(A4[0] * 2, A4[1] * 2, seed)
+    layers = []
+    for page in range(pages):
+        for i in range(per_page):
+            layers.append({
+                "type": "text", "page": page, "text": " ".join(_lines(rng, 1, 4)),
+                "x": rng.uniform(50, 400), "y": rng.uniform(50, 700),
+                "font_size": 12, "font_name": "Helvetica", "color": [0, 0, 255],
+            })
+        layers.append({"type": "image", "page": page, "png": overlay})
+    return layers
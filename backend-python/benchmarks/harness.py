@@ -0,0 +1,117 @@
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from importlib import metadata as importlib_metadata
+
+from models import metrics
+
+
+@dataclass
+class Timing:
+    """Returned by a case that measures itself (e.g. inside a subprocess)."""
+    seconds: float
+
+
+@dataclass
+class Case:
+    suite: str
+    name: str
+    fn: object                      # the timed call; returned temp paths are deleted
+    params: dict = field(default_factory=dict)
+    setup: object = None            # untimed, runs before every call (e.g. reset state)
+    budget: float | None = None     # max. median in seconds; exceeding it fails the run
+
+    @property
+    def id(self) -> str:
+        args = ",".join(f"{k}={v}" for k, v in self.params.items())
+        return f"{self.suite}/{self.name}[{args}]" if args else f"{self.suite}/{self.name}"
+
+
+def _discard(value):
+    paths = value if isinstance(value, (list, tuple)) else [value]
+    for p in paths:
+        if isinstance(p, str) and os.path.isfile(p):
+            os.unlink(p)
+
+
+def measure(case: Case, repeat: int, warmup: int = 1) -> dict:
+    """Run ``case`` warmup + repeat times; return timing stats in seconds.
+
+    Stage timings recorded through ``metrics.stage`` during the timed runs are
+    reported as per-stage medians, e.g. the individual ImageEnhancer steps.
+    """
+    timings = []
+    stages: dict[str, list[float]] = {}
+    for i in range(warmup + repeat):
+        if case.setup is not None:
+            case.setup()
+        with metrics.capture() as samples:
+            start = time.perf_counter()
+            result = case.fn()
+            elapsed = time.perf_counter() - start
+        if isinstance(result, Timing):
+            elapsed = result.seconds
+        _discard(result)
+        if i < warmup:
+            continue
+        timings.append(elapsed)
+        run_stages: dict[str, float] = {}
+        for name, _, value, key in samples:
+            if name == metrics.STAGE_LATENCY.name:
+                stage = ".".join(key)
+                run_stages[stage] = run_stages.get(stage, 0.0) + value
+        for stage, value in run_stages.items():
+            stages.setdefault(stage, []).append(value)
+
+    timings.sort()
+    median = statistics.median(timings)
+    return {
+        "id": case.id,
+        "suite": case.suite,
+        "name": case.name,
+        "params": case.params,
+        "runs": len(timings),
+        "min": timings[0],
+        "median": median,
+        "mean": statistics.fmean(timings),
+        "p90": timings[min(len(timings) - 1, int(round(0.9 * (len(timings) - 1))))],
+        "stdev": statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        "stages": {s: statistics.median(v) for s, v in sorted(stages.items())},
+        "budget": case.budget,
+        "over_budget": case.budget is not None and median > case.budget,
+    }
+
+
+def _git(*args) -> str | None:
+    try:
+        out = subprocess.run(["git", *args], capture_output=True, text=True, timeout=10,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() if out.returncode == 0 else None
+
+
+def environment() -> dict:
+    """Commit, interpreter, machine and library versions the results were taken with."""
+    versions = {}
+    for dist in ("flask", "pikepdf", "pymupdf", "Pillow", "opencv-python-headless", "reportlab", "sqlalchemy"):
+        try:
+            versions[dist] = importlib_metadata.version(dist)
+        except importlib_metadata.PackageNotFoundError:
+            versions[dist] = None
+    status = _git("status", "--porcelain", "--untracked-files=no")
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(status) if status is not None else None,
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "packages": versions,
+    }
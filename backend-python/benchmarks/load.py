@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""Concurrent-user load test against the real HTTP API.
+
+Run from the backend-python directory:
+    python -m benchmarks.load [--users 20] [--duration 60] [--scenario reviewers]
+                              [--server werkzeug|gunicorn|uvicorn] [--workers 4]
+                              [--db-url postgresql://...] [--output load.json]
+
+Without --url a server is started locally on a free port with a temporary
+storage directory (and a temporary SQLite database unless --db-url is given).
+Virtual users share a small set of documents, like reviewers working on the
+same files, and pick actions from a weighted scenario mix. The report lists
+throughput, latency percentiles and error rates per action; responses that
+indicate lock contention ("database is locked", 409/423) and load shedding
+(429/503) are counted separately.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from benchmarks import fixtures  # noqa: E402
+
+SCENARIOS = {
+    # Many reviewers reading and annotating the same documents
+    "reviewers": {"serve": 30, "annotate": 30, "annotations": 10, "export": 10,
+                  "audit_log": 10, "rotate": 5, "upload": 5},
+    # Page editing: frequent new versions of shared documents
+    "editors": {"serve": 20, "rotate": 25, "delete_page": 10, "upload": 15,
+                "annotate": 10, "export": 10, "audit_log": 10},
+    "mixed": {"serve": 25, "annotate": 20, "annotations": 5, "export": 10, "audit_log": 10,
+              "rotate": 15, "delete_page": 5, "upload": 10},
+}
+
+
+class Client:
+    """Minimal JSON/multipart HTTP client on urllib (no extra dependencies)."""
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method: str, path: str, json_body=None, body: bytes | None = None,
+                content_type: str | None = None) -> tuple[int, bytes]:
+        headers = {}
+        if json_body is not None:
+            body = json.dumps(json_body).encode("utf-8")
+            content_type = "application/json"
+        if content_type:
+            headers["Content-Type"] = content_type
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def upload(self, data: bytes, filename: str) -> tuple[int, bytes]:
+        boundary = uuid.uuid4().hex
+        body = (
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8") + data + f"\r\n--{boundary}--\r\n".encode("utf-8")
+        return self.request("POST", "/api/files/upload", body=body,
+                            content_type=f"multipart/form-data; boundary={boundary}")
+
+
+class Stats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = {}
+        self.outcomes: dict[str, dict[str, int]] = {}
+
+    def record(self, action: str, seconds: float, outcome: str):
+        with self._lock:
+            self.latencies.setdefault(action, []).append(seconds)
+            counts = self.outcomes.setdefault(action, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+
+
+def classify(status: int, body: bytes) -> str:
+    if status in (429, 503):
+        return "rejected"
+    if status in (409, 423) or (status >= 500 and b"locked" in body.lower()):
+        return "lock"
+    if status >= 400:
+        return "error"
+    return "ok"
+
+
+class VirtualUser(threading.Thread):
+    def __init__(self, index: int, client: Client, docs: list[str], mix: dict[str, int],
+                 stats: Stats, deadline: float, think: float, seed: int):
+        super().__init__(daemon=True)
+        self.user = f"reviewer-{index}"
+        self.client, self.docs, self.stats = client, docs, stats
+        self.actions, self.weights = list(mix), list(mix.values())
+        self.deadline, self.think = deadline, think
+        self.rng = random.Random(seed)
+        self.own_pdf = fixtures.vector_pdf(8, seed=seed)
+
+    def run(self):
+        while time.monotonic() < self.deadline:
+            action = self.rng.choices(self.actions, self.weights)[0]
+            start = time.perf_counter()
+            try:
+                status, body = getattr(self, f"do_{action}")()
+                outcome = classify(status, body)
+            except (OSError, urllib.error.URLError):
+                outcome = "failed"
+            self.stats.record(action, time.perf_counter() - start, outcome)
+            if self.think:
+                time.sleep(self.rng.expovariate(1 / self.think))
+
+    def _doc(self) -> str:
+        return self.rng.choice(self.docs)
+
+    def do_serve(self):
+        return self.client.request("GET", f"/api/pdf/{self._doc()}/serve")
+
+    def do_annotations(self):
+        return self.client.request("GET", f"/api/files/{self._doc()}/annotations")
+
+    def do_annotate(self):
+        overlays = [{"page": self.rng.randrange(3), "text": f"note {i}", "x": self.rng.uniform(50, 400),
+                     "y": self.rng.uniform(50, 700), "font_size": 12, "color": [255, 0, 0]}
+                    for i in range(self.rng.randint(1, 10))]
+        return self.client.request("PUT", f"/api/files/{self._doc()}/annotations/{self.user}",
+                                   json_body={"user": self.user, "text_overlays": overlays})
+
+    def do_export(self):
+        return self.client.request("POST", f"/api/files/{self._doc()}/export-annotated",
+                                   json_body={"users": [self.user]})
+
+    def do_audit_log(self):
+        return self.client.request("GET", "/api/audit-log?limit=100")
+
+    def do_rotate(self):
+        return self.client.request("POST", f"/api/pdf/{self._doc()}/rotate-page",
+                                   json_body={"page": 0, "angle": 90, "user": self.user})
+
+    def do_delete_page(self):
+        doc = self._doc()
+        status, body = self.client.request("POST", f"/api/pdf/{doc}/delete-page",
+                                           json_body={"page": 0, "user": self.user})
+        if status == 400:
+            # Down to the last page: restore the original instead
+            return self.client.request("POST", f"/api/files/{doc}/reset", json_body={"user": self.user})
+        return status, body
+
+    def do_upload(self):
+        return self.client.upload(self.own_pdf, f"{self.user}.pdf")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind: str, workers: int, env: dict, log_path: str) -> tuple[subprocess.Popen, str]:
+    port = _free_port()
+    if kind == "werkzeug":
+        cmd = [sys.executable, "-c",
+               f"from app import create_app; create_app().run(host='127.0.0.1', port={port}, threaded=True)"]
+    elif kind == "gunicorn":
+        cmd = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}", "app:create_app()"]
+    elif kind == "uvicorn":
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--workers", str(workers),
+               "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    else:
+        raise ValueError(f"Unknown server: {kind}")
+    log = open(log_path, "wb")
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def wait_ready(client: Client, proc: subprocess.Popen | None, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"server exited with status {proc.returncode}")
+        try:
+            if client.request("GET", "/api/files?limit=1")[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def _percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+def summarize(stats: Stats, elapsed: float) -> dict:
+    actions = {}
+    total = {"requests": 0, "ok": 0, "error": 0, "lock": 0, "rejected": 0, "failed": 0}
+    for action in sorted(stats.latencies):
+        lat = sorted(stats.latencies[action])
+        counts = stats.outcomes[action]
+        n = len(lat)
+        actions[action] = {
+            "requests": n,
+            "rps": round(n / elapsed, 2),
+            "p50_ms": round(_percentile(lat, 0.50) * 1000, 2),
+            "p90_ms": round(_percentile(lat, 0.90) * 1000, 2),
+            "p99_ms": round(_percentile(lat, 0.99) * 1000, 2),
+            "max_ms": round(lat[-1] * 1000, 2),
+            **{k: counts.get(k, 0) for k in ("ok", "error", "lock", "rejected", "failed")},
+        }
+        total["requests"] += n
+        for k in ("ok", "error", "lock", "rejected", "failed"):
+            total[k] += counts.get(k, 0)
+    n = total["requests"] or 1
+    total.update(
+        rps=round(total["requests"] / elapsed, 2),
+        error_rate=round((total["error"] + total["failed"]) / n, 4),
+        lock_rate=round(total["lock"] / n, 4),
+        rejected_rate=round(total["rejected"] / n, 4),
+    )
+    return {"elapsed_s": round(elapsed, 2), "total": total, "actions": actions}
+
+
+def parse_mix(value: str) -> dict[str, int]:
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if not hasattr(VirtualUser, f"do_{name}"):
+            raise ValueError(f"unknown action: {name}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="", help="target an already running instance (incl. URL prefix)")
+    parser.add_argument("--server", choices=("werkzeug", "gunicorn", "uvicorn"), default="werkzeug")
+    parser.add_argument("--workers", type=int, default=4, help="server worker processes (gunicorn/uvicorn)")
+    parser.add_argument("--db-url", default="", help="DATABASE_URL for the local server (default: temp SQLite)")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--ramp-up", type=float, default=2, help="seconds until all users run")
+    parser.add_argument("--think", type=float, default=0.2, help="mean think time between actions (s)")
+    parser.add_argument("--documents", type=int, default=3, help="shared documents all users work on")
+    parser.add_argument("--pages", type=int, default=10, help="pages per shared document")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="reviewers")
+    parser.add_argument("--mix", default="", help="custom action weights, e.g. serve=5,annotate=3,export=1")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", "-o", default="", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix) if args.mix else SCENARIOS[args.scenario]
+    except ValueError as e:
+        parser.error(str(e))
+
+    proc = workdir = None
+    base_url = args.url
+    if not base_url:
+        workdir = tempfile.mkdtemp(prefix="doceditor-load-")
+        env = dict(os.environ, DOCEDITOR_STORAGE=os.path.join(workdir, "storage"))
+        env.pop("DOCEDITOR_PROFILE_TOKEN", None)
+        if args.db_url:
+            env["DATABASE_URL"] = args.db_url
+        else:
+            env.pop("DATABASE_URL", None)
+        proc, base_url = start_server(args.server, args.workers, env, os.path.join(workdir, "server.log"))
+        print(f"Started {args.server} at {base_url}")
+
+    ok = False
+    try:
+        client = Client(base_url, args.timeout)
+        wait_ready(client, proc)
+        docs = []
+        for i in range(args.documents):
+            status, body = client.upload(fixtures.vector_pdf(args.pages, seed=1000 + i), f"shared-{i}.pdf")
+            if status != 201:
+                raise RuntimeError(f"seeding failed: {status} {body[:200]!r}")
+            docs.append(json.loads(body)["file_id"])
+
+        stats = Stats()
+        start = time.monotonic()
+        deadline = start + args.ramp_up + args.duration
+        users = []
+        for i in range(args.users):
+            u = VirtualUser(i, client, docs, mix, stats, deadline, args.think, args.seed + i)
+            u.start()
+            users.append(u)
+            time.sleep(args.ramp_up / max(args.users, 1))
+        for u in users:
+            u.join()
+        report = summarize(stats, time.monotonic() - start)
+        ok = True
+    finally:
+        if proc is not None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if workdir is not None:
+            if ok:
+                shutil.rmtree(workdir, ignore_errors=True)
+            else:
+                print(f"Server log kept in {workdir}/server.log", file=sys.stderr)
+
+    # db_url may contain credentials: only record which backend was used
+    report["config"] = {k: v for k, v in vars(args).items() if k not in ("output", "db_url", "mix")}
+    report["config"].update(mix=mix, database=args.db_url.split(":", 1)[0] if args.db_url else "sqlite")
+
+    t = report["total"]
+    print(f"\n{'action':<14}{'req':>7}{'rps':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}"
+          f"{'max ms':>10}{'err':>6}{'lock':>6}{'429/503':>9}")
+    for name, a in report["actions"].items():
+        print(f"{name:<14}{a['requests']:>7}{a['rps']:>8}{a['p50_ms']:>10}{a['p90_ms']:>10}"
+              f"{a['p99_ms']:>10}{a['max_ms']:>10}{a['error'] + a['failed']:>6}{a['lock']:>6}{a['rejected']:>9}")
+    print(f"\n{t['requests']} requests in {report['elapsed_s']} s: {t['rps']} req/s, "
+          f"error rate {t['error_rate']:.2%}, lock rate {t['lock_rate']:.2%}, "
+          f"rejected {t['rejected_rate']:.2%}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Wrote report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Run the DocEditor benchmark suite and write JSON results.
+
+Run from the backend-python directory:
+    python -m benchmarks.run [--quick] [--suite imports,pdf,image,enhancer,routes,storage]
+                             [--repeat N] [--output results.json]
+
+All inputs are generated deterministically and the routes suite runs against
+a fresh temporary storage directory, so results from different commits can be
+compared with ``python -m benchmarks.compare old.json new.json``. Cases with a
+budget (import times) make the run exit with status 1 when exceeded.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="small inputs, fewer runs (smoke check)")
+    parser.add_argument("--suite", default="", help="comma-separated suites (default: all)")
+    parser.add_argument("--repeat", type=int, default=None, help="timed runs per case (default 5, quick 3)")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs per case")
+    parser.add_argument("--pool", type=int, default=0,
+                        help="CPU pool workers for the routes suite (default 0 = in-process)")
+    parser.add_argument("--output", "-o", default="", help="write JSON results to this file")
+    args = parser.parse_args()
+
+    # Must happen before config is imported: never benchmark against real data
+    workdir = tempfile.mkdtemp(prefix="doceditor-bench-")
+    os.environ["DOCEDITOR_STORAGE"] = os.path.join(workdir, "storage")
+    os.environ.pop("DATABASE_URL", None)
+    os.environ["DOCEDITOR_CPU_WORKERS"] = str(args.pool)
+    os.environ.pop("DOCEDITOR_PROFILE_TOKEN", None)
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from benchmarks.harness import environment, measure
+    from benchmarks.suites import SUITES
+
+    names = [s for s in args.suite.split(",") if s] or list(SUITES)
+    unknown = [s for s in names if s not in SUITES]
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(unknown)} (available: {', '.join(SUITES)})")
+    repeat = args.repeat or (3 if args.quick else 5)
+
+    results = []
+    try:
+        for name in names:
+            cases = SUITES[name](workdir, args.quick)
+            for case in cases:
+                r = measure(case, repeat, args.warmup)
+                results.append(r)
+                print(f"{r['id']:<60} median {r['median'] * 1000:10.2f} ms  "
+                      f"(min {r['min'] * 1000:.2f}, p90 {r['p90'] * 1000:.2f})", flush=True)
+                for stage, value in r["stages"].items():
+                    print(f"    {stage:<56} {value * 1000:10.2f} ms")
+                if r["over_budget"]:
+                    print(f"    OVER BUDGET ({r['budget'] * 1000:.0f} ms)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "environment": environment(),
+        "config": {"quick": args.quick, "repeat": repeat, "warmup": args.warmup, "pool": args.pool},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+        print(f"Wrote {len(results)} result(s) to {args.output}")
+
+    over = [r["id"] for r in results if r["over_budget"]]
+    if over:
+        print(f"{len(over)} case(s) over budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""Benchmark cases. Each suite takes (workdir, quick) and returns a list of Cases."""
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import uuid
+import zipfile
+
+from PIL import Image
+
+import config
+from benchmarks import fixtures
+from benchmarks.harness import Case, Timing
+from models.image_enhancer import ImageEnhancer
+from models.image_processor import ImageProcessor
+from models import storage
+from models.pdf_processor import PdfProcessor
+from models.tile_cache import TileCache
+
+# (kind, pages)
+PDFS = {True: [("vector", 10), ("scanned", 2)],
+        False: [("vector", 1), ("vector", 20), ("vector", 200), ("scanned", 1), ("scanned", 10)]}
+# (megapixels, format)
+PHOTOS = {True: [(2, "JPEG")],
+          False: [(1, "JPEG"), (4, "JPEG"), (12, "JPEG"), (4, "PNG")]}
+
+
+def _write(workdir: str, name: str, data: bytes) -> str:
+    path = os.path.join(workdir, name)
+    with open(path, "wb") as fh:
+        fh.write(data)
+    return path
+
+
+def _pdf(workdir: str, kind: str, pages: int) -> str:
+    data = fixtures.vector_pdf(pages) if kind == "vector" else fixtures.scanned_pdf(pages)
+    return _write(workdir, f"{kind}-{pages}.pdf", data)
+
+
+def _photo(workdir: str, mp: float, fmt: str) -> str:
+    ext = "jpg" if fmt == "JPEG" else fmt.lower()
+    return _write(workdir, f"photo-{mp}mp.{ext}", fixtures.photo(mp, fmt))
+
+
+def pdf_suite(workdir: str, quick: bool) -> list[Case]:
+    cases = []
+    for kind, pages in PDFS[quick]:
+        src = _pdf(workdir, kind, pages)
+        params = {"kind": kind, "pages": pages}
+        overlay = fixtures.overlay_data_url(fixtures.A4[0] * 2, fixtures.A4[1] * 2)
+        layers = fixtures.annotation_layers(min(pages, 10))
+        cases += [
+            Case("pdf", "get_page_count", lambda s=src: PdfProcessor.get_page_count(s), params),
+            Case("pdf", "linearize", lambda s=src: PdfProcessor.linearize(s), params),
+            Case("pdf", "page_hashes", lambda s=src: PdfProcessor.page_hashes(s), params),
+            Case("pdf", "extract_page", lambda s=src: PdfProcessor.extract_page(s, 0), params),
+            Case("pdf", "rotate_page", lambda s=src: PdfProcessor.rotate_page(s, 0, 90), params),
+            Case("pdf", "reorder_pages",
+                 lambda s=src, n=pages: PdfProcessor.reorder_pages(s, list(reversed(range(n)))), params),
+            Case("pdf", "merge", lambda s=src: PdfProcessor.merge([s, s]), params),
+            Case("pdf", "optimize", lambda s=src: PdfProcessor.optimize(s)[0], params),
+            Case("pdf", "optimize_150dpi", lambda s=src: PdfProcessor.optimize(s, 150)[0], params),
+            Case("pdf", "text_overlay",
+                 lambda s=src: PdfProcessor.text_overlay(s, 0, "Benchmark", 100, 100), params),
+            Case("pdf", "annotate", lambda s=src, o=overlay: PdfProcessor.annotate(s, 0, o), params),
+            Case("pdf", "apply_annotation_layers",
+                 lambda s=src, l=layers: PdfProcessor.apply_annotation_layers(s, l),
+                 dict(params, layers=len(layers))),
+        ]
+        top = PdfProcessor.tile_levels(src, 0, config.TILE_SIZE, config.TILE_MAX_DPI)["levels"][-1]["zoom"]
+        cases.append(Case("pdf", "render_tile",
+                          lambda s=src, z=top: PdfProcessor.render_tile(s, 0, z, 1, 1, config.TILE_SIZE,
+                                                                        config.TILE_MAX_DPI),
+                          dict(params, zoom=top)))
+        if pages > 1:
+            cases.append(Case("pdf", "delete_page", lambda s=src: PdfProcessor.delete_page(s, 0), params))
+
+    mp, fmt = PHOTOS[quick][0]
+    photos = [_photo(workdir, mp, fmt)] * 3
+    cases.append(Case("pdf", "images_to_pdf", lambda p=photos: PdfProcessor.images_to_pdf(p),
+                      {"images": len(photos), "mp": mp}))
+    return cases
+
+
+def image_suite(workdir: str, quick: bool) -> list[Case]:
+    cases = []
+    for mp, fmt in PHOTOS[quick]:
+        src = _photo(workdir, mp, fmt)
+        with Image.open(src) as img:
+            w, h = img.size
+        overlay = fixtures.overlay_data_url(w, h)
+        params = {"mp": mp, "format": fmt}
+        cases += [
+            Case("image", "crop", lambda s=src, w=w, h=h: ImageProcessor.crop(s, w // 10, h // 10, w * 9 // 10, h * 9 // 10), params),
+            Case("image", "resize", lambda s=src, w=w, h=h: ImageProcessor.resize(s, w // 2, h // 2), params),
+            Case("image", "rotate_90", lambda s=src: ImageProcessor.rotate(s, 90), params),
+            Case("image", "rotate_7", lambda s=src: ImageProcessor.rotate(s, 7), params),
+            Case("image", "adjust", lambda s=src: ImageProcessor.adjust(s, 1.2, 1.1, 0.9), params),
+            Case("image", "annotate", lambda s=src, o=overlay: ImageProcessor.annotate(s, o), params),
+        ]
+    return cases
+
+
+def enhancer_suite(workdir: str, quick: bool) -> list[Case]:
+    """ImageEnhancer.enhance; per-step times are in each result's ``stages``."""
+    cases = []
+    for mp, fmt in PHOTOS[quick]:
+        src = _photo(workdir, mp, fmt)
+        cases.append(Case("enhancer", "enhance", lambda s=src: ImageEnhancer.enhance(s), {"mp": mp, "format": fmt}))
+    return cases
+
+
+def routes_suite(workdir: str, quick: bool) -> list[Case]:
+    """End-to-end requests through the Flask test client (fresh temporary storage)."""
+    from app import create_app
+
+    client = create_app().test_client()
+    vector = fixtures.vector_pdf(10)
+    scanned = fixtures.scanned_pdf(2)
+    photo = fixtures.photo(PHOTOS[quick][0][0])
+
+    def upload(data: bytes, name: str) -> str:
+        r = client.post("/api/files/upload", data={"file": (io.BytesIO(data), name)},
+                        content_type="multipart/form-data")
+        if r.status_code != 201:
+            raise RuntimeError(f"upload failed: {r.status_code} {r.data[:200]!r}")
+        return r.get_json()["file_id"]
+
+    def call(method: str, url: str, expect: int = 200, **kwargs):
+        def run():
+            r = client.open(url, method=method, **kwargs)
+            r.get_data()
+            if r.status_code != expect:
+                raise RuntimeError(f"{method} {url}: {r.status_code} {r.data[:200]!r}")
+            r.close()
+        return run
+
+    def reset(fid: str):
+        return lambda: client.post(f"/api/files/{fid}/reset", json={}).close()
+
+    pdf_id = upload(vector, "vector.pdf")
+    scan_id = upload(scanned, "scanned.pdf")
+    img_id = upload(photo, "photo.jpg")
+    history_id = upload(vector, "history.pdf")
+    client.post(f"/api/pdf/{history_id}/rotate-page", json={"page": 0}).close()
+    filler_ids = [upload(vector, "filler.pdf") for _ in range(50)]
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        for i in range(10):
+            zf.writestr(f"bulk-{i}.pdf", vector)
+    overlay = fixtures.overlay_data_url(fixtures.A4[0] * 2, fixtures.A4[1] * 2)
+
+    return [
+        Case("routes", "upload_pdf", lambda: upload(vector, "bench.pdf"), {"pages": 10}),
+        Case("routes", "upload_zip", call("POST", "/api/files/upload-zip", data=archive.getvalue(),
+                                          content_type="application/zip"), {"files": 10}),
+        Case("routes", "list_files", call("GET", "/api/files?limit=50")),
+        Case("routes", "audit_log", call("GET", "/api/audit-log?limit=100")),
+        Case("routes", "serve_pdf", call("GET", f"/api/pdf/{pdf_id}/serve")),
+        Case("routes", "serve_pdf_range",
+             call("GET", f"/api/pdf/{pdf_id}/serve", expect=206, headers={"Range": "bytes=0-262143"})),
+        Case("routes", "manifest", call("GET", f"/api/pdf/{pdf_id}/manifest")),
+        Case("routes", "serve_page", call("GET", f"/api/pdf/{pdf_id}/pages/0")),
+        Case("routes", "page_tile", call("GET", f"/api/pdf/{pdf_id}/pages/0/tiles/3/1/1")),
+        Case("routes", "page_tile_render", call("GET", f"/api/pdf/{pdf_id}/pages/0/tiles/3/1/1"),
+             setup=lambda: TileCache.invalidate(pdf_id)),
+        Case("routes", "page_count", call("GET", f"/api/pdf/{pdf_id}/page-count")),
+        Case("routes", "rotate_page", call("POST", f"/api/pdf/{pdf_id}/rotate-page", json={"page": 0}),
+             setup=reset(pdf_id)),
+        Case("routes", "text_overlay",
+             call("POST", f"/api/pdf/{pdf_id}/text-overlay", json={"page": 0, "text": "Bench", "x": 100, "y": 100}),
+             setup=reset(pdf_id)),
+        Case("routes", "export_annotated",
+             call("POST", f"/api/files/{pdf_id}/export-annotated",
+                  json={"fabric_overlays": [{"page": p, "png": overlay} for p in range(3)]})),
+        Case("routes", "enhance_preview", call("POST", f"/api/pdf/{scan_id}/enhance-preview", json={"page": 0})),
+        Case("routes", "enhance", call("POST", f"/api/pdf/{scan_id}/enhance", json={}), {"pages": 2},
+             setup=reset(scan_id)),
+        Case("routes", "image_rotate", call("POST", f"/api/image/{img_id}/rotate", json={"angle": 90}),
+             setup=reset(img_id)),
+        Case("routes", "photo_to_pdf",
+             call("POST", "/api/photo-to-pdf", expect=201, json={"file_ids": [img_id] * 3})),
+        Case("routes", "download_zip", call("GET", "/api/files/download-zip?ids=" + ",".join(filler_ids)),
+             {"files": 50}),
+        Case("routes", "history", call("GET", f"/api/files/{history_id}/history")),
+        Case("routes", "history_download", call("GET", f"/api/files/{history_id}/history/1/download"),
+             setup=lambda: shutil.rmtree(os.path.join(config.HISTORY_DIR, history_id, "cache"), ignore_errors=True)),
+        Case("routes", "index_html", call("GET", "/")),
+    ]
+
+
+def storage_suite(workdir: str, quick: bool) -> list[Case]:
+    """S3Backend against DOCEDITOR_S3_BUCKET (e.g. MinIO), or an in-process moto mock without one.
+
+    put, the ETag revalidation of local_path, exists, list_keys and
+    delete_prefix are checked once before they are timed. Objects go under a
+    fresh ``bench-<id>/`` prefix, which the last case deletes. Skipped when
+    boto3 (or, without a bucket, moto) is not installed.
+    """
+    try:
+        import boto3
+        if not config.S3_BUCKET:
+            from moto import mock_aws
+    except ImportError as e:
+        print(f"storage suite skipped: {e.name} is not installed", file=sys.stderr)
+        return []
+    target = "bucket" if config.S3_BUCKET else "moto"
+    if not config.S3_BUCKET:
+        mock_aws().start()  # stays active for the timed runs
+        config.S3_BUCKET, config.S3_REGION = "doceditor-bench", "us-east-1"
+        boto3.client("s3", region_name=config.S3_REGION).create_bucket(Bucket=config.S3_BUCKET)
+    config.S3_PREFIX += f"bench-{uuid.uuid4().hex[:8]}/"
+    s3 = storage.S3Backend()
+    doc, pages = "bench/doc.pdf", "bench/pages/"
+    data = fixtures.vector_pdf(10 if quick else 200)
+
+    def check(ok: bool, what: str):
+        if not ok:
+            raise RuntimeError(f"storage check failed: {what}")
+
+    def content(key: str) -> bytes | None:
+        path = s3.local_path(key)
+        if path is None:
+            return None
+        with open(path, "rb") as fh:
+            return fh.read()
+
+    def put():
+        path = s3.staging_path(doc)
+        with open(path, "wb") as fh:
+            fh.write(data)
+        s3.put(doc, path)
+
+    def fill(n: int):
+        for i in range(n):
+            s3.write(f"{pages}{i}.pdf", b"%PDF-1.4 page")
+
+    put()
+    check(s3.exists(doc) and content(doc) == data, "put, then exists and local_path")
+    # Another node replaces the object: the cached copy must be revalidated by ETag
+    s3.client.put_object(Bucket=s3.bucket, Key=s3._name(doc), Body=b"changed")
+    check(content(doc) == b"changed", "local_path after the object changed")
+    fill(3)
+    check(s3.list_keys("bench/") == ["doc.pdf"], "list_keys lists direct names only")
+    check(sorted(s3.list_keys(pages)) == ["0.pdf", "1.pdf", "2.pdf"], "list_keys")
+    s3.delete_prefix("bench/")
+    check(not s3.exists(doc) and s3.list_keys(pages) == [] and s3.local_path(doc) is None, "delete_prefix")
+    check(not os.path.exists(s3._cached(doc)), "delete_prefix drops the cache")
+
+    put()
+    fill(50)
+    params = {"s3": target}
+    return [
+        Case("storage", "put", put, dict(params, bytes=len(data))),
+        Case("storage", "exists", lambda: s3.exists(doc), params),
+        # local_path returns the cached file, which the harness must not delete
+        Case("storage", "local_path_revalidate", lambda: s3.local_path(doc) and None, params),
+        Case("storage", "local_path_download", lambda: s3.local_path(doc) and None, params,
+             setup=lambda: s3._drop_cached(doc)),
+        Case("storage", "list_keys", lambda: s3.list_keys(pages), dict(params, keys=50)),
+        Case("storage", "delete_prefix", lambda: s3.delete_prefix("bench/"), dict(params, keys=21),
+             setup=lambda: (put(), fill(20))),
+    ]
+
+
+# Must not be imported until a processor actually runs
+HEAVY_MODULES = ("cv2", "numpy", "pikepdf", "reportlab", "PIL", "fitz")
+# Import-time budgets (seconds, median of fresh interpreters). Generous on
+# purpose: HEAVY_MODULES catches eager imports exactly, the budget catches
+# everything else that creeps into startup.
+IMPORT_BUDGETS = {"config": 0.05, "register_blueprints": 0.75, "create_app": 1.0}
+
+_IMPORT_SNIPPETS = {
+    "config": "import config",
+    # Embedding into a host app: Flask is already loaded there
+    "register_blueprints": "import app; app.register_blueprints(Flask('host'))",
+    "create_app": "import app; app.create_app()",
+}
+_IMPORT_PROBE = """
+import json, sys, time
+from flask import Flask
+start = time.perf_counter()
+{snippet}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def imports_suite(workdir: str, quick: bool) -> list[Case]:
+    """Cold import cost, each run in a fresh interpreter."""
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    def probe(name: str):
+        code = _IMPORT_PROBE.format(snippet=_IMPORT_SNIPPETS[name], heavy=HEAVY_MODULES)
+
+        def run():
+            out = subprocess.run([sys.executable, "-c", code], cwd=backend_dir, capture_output=True,
+                                 text=True, timeout=120, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"))
+            if out.returncode != 0:
+                raise RuntimeError(f"import probe {name} failed:\n{out.stderr}")
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            if result["heavy"]:
+                raise RuntimeError(f"{name} eagerly imports {', '.join(result['heavy'])}")
+            return Timing(result["seconds"])
+        return run
+
+    return [Case("imports", name, probe(name), budget=IMPORT_BUDGETS[name]) for name in _IMPORT_SNIPPETS]
+
+
+SUITES = {
+    "imports": imports_suite,
+    "pdf": pdf_suite,
+    "image": image_suite,
+    "enhancer": enhancer_suite,
+    "routes": routes_suite,
+    "storage": storage_suite,
+}
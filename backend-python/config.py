@@ -10,23 +10,174 @@ ANNOTATIONS_DIR = os.path.join(STORAGE_DIR, "annotations")
 METADATA_DIR = os.path.join(STORAGE_DIR, "metadata")
 AUDIT_LOG_PATH = os.path.join(STORAGE_DIR, "audit_log.jsonl")  # legacy, kept for reference
 
+# Object storage for originals, current/, annotations and history blobs
+# (models/storage.py). "local" keeps them as files under STORAGE_DIR; "s3"
+# puts them into an S3-compatible bucket (AWS, MinIO, ...; needs boto3,
+# credentials via the usual AWS_* variables) shared by all nodes. Objects are
+# then read through a local cache under OBJECT_CACHE_DIR (at most
+# OBJECT_CACHE_SIZE); files above S3_MULTIPART_THRESHOLD are transferred in
+# parts of S3_MULTIPART_CHUNK_SIZE.
+STORAGE_BACKEND = os.environ.get("DOCEDITOR_STORAGE_BACKEND", "local")
+S3_BUCKET = os.environ.get("DOCEDITOR_S3_BUCKET", "")
+S3_PREFIX = os.environ.get("DOCEDITOR_S3_PREFIX", "")
+S3_ENDPOINT = os.environ.get("DOCEDITOR_S3_ENDPOINT", "")  # e.g. http://localhost:9000 for MinIO
+S3_REGION = os.environ.get("DOCEDITOR_S3_REGION", "")
+S3_MULTIPART_THRESHOLD = int(os.environ.get("DOCEDITOR_S3_MULTIPART_MB", "16")) * 1024 * 1024
+S3_MULTIPART_CHUNK_SIZE = int(os.environ.get("DOCEDITOR_S3_PART_MB", "16")) * 1024 * 1024
+OBJECT_CACHE_DIR = os.path.join(STORAGE_DIR, "object_cache")
+OBJECT_CACHE_SIZE = int(os.environ.get("DOCEDITOR_OBJECT_CACHE_MB", "2048")) * 1024 * 1024
+
 # Database URL: SQLite (default), PostgreSQL, MySQL via DATABASE_URL env var
 DATABASE_URL = os.environ.get(
     "DATABASE_URL",
     "sqlite:///" + os.path.join(STORAGE_DIR, "doceditor.db"),
 )
 
+# Engine profile. SQLite: WAL lets readers run alongside the single writer and
+# busy_timeout makes concurrent workers wait for the lock instead of failing.
+SQLITE_JOURNAL_MODE = os.environ.get("DOCEDITOR_SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.environ.get("DOCEDITOR_SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("DOCEDITOR_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.environ.get("DOCEDITOR_SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+# Server databases (PostgreSQL, MySQL): connection pool per worker process
+DB_POOL_SIZE = int(os.environ.get("DOCEDITOR_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("DOCEDITOR_DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.environ.get("DOCEDITOR_DB_POOL_RECYCLE", "1800"))  # seconds
+DB_POOL_PRE_PING = os.environ.get("DOCEDITOR_DB_POOL_PRE_PING", "1") == "1"
+
 ALLOWED_EXTENSIONS = {
     "pdf": ["pdf"],
     "image": ["png", "jpg", "jpeg", "gif", "bmp", "tiff", "webp"],
 }
 ALL_ALLOWED = {ext for exts in ALLOWED_EXTENSIONS.values() for ext in exts}
 
-MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50 MB
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50 MB, per request
+
+# Resumable chunked uploads (/api/uploads) for files beyond MAX_UPLOAD_SIZE:
+# the client sends chunks of at most UPLOAD_CHUNK_SIZE; unfinished uploads
+# are kept in UPLOADS_DIR for UPLOAD_EXPIRY seconds after the last chunk
+UPLOADS_DIR = os.path.join(STORAGE_DIR, "uploads")
+MAX_RESUMABLE_UPLOAD_SIZE = int(os.environ.get("DOCEDITOR_MAX_RESUMABLE_UPLOAD_MB", "2048")) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = min(int(os.environ.get("DOCEDITOR_UPLOAD_CHUNK_MB", "8")) * 1024 * 1024, MAX_UPLOAD_SIZE)
+UPLOAD_EXPIRY = int(os.environ.get("DOCEDITOR_UPLOAD_EXPIRY", str(24 * 3600)))
+
+# Bulk transfer: /api/files/upload-zip accepts archives up to MAX_ZIP_UPLOAD_SIZE
+# (each entry is still limited to MAX_UPLOAD_SIZE); an upload or a
+# /api/files/download-zip covers at most ZIP_MAX_ENTRIES files
+MAX_ZIP_UPLOAD_SIZE = int(os.environ.get("DOCEDITOR_MAX_ZIP_UPLOAD_MB", "1024")) * 1024 * 1024
+ZIP_MAX_ENTRIES = int(os.environ.get("DOCEDITOR_ZIP_MAX_ENTRIES", "1000"))
+
+# Save PDFs written to current/ (and generated or uploaded PDFs) linearized
+# ("fast web view"), so the viewer can show page 1 from the first byte ranges
+PDF_LINEARIZE = os.environ.get("DOCEDITOR_PDF_LINEARIZE", "1") == "1"
+
+# PDF compaction (/api/pdf/<id>/optimize). PDF_AUTO_OPTIMIZE lists the
+# operations whose result is optimized before it is stored ("merge",
+# "photo_to_pdf", "enhance"); PDF_OPTIMIZE_DPI > 0 also downsamples images
+# placed above that resolution during those automatic runs.
+PDF_AUTO_OPTIMIZE = set(filter(None, os.environ.get("DOCEDITOR_PDF_AUTO_OPTIMIZE", "merge").split(",")))
+PDF_OPTIMIZE_DPI = int(os.environ.get("DOCEDITOR_PDF_OPTIMIZE_DPI", "0"))
+
+# Version history (undo): each PDF version stores only pages that are in neither
+# the original nor an earlier version, each image version the operation applied.
+# Versions are rebuilt on demand; the last rebuilt ones are kept under
+# HISTORY_DIR (at most HISTORY_CACHE_SIZE).
+HISTORY_DIR = os.path.join(STORAGE_DIR, "history")
+HISTORY_CACHE_SIZE = int(os.environ.get("DOCEDITOR_HISTORY_CACHE_MB", "256")) * 1024 * 1024
+
+# Deep-zoom tiles (/api/pdf/<id>/pages/<n>/tiles/<z>/<x>/<y>): zoom 0 fits the
+# page into one TILE_SIZE square, every level doubles the scale up to the first
+# level reaching TILE_MAX_DPI. Rendered tiles are cached under TILES_DIR (at most
+# TILE_CACHE_SIZE, oldest dropped first) until the file changes.
+TILES_DIR = os.path.join(STORAGE_DIR, "tiles")
+TILE_SIZE = int(os.environ.get("DOCEDITOR_TILE_SIZE", "256"))
+TILE_MAX_DPI = int(os.environ.get("DOCEDITOR_TILE_MAX_DPI", "600"))
+TILE_CACHE_SIZE = int(os.environ.get("DOCEDITOR_TILE_CACHE_MB", "512")) * 1024 * 1024
+
+# Per-file locks (models/file_lock.py) serializing edits across worker processes.
+# "file": flock() on files under LOCKS_DIR, for all workers on one host;
+# "postgres": advisory locks, for all nodes sharing the database; "auto" picks
+# postgres for a PostgreSQL DATABASE_URL. Waiting longer than LOCK_TIMEOUT
+# seconds answers 503.
+LOCKS_DIR = os.path.join(STORAGE_DIR, "locks")
+LOCK_BACKEND = os.environ.get("DOCEDITOR_LOCK_BACKEND", "auto")
+LOCK_TIMEOUT = float(os.environ.get("DOCEDITOR_LOCK_TIMEOUT", "30"))
+
+# Delivery of stored files (PDF/image serve, downloads): "app" streams them
+# from the worker in FILE_CHUNK_SIZE blocks (zero-copy where the WSGI server
+# provides wsgi.file_wrapper, e.g. gunicorn); "x-sendfile" (Apache
+# mod_xsendfile, lighttpd) and "x-accel-redirect" (nginx) answer with headers
+# only and the front server sends the file. FILE_ACCEL_PREFIX is the internal
+# nginx location that maps to STORAGE_DIR.
+FILE_DELIVERY = os.environ.get("DOCEDITOR_FILE_DELIVERY", "app")
+FILE_ACCEL_PREFIX = os.environ.get("DOCEDITOR_ACCEL_PREFIX", "/_doceditor_storage/")
+FILE_CHUNK_SIZE = int(os.environ.get("DOCEDITOR_FILE_CHUNK_KB", "1024")) * 1024
+
+# Request threads per process under ASGI (asgi.py): each request runs on its
+# own thread from this pool, so cheap requests are not queued behind slow ones.
+ASGI_THREADS = int(os.environ.get("DOCEDITOR_ASGI_THREADS", "16"))
 
 # URL prefix when mounted as sub-app (e.g. "/doceditor")
 URL_PREFIX = os.environ.get("DOCEDITOR_PREFIX", "")
 
-# Ensure storage dirs exist
-for d in [ORIGINALS_DIR, CURRENT_DIR, ANNOTATIONS_DIR, METADATA_DIR]:
-    os.makedirs(d, exist_ok=True)
+# CPU-heavy processor calls run in a shared process pool (0 = run inline).
+# CPU_OPERATION_LIMITS caps concurrent calls per operation and worker process;
+# override with e.g. DOCEDITOR_CPU_LIMITS="enhance=1,export=4".
+CPU_POOL_WORKERS = int(os.environ.get("DOCEDITOR_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+CPU_OPERATION_LIMITS = {
+    "pdf_edit": 4,
+    "image_edit": 4,
+    "merge": 2,
+    "photo_to_pdf": 2,
+    "enhance": 2,
+    "export": 2,
+    "optimize": 2,
+    "index": 2,
+    "tile": 4,
+    "page": 4,
+    "history": 2,
+}
+for _item in filter(None, os.environ.get("DOCEDITOR_CPU_LIMITS", "").split(",")):
+    _op, _, _n = _item.partition("=")
+    CPU_OPERATION_LIMITS[_op.strip()] = int(_n)
+
+# Admission control in front of the pool (per worker process): callers beyond
+# the operation limit wait in a queue of ADMISSION_QUEUE_SIZE per operation;
+# a full queue answers 429, waiting longer than ADMISSION_QUEUE_TIMEOUT 503.
+# ADMISSION_MEMORY_BUDGET caps the estimated raster memory of running jobs
+# (0 = no memory limit).
+ADMISSION_QUEUE_SIZE = int(os.environ.get("DOCEDITOR_ADMISSION_QUEUE", "8"))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("DOCEDITOR_ADMISSION_TIMEOUT", "30"))
+ADMISSION_MEMORY_BUDGET = int(os.environ.get("DOCEDITOR_ADMISSION_MEMORY_MB", "1024")) * 1024 * 1024
+ADMISSION_RETRY_AFTER = int(os.environ.get("DOCEDITOR_ADMISSION_RETRY_AFTER", "5"))  # seconds
+
+# /metrics: how long the storage usage gauge may be cached (walking the tree is O(files))
+STORAGE_METRICS_TTL = float(os.environ.get("DOCEDITOR_STORAGE_METRICS_TTL", "60"))
+
+# Opt-in request profiling: disabled unless a token is set. Requests carrying
+# "X-DocEditor-Profile: <token>" (or armed via /api/admin/profiling) are
+# profiled and their traces kept under PROFILE_DIR (newest PROFILE_KEEP)
+PROFILE_TOKEN = os.environ.get("DOCEDITOR_PROFILE_TOKEN", "")
+PROFILE_DIR = os.path.join(STORAGE_DIR, "profiles")
+PROFILE_KEEP = int(os.environ.get("DOCEDITOR_PROFILE_KEEP", "50"))
+
+# Audit log writer: "async" buffers entries and commits them in batches from a
+# background thread, "sync" commits every entry before the request returns.
+AUDIT_LOG_MODE = os.environ.get("DOCEDITOR_AUDIT_MODE", "async")
+AUDIT_BATCH_SIZE = int(os.environ.get("DOCEDITOR_AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get("DOCEDITOR_AUDIT_FLUSH_INTERVAL", "1.0"))  # seconds
+AUDIT_QUEUE_SIZE = int(os.environ.get("DOCEDITOR_AUDIT_QUEUE_SIZE", "10000"))
+# How long log() blocks on a full queue before writing the entry synchronously
+AUDIT_ENQUEUE_TIMEOUT = float(os.environ.get("DOCEDITOR_AUDIT_ENQUEUE_TIMEOUT", "2.0"))
+
+# Audit retention: archive_audit_log.py moves entries older than this into
+# compressed segments under AUDIT_ARCHIVE_DIR (still readable via /api/audit-log)
+AUDIT_ARCHIVE_DIR = os.path.join(STORAGE_DIR, "audit_archive")
+AUDIT_RETENTION_DAYS = int(os.environ.get("DOCEDITOR_AUDIT_RETENTION_DAYS", "90"))
+AUDIT_ARCHIVE_SEGMENT_SIZE = int(os.environ.get("DOCEDITOR_AUDIT_ARCHIVE_SEGMENT_SIZE", "50000"))
+
+
+def ensure_storage_dirs():
+    """Create the storage directories. Called from init_db, never on import."""
+    for d in [ORIGINALS_DIR, CURRENT_DIR, ANNOTATIONS_DIR, METADATA_DIR, UPLOADS_DIR]:
+        os.makedirs(d, exist_ok=True)
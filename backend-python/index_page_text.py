@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Build the full-text search index for PDFs that are not indexed yet.
+
+Run from the backend-python directory:
+    python index_page_text.py [--all] [--workers N]
+
+New uploads and edits keep the index up to date on their own; this covers
+files from before the index existed and files whose index update failed.
+--all re-extracts every PDF. Safe to re-run after an interruption.
+"""
+
+import argparse
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Ensure backend-python is on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import config
+from models.database import get_session, init_db, remove_session
+from models.db_models import File
+from models.text_index import TextIndex
+from models.version_store import VersionStore
+
+
+def index_one(file_id: str, rebuild: bool) -> str:
+    try:
+        if not rebuild and TextIndex.indexed(file_id):
+            return "skipped"
+        path = VersionStore.get_current_path(file_id)
+        if not path:
+            return "missing"
+        TextIndex.index_file(file_id, path)
+        return "indexed"
+    except Exception as e:
+        print(f"  {file_id}: {e}")
+        return "failed"
+    finally:
+        remove_session()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--all", action="store_true", help="re-extract every PDF, not only unindexed ones")
+    parser.add_argument("--workers", type=int, default=max(1, config.CPU_POOL_WORKERS),
+                        help="files extracted in parallel")
+    args = parser.parse_args()
+
+    init_db(config.DATABASE_URL)
+    session = get_session()
+    file_ids = [fid for (fid,) in session.query(File.file_id).filter(File.file_type == "pdf")]
+    session.close()
+
+    counts: dict[str, int] = {}
+    with ThreadPoolExecutor(args.workers) as pool:
+        for i, status in enumerate(pool.map(lambda fid: index_one(fid, args.all), file_ids), 1):
+            counts[status] = counts.get(status, 0) + 1
+            if i % 100 == 0:
+                print(f"  {i}/{len(file_ids)} …")
+    print(", ".join(f"{status}: {n}" for status, n in sorted(counts.items())) or "No PDFs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""Migration script: add the ingest columns to the files table.
+
+Run once from the backend-python directory:
+    python migrate_add_file_metadata.py
+
+New databases get these columns from init_db(); create_all() does not add
+columns to tables that already exist, so older databases need this script.
+
+What it does:
+  1. Adds every column declared on the models that is missing in the DB
+     (all of them nullable, so this is a metadata-only change)
+  2. Fills size, sha256, mime_type and page_count/width/height for files
+     uploaded before, from their originals (reads every original once)
+"""
+
+import os
+import sys
+
+# Ensure backend-python is on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+
+import config
+from models import database, ingest, storage
+from models.db_models import File
+from models.version_store import VersionStore
+
+
+def migrate():
+    database.init_db(config.DATABASE_URL)
+    engine = database.engine
+    inspector = inspect(engine)
+
+    print("Step 1: Adding missing columns …")
+    added = 0
+    for table in database.Base.metadata.sorted_tables:
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = column.type.compile(dialect=engine.dialect)
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {ddl}"))
+            print(f"  {table.name}.{column.name}: added")
+            added += 1
+    print(f"  Added {added} column(s)\n")
+
+    print("Step 2: Backfilling file metadata …")
+    session = database.get_session()
+    filled = missing = failed = 0
+    for f in session.query(File).filter(File.sha256.is_(None)).all():
+        path = storage.local_path(VersionStore.original_key(f.file_id, f.ext))
+        if path is None:
+            missing += 1
+            continue
+        with open(path, "rb") as fh:
+            fmt = ingest.sniff(fh.read(ingest.SNIFF_BYTES))
+        try:
+            details = ingest.info(path, fmt or ingest.format_for(f.ext), os.path.getsize(path))
+        except ValueError as e:
+            print(f"  {f.file_id}: {e}")
+            failed += 1
+            continue
+        for name, value in details.items():
+            setattr(f, name, value)
+        filled += 1
+        if filled % 100 == 0:
+            session.commit()
+    session.commit()
+    session.close()
+    print(f"  Filled {filled}, original missing {missing}, unreadable {failed}\n")
+
+    print("Migration complete!")
+
+
+if __name__ == "__main__":
+    print("DocEditor file metadata migration")
+    print("=" * 40)
+    migrate()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Migration script: add the listing indexes to an existing database.
+
+Run once from the backend-python directory:
+    python migrate_add_indexes.py
+
+New databases get these indexes from init_db(); create_all() does not add
+indexes to tables that already exist, so older databases need this script.
+Index creation on a large audit_log table can take a while and locks the
+table on SQLite, so run it during a maintenance window.
+
+What it does:
+  1. Creates every index declared on the models that is missing in the DB
+  2. Runs ANALYZE so the query planner picks the new indexes up
+"""
+
+import os
+import sys
+import time
+
+# Ensure backend-python is on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import inspect, text
+
+import config
+from models import database
+from models import db_models  # noqa: F401 - ensure models are registered
+
+
+def migrate():
+    database.init_db(config.DATABASE_URL)
+    engine = database.engine
+    inspector = inspect(engine)
+
+    print("Step 1: Creating missing indexes …")
+    created = 0
+    for table in database.Base.metadata.sorted_tables:
+        existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name in existing:
+                print(f"  {index.name}: exists")
+                continue
+            start = time.monotonic()
+            index.create(engine)
+            print(f"  {index.name}: created in {time.monotonic() - start:.1f}s")
+            created += 1
+    print(f"  Created {created} index(es)\n")
+
+    print("Step 2: Updating planner statistics …")
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    print("  Done\n")
+
+    print("Migration complete!")
+
+
+if __name__ == "__main__":
+    print("DocEditor index migration")
+    print("=" * 40)
+    migrate()
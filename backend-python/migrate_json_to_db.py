@@ -1,54 +1,125 @@
 #!/usr/bin/env python3
-"""One-time migration: import existing JSON metadata into SQLAlchemy DB."""
+"""One-time migration: import existing JSON metadata into SQLAlchemy DB.
+
+Run from the backend-python directory:
+    python migrate_json_to_db.py [--dry-run] [--workers N] [--batch-size N]
+
+metadata/*.json is processed in sorted chunks. Each chunk checks which ids
+already exist with one query, bulk-inserts the rest and commits, so an
+interrupted run resumes where it stopped (the last committed file name is
+kept in metadata/.migration_checkpoint). Files edited under the old version
+model get their latest version copied to current/ on a thread pool.
+"""
+import argparse
 import json
 import os
 import sys
 from datetime import datetime
 
+# Ensure backend-python is on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import insert
+
 import config
+from migrate_v1_to_v2 import Progress, promote_all
 from models.database import init_db, get_session
-from models.db_models import File, FileVersion
-
-init_db(config.DATABASE_URL)
-session = get_session()
-
-count = 0
-for fname in os.listdir(config.METADATA_DIR):
-    if not fname.endswith(".json"):
-        continue
-    file_id = fname[:-5]
-
-    # Skip if already in DB
-    if session.get(File, file_id):
-        print(f"  SKIP {file_id} (already in DB)")
-        continue
-
-    with open(os.path.join(config.METADATA_DIR, fname)) as f:
-        meta = json.load(f)
-
-    file_obj = File(
-        file_id=meta["file_id"],
-        original_name=meta["original_name"],
-        file_type=meta["file_type"],
-        ext=meta["ext"],
-        created_at=datetime.fromisoformat(meta["created_at"]),
-        current_version=meta["current_version"],
+from models.db_models import File
+
+CHECKPOINT_PATH = os.path.join(config.METADATA_DIR, ".migration_checkpoint")
+
+
+def read_checkpoint() -> str:
+    if not os.path.exists(CHECKPOINT_PATH):
+        return ""
+    with open(CHECKPOINT_PATH) as f:
+        return f.read().strip()
+
+
+def write_checkpoint(name: str):
+    tmp = CHECKPOINT_PATH + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(name)
+    os.replace(tmp, CHECKPOINT_PATH)
+
+
+def load_meta(fname: str) -> dict | None:
+    try:
+        with open(os.path.join(config.METADATA_DIR, fname)) as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"  {fname}: unreadable ({e})")
+        return None
+
+
+def migrate(dry_run: bool = False, workers: int = 8, batch_size: int = 1000):
+    init_db(config.DATABASE_URL)
+    session = get_session()
+
+    checkpoint = "" if dry_run else read_checkpoint()
+    names = sorted(
+        e.name for e in os.scandir(config.METADATA_DIR)
+        if e.name.endswith(".json") and e.name > checkpoint
     )
-    session.add(file_obj)
-
-    for v in meta.get("versions", []):
-        version_obj = FileVersion(
-            file_id=meta["file_id"],
-            version=v["version"],
-            created_at=datetime.fromisoformat(v["created_at"]),
-            action=v["action"],
-            details=json.dumps(v.get("details", {})),
-        )
-        session.add(version_obj)
-
-    count += 1
-    print(f"  Migrated: {file_id} ({meta['original_name']})")
-
-session.commit()
-session.close()
-print(f"\nDone. Migrated {count} file(s).")
+    if checkpoint:
+        print(f"Resuming after {checkpoint}")
+    print(f"{len(names)} metadata file(s) to process\n")
+
+    progress = Progress("metadata", every=batch_size)
+    copies = Progress("current/", every=batch_size)
+    for start in range(0, len(names), batch_size):
+        chunk = names[start:start + batch_size]
+        metas = []
+        for name in chunk:
+            meta = load_meta(name)
+            if meta is None:
+                progress.add("unreadable")
+            else:
+                metas.append(meta)
+        existing = {
+            fid for (fid,) in session.query(File.file_id)
+            .filter(File.file_id.in_([m["file_id"] for m in metas]))
+        }
+
+        rows, to_promote = [], []
+        for meta in metas:
+            if meta["file_id"] in existing:
+                progress.add("skipped")
+                continue
+            rows.append({
+                "file_id": meta["file_id"],
+                "original_name": meta["original_name"],
+                "file_type": meta["file_type"],
+                "ext": meta["ext"],
+                "created_at": datetime.fromisoformat(meta["created_at"]),
+            })
+            if meta.get("current_version", 0) > 0:
+                to_promote.append((meta["file_id"], meta["ext"], meta["current_version"]))
+            progress.add("imported")
+
+        # Copy before committing: a crash in between repeats the chunk, and
+        # promote_version skips files that already made it to current/
+        promote_all(to_promote, workers, dry_run, copies)
+        if not dry_run:
+            if rows:
+                session.execute(insert(File), rows)
+            session.commit()
+            write_checkpoint(chunk[-1])
+
+    session.close()
+    progress.report()
+    copies.report()
+    print("\nDry run complete, nothing was changed." if dry_run else "\nDone.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import JSON metadata into the database")
+    parser.add_argument("--dry-run", action="store_true", help="report only, change nothing")
+    parser.add_argument("--workers", type=int, default=8, help="parallel file copies")
+    parser.add_argument("--batch-size", type=int, default=1000, help="files per commit")
+    args = parser.parse_args()
+    migrate(dry_run=args.dry_run, workers=args.workers, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
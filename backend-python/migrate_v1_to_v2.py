@@ -2,7 +2,7 @@
 """Migration script: DocEditor v1 (FileVersion model) → v2 (current/ + annotations/).
 
 Run once from the backend-python directory:
-    python migrate_v1_to_v2.py
+    python migrate_v1_to_v2.py [--dry-run] [--workers N] [--batch-size N] [--yes]
 
 What it does:
   1. For each file with current_version > 0, copies the highest version file
@@ -10,12 +10,20 @@ What it does:
   2. Drops the file_versions table
   3. Removes the current_version column from the files table
   4. Removes all versions/ subdirectories
+
+Files are read from the database in batches and copied by a thread pool.
+Every copy goes to a temporary name first, so an interrupted run can simply
+be restarted: files already present in current/ are skipped. --dry-run
+reports what would be copied and removed without touching anything.
 """
 
+import argparse
 import os
 import shutil
 import sqlite3
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Ensure backend-python is on the path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -23,61 +31,113 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import config
 
 
-def migrate():
+class Progress:
+    """Prints a one-line status every ``every`` items and a final summary."""
+
+    def __init__(self, label: str, every: int = 1000):
+        self.label = label
+        self.every = every
+        self.counts: dict[str, int] = {}
+        self.total = 0
+        self.start = time.monotonic()
+
+    def add(self, outcome: str):
+        self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        self.total += 1
+        if self.total % self.every == 0:
+            self.report()
+
+    def report(self):
+        elapsed = time.monotonic() - self.start
+        rate = self.total / elapsed if elapsed else 0.0
+        parts = "".join(f", {k}: {v}" for k, v in sorted(self.counts.items()))
+        print(f"  {self.label}: {self.total} processed ({rate:.0f}/s){parts}")
+
+
+def find_version_file(file_id: str, ext: str, current_v: int) -> str | None:
+    """Return the versions/ file for current_v, or the highest one available."""
+    src = os.path.join(config.VERSIONS_DIR, file_id, f"v{current_v}.{ext}")
+    if os.path.exists(src):
+        return src
+    vdir = os.path.join(config.VERSIONS_DIR, file_id)
+    if not os.path.isdir(vdir):
+        return None
+    candidates = []
+    for fn in os.listdir(vdir):
+        if fn.startswith("v") and fn.endswith(f".{ext}"):
+            try:
+                candidates.append(int(fn[1:fn.index(".")]))
+            except ValueError:
+                pass
+    if not candidates:
+        return None
+    return os.path.join(vdir, f"v{max(candidates)}.{ext}")
+
+
+def promote_version(file_id: str, ext: str, current_v: int, dry_run: bool = False) -> str:
+    """Copy the latest version of a file to current/. Returns the outcome."""
+    dest = os.path.join(config.CURRENT_DIR, f"{file_id}.{ext}")
+    if os.path.exists(dest):
+        return "skipped"
+    src = find_version_file(file_id, ext, current_v)
+    if not src:
+        return "missing"
+    if dry_run:
+        return "copied"
+    tmp = dest + ".part"
+    shutil.copy2(src, tmp)
+    os.replace(tmp, dest)
+    return "copied"
+
+
+def promote_all(rows, workers: int, dry_run: bool, progress: Progress):
+    """Run promote_version for (file_id, ext, current_v) rows on a thread pool."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(promote_version, fid, ext, v, dry_run) for fid, ext, v in rows]
+        for (fid, _, _), fut in zip(rows, futures):
+            try:
+                progress.add(fut.result())
+            except OSError as e:
+                print(f"  {fid}: copy failed ({e})")
+                progress.add("failed")
+
+
+def migrate(dry_run: bool = False, workers: int = 8, batch_size: int = 1000):
     db_path = config.DATABASE_URL.replace("sqlite:///", "")
     if not os.path.exists(db_path):
         print(f"Database not found at {db_path}")
         sys.exit(1)
 
     conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
     cur = conn.cursor()
+    os.makedirs(config.CURRENT_DIR, exist_ok=True)
 
     # --- 1. Copy highest version to current/ ---
     print("Step 1: Migrating version files to current/ …")
+    progress = Progress("files", every=batch_size)
     try:
-        cur.execute("SELECT file_id, ext, current_version FROM files")
-        rows = cur.fetchall()
+        cur.execute("SELECT file_id, ext, current_version FROM files WHERE current_version > 0")
     except sqlite3.OperationalError:
         # current_version column might already be gone
         print("  current_version column not found, skipping file migration")
-        rows = []
-
-    moved = 0
-    for row in rows:
-        file_id = row["file_id"]
-        ext = row["ext"]
-        current_v = row["current_version"] if "current_version" in row.keys() else 0
-
-        if current_v == 0:
-            continue  # still at original, nothing to migrate
-
-        src = os.path.join(config.VERSIONS_DIR, file_id, f"v{current_v}.{ext}")
-        if not os.path.exists(src):
-            # Search for the highest available version file
-            vdir = os.path.join(config.VERSIONS_DIR, file_id)
-            src = None
-            if os.path.isdir(vdir):
-                candidates = []
-                for fn in os.listdir(vdir):
-                    if fn.startswith("v") and fn.endswith(f".{ext}"):
-                        try:
-                            candidates.append(int(fn[1:fn.index(".")]))
-                        except ValueError:
-                            pass
-                if candidates:
-                    best = max(candidates)
-                    src = os.path.join(vdir, f"v{best}.{ext}")
-
-        if src and os.path.exists(src):
-            dest = os.path.join(config.CURRENT_DIR, f"{file_id}.{ext}")
-            shutil.copy2(src, dest)
-            print(f"  {file_id}: v{current_v} → current/")
-            moved += 1
-        else:
-            print(f"  {file_id}: no version file found, skipping")
-
-    print(f"  Migrated {moved} file(s) to current/\n")
+    else:
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            promote_all(rows, workers, dry_run, progress)
+    progress.report()
+    print()
+
+    if dry_run:
+        count = 0
+        if os.path.isdir(config.VERSIONS_DIR):
+            count = sum(1 for e in os.scandir(config.VERSIONS_DIR) if e.is_dir())
+        print("Step 2–4 (dry run): would drop file_versions, remove the current_version column")
+        print(f"  and remove {count} versions/ director(y/ies)\n")
+        conn.close()
+        print("Dry run complete, nothing was changed.")
+        return
 
     # --- 2. Drop file_versions table ---
     print("Step 2: Dropping file_versions table …")
@@ -90,53 +150,68 @@ def migrate():
 
     # --- 3. Remove current_version column ---
     print("Step 3: Removing current_version column from files …")
-    try:
-        cur.execute("ALTER TABLE files DROP COLUMN current_version")
-        conn.commit()
-        print("  Dropped column directly\n")
-    except sqlite3.OperationalError as e:
-        print(f"  Direct DROP COLUMN failed ({e}), recreating table …")
-        # Fallback: recreate table without current_version
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS files_v2 (
-                file_id   TEXT PRIMARY KEY,
-                original_name TEXT NOT NULL,
-                file_type TEXT NOT NULL,
-                ext       TEXT NOT NULL,
-                created_at DATETIME
-            )
-        """)
-        cur.execute("""
-            INSERT OR IGNORE INTO files_v2 (file_id, original_name, file_type, ext, created_at)
-            SELECT file_id, original_name, file_type, ext, created_at FROM files
-        """)
-        cur.execute("DROP TABLE files")
-        cur.execute("ALTER TABLE files_v2 RENAME TO files")
-        conn.commit()
-        print("  Recreated files table without current_version\n")
+    columns = [row[1] for row in cur.execute("PRAGMA table_info(files)")]
+    if "current_version" not in columns:
+        print("  Already removed\n")
+    else:
+        try:
+            cur.execute("ALTER TABLE files DROP COLUMN current_version")
+            conn.commit()
+            print("  Dropped column directly\n")
+        except sqlite3.OperationalError as e:
+            print(f"  Direct DROP COLUMN failed ({e}), recreating table …")
+            # Fallback: recreate table without current_version
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS files_v2 (
+                    file_id   TEXT PRIMARY KEY,
+                    original_name TEXT NOT NULL,
+                    file_type TEXT NOT NULL,
+                    ext       TEXT NOT NULL,
+                    created_at DATETIME
+                )
+            """)
+            cur.execute("""
+                INSERT OR IGNORE INTO files_v2 (file_id, original_name, file_type, ext, created_at)
+                SELECT file_id, original_name, file_type, ext, created_at FROM files
+            """)
+            cur.execute("DROP TABLE files")
+            cur.execute("ALTER TABLE files_v2 RENAME TO files")
+            conn.commit()
+            print("  Recreated files table without current_version\n")
 
     # --- 4. Remove versions/ subdirectories ---
     print("Step 4: Cleaning up versions/ subdirectories …")
-    removed = 0
+    progress = Progress("directories", every=batch_size)
     if os.path.isdir(config.VERSIONS_DIR):
-        for name in os.listdir(config.VERSIONS_DIR):
-            full = os.path.join(config.VERSIONS_DIR, name)
-            if os.path.isdir(full):
-                shutil.rmtree(full)
-                print(f"  Removed versions/{name}")
-                removed += 1
-    print(f"  Removed {removed} director(y/ies)\n")
+        dirs = [e.path for e in os.scandir(config.VERSIONS_DIR) if e.is_dir()]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(shutil.rmtree, dirs):
+                progress.add("removed")
+    progress.report()
+    print()
 
     conn.close()
     print("Migration complete!")
 
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="DocEditor v1 → v2 migration")
+    parser.add_argument("--dry-run", action="store_true", help="report only, change nothing")
+    parser.add_argument("--workers", type=int, default=8, help="parallel file copies")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows fetched per batch")
+    parser.add_argument("--yes", action="store_true", help="do not ask for confirmation")
+    args = parser.parse_args()
+
     print("DocEditor v1 → v2 Migration")
     print("=" * 40)
-    confirm = input("Proceed? (yes/no): ").strip().lower()
-    if confirm != "yes":
-        print("Aborted.")
-        sys.exit(0)
+    if not args.dry_run and not args.yes:
+        confirm = input("Proceed? (yes/no): ").strip().lower()
+        if confirm != "yes":
+            print("Aborted.")
+            sys.exit(0)
     print()
-    migrate()
+    migrate(dry_run=args.dry_run, workers=args.workers, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Admission control for CPU-heavy operations.
+
+Every ``cpu_pool.run`` call passes through ``admit``. An operation runs when
+fewer than ``CPU_OPERATION_LIMITS[operation]`` calls of it are running and
+its estimated memory fits into ``ADMISSION_MEMORY_BUDGET`` alongside the
+jobs already running. Otherwise the caller waits in a bounded per-operation
+queue: a full queue is rejected immediately (429), a wait longer than
+``ADMISSION_QUEUE_TIMEOUT`` gives up (503). Limits apply per worker process.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from models import metrics
+from models.database import get_session
+from models.db_models import File
+
+# Peak bytes per raster pixel while a page is processed: the RGB pixmap, its
+# PNG encoding and the grayscale working copies ImageEnhancer keeps around
+RASTER_BYTES_PER_PIXEL = 8
+# Assumed for a PDF whose largest page is not recorded yet (A4, in points)
+DEFAULT_PAGE_SIZE = (595, 842)
+
+
+class Overloaded(Exception):
+    """An operation was not admitted; answered with 429/503 and Retry-After."""
+
+    def __init__(self, operation: str, status: int, reason: str):
+        super().__init__(f"Server busy: too many '{operation}' requests, retry later")
+        self.operation = operation
+        self.status = status
+        self.reason = reason
+        self.retry_after = config.ADMISSION_RETRY_AFTER
+
+
+_cond = threading.Condition()
+_running: dict[str, int] = {}
+_waiting: dict[str, int] = {}
+_memory_in_use = 0
+
+
+def _limit(operation: str) -> int:
+    return config.CPU_OPERATION_LIMITS.get(operation, config.CPU_POOL_WORKERS or 1)
+
+
+def _fits(operation: str, cost: int) -> bool:
+    if _running.get(operation, 0) >= _limit(operation):
+        return False
+    budget = config.ADMISSION_MEMORY_BUDGET
+    # A job larger than the whole budget may still run, but only on its own
+    return not budget or _memory_in_use == 0 or _memory_in_use + cost <= budget
+
+
+def _reject(operation: str, status: int, reason: str):
+    metrics.ADMISSION_REJECTED.inc(operation=operation, reason=reason)
+    raise Overloaded(operation, status, reason)
+
+
+@contextmanager
+def admit(operation: str, cost: int = 0):
+    """Hold a slot for ``operation`` with an estimated peak memory of ``cost`` bytes."""
+    global _memory_in_use
+    with _cond:
+        if not _fits(operation, cost):
+            if _waiting.get(operation, 0) >= config.ADMISSION_QUEUE_SIZE:
+                _reject(operation, 429, "queue_full")
+            _waiting[operation] = _waiting.get(operation, 0) + 1
+            deadline = time.monotonic() + config.ADMISSION_QUEUE_TIMEOUT
+            try:
+                while not _fits(operation, cost):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        _reject(operation, 503, "timeout")
+                    _cond.wait(remaining)
+            finally:
+                _waiting[operation] -= 1
+        _running[operation] = _running.get(operation, 0) + 1
+        _memory_in_use += cost
+    try:
+        yield
+    finally:
+        with _cond:
+            _running[operation] -= 1
+            _memory_in_use -= cost
+            _cond.notify_all()
+
+
+def state() -> dict:
+    """Snapshot for /metrics: running/waiting per operation and reserved bytes."""
+    with _cond:
+        return {"running": dict(_running), "waiting": dict(_waiting), "memory": _memory_in_use}
+
+
+# --- Cost estimates (cheap: stored metadata and image headers only) ---
+
+def pdf_raster_cost(file_id: str, scale: float = 2.0) -> int:
+    """Peak bytes for rasterizing the largest page of a stored PDF at ``scale``.
+
+    The page size is the one recorded with the page manifest (File.width and
+    height, in points), so the PDF itself is not opened before admission.
+    """
+    session = get_session()
+    f = session.get(File, file_id)
+    size = (f.width, f.height) if f is not None and f.width and f.height else DEFAULT_PAGE_SIZE
+    session.close()
+    # Points are 1/72 in; the pixmap matrix scales points to pixels
+    return int(size[0] * size[1] * scale * scale * RASTER_BYTES_PER_PIXEL)
+
+
+def image_raster_cost(paths: list[str]) -> int:
+    """Peak bytes for processing the largest of ``paths`` one at a time."""
+    from PIL import Image
+    largest = 0
+    for path in paths:
+        with Image.open(path) as img:  # reads the header only
+            largest = max(largest, img.width * img.height)
+    return largest * RASTER_BYTES_PER_PIXEL
+
+
+def file_cost(paths: list[str]) -> int:
+    """Bytes for operations that hold whole documents in memory (merge)."""
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
@@ -1,49 +1,40 @@
 import json
-import os
-import shutil
 from datetime import datetime, timezone
 
-import config
+from models import file_lock, storage
 
 
 class AnnotationStore:
     @staticmethod
-    def _path(file_id: str, user: str) -> str:
-        d = os.path.join(config.ANNOTATIONS_DIR, file_id)
-        os.makedirs(d, exist_ok=True)
-        return os.path.join(d, f"{user}.json")
+    def _key(file_id: str, user: str) -> str:
+        return f"annotations/{file_id}/{user}.json"
 
     @staticmethod
     def list_users(file_id: str) -> list[str]:
-        d = os.path.join(config.ANNOTATIONS_DIR, file_id)
-        if not os.path.isdir(d):
-            return []
-        return [fn[:-5] for fn in os.listdir(d) if fn.endswith(".json")]
+        return [name[:-5] for name in storage.list_keys(f"annotations/{file_id}/") if name.endswith(".json")]
 
     @classmethod
     def get(cls, file_id: str, user: str) -> dict:
-        path = cls._path(file_id, user)
-        if not os.path.exists(path):
+        data = storage.read(cls._key(file_id, user))
+        if data is None:
             return {"user": user, "updated_at": None, "fabric_pages": {}, "text_overlays": []}
-        with open(path, "r", encoding="utf-8") as fh:
-            return json.load(fh)
+        return json.loads(data)
 
     @classmethod
     def save(cls, file_id: str, user: str, data: dict):
         data["user"] = user
         data["updated_at"] = datetime.now(timezone.utc).isoformat()
-        path = cls._path(file_id, user)
-        with open(path, "w", encoding="utf-8") as fh:
-            json.dump(data, fh, ensure_ascii=False, indent=2)
+        body = json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+        # Stored in one step, so a concurrent get() never reads half a layer
+        with file_lock.edit(file_id, "annotations"):
+            storage.write(cls._key(file_id, user), body)
 
     @classmethod
     def delete(cls, file_id: str, user: str):
-        path = cls._path(file_id, user)
-        if os.path.exists(path):
-            os.remove(path)
+        with file_lock.edit(file_id, "annotations"):
+            storage.delete(cls._key(file_id, user))
 
     @staticmethod
     def delete_all(file_id: str):
-        d = os.path.join(config.ANNOTATIONS_DIR, file_id)
-        if os.path.isdir(d):
-            shutil.rmtree(d)
+        with file_lock.edit(file_id, "annotations"):
+            storage.delete_prefix(f"annotations/{file_id}/")
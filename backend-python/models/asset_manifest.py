@@ -0,0 +1,136 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from dataclasses import dataclass
+
+from models import metrics
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip variants are built
+    brotli = None
+
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+MIN_COMPRESS_SIZE = 256
+
+# src="/js/app.js" / href="css/main.css" references inside index.html
+_REF_RE = re.compile(r'(src|href)="/?([^":#?]+)"')
+
+
+@dataclass
+class Asset:
+    path: str             # logical path, e.g. "js/app.js"
+    hashed_path: str      # e.g. "js/app.3f2a1b9c0d.js"
+    mimetype: str
+    etag: str
+    body: bytes
+    gzip: bytes | None = None
+    br: bytes | None = None
+
+    def variant(self, accept_encoding: str) -> tuple[bytes, str | None]:
+        """Pick the smallest encoding the client accepts."""
+        accepted = {p.split(";")[0].strip() for p in accept_encoding.lower().split(",")}
+        if self.br is not None and "br" in accepted:
+            return self.br, "br"
+        if self.gzip is not None and ("gzip" in accepted or "*" in accepted):
+            return self.gzip, "gzip"
+        return self.body, None
+
+
+def _build_asset(root: str, rel: str) -> Asset:
+    with open(os.path.join(root, rel), "rb") as fh:
+        body = fh.read()
+    digest = hashlib.sha256(body).hexdigest()[:10]
+    stem, dot, ext = rel.rpartition(".")
+    hashed = f"{stem}.{digest}.{ext}" if dot and "/" not in ext else f"{rel}.{digest}"
+    mimetype = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+    asset = Asset(rel, hashed, mimetype, digest, body)
+    if len(body) >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE):
+        gz = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(gz) < len(body):
+            asset.gzip = gz
+        if brotli is not None:
+            br = brotli.compress(body, quality=11)
+            if len(br) < len(body):
+                asset.br = br
+    return asset
+
+
+class AssetManifest:
+    """In-memory copy of the frontend directory with content-hashed names.
+
+    All files are read, hashed and pre-compressed once; afterwards lookups by
+    logical ("js/app.js") or hashed ("js/app.<hash>.js") path are dict hits.
+    index.html is rewritten per mount point to reference the hashed names.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._assets: dict[str, Asset] = {}
+        self._by_hashed: dict[str, Asset] = {}
+        self._index_cache: dict[str, Asset] = {}
+        self._stamp = None
+
+    def _scan_stamp(self):
+        stamp = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for fn in filenames:
+                st = os.stat(os.path.join(dirpath, fn))
+                stamp.append((dirpath, fn, st.st_mtime_ns, st.st_size))
+        return sorted(stamp)
+
+    def load(self, check_changes: bool = False):
+        """Build the manifest on first use; with check_changes rebuild on edits (dev)."""
+        if self._stamp is not None and not check_changes:
+            return
+        stamp = self._scan_stamp() if check_changes or self._stamp is None else self._stamp
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            assets = {}
+            for dirpath, _, filenames in os.walk(self.root):
+                for fn in filenames:
+                    rel = os.path.relpath(os.path.join(dirpath, fn), self.root).replace(os.sep, "/")
+                    assets[rel] = _build_asset(self.root, rel)
+            self._assets = assets
+            self._by_hashed = {a.hashed_path: a for a in assets.values()}
+            self._index_cache = {}
+            self._stamp = stamp
+
+    def lookup(self, path: str) -> tuple[Asset | None, bool]:
+        """Return (asset, is_hashed_name) for a request path."""
+        asset = self._by_hashed.get(path)
+        if asset is not None:
+            return asset, True
+        return self._assets.get(path), False
+
+    def index(self, base_url: str) -> Asset | None:
+        """index.html with asset references rewritten to ``base_url`` + hashed names."""
+        cached = self._index_cache.get(base_url)
+        metrics.cache_lookup("spa_index", cached is not None)
+        if cached is not None:
+            return cached
+        source = self._assets.get("index.html")
+        if source is None:
+            return None
+
+        def repl(m):
+            asset = self._assets.get(m.group(2))
+            if asset is None or asset.path == "index.html":
+                return m.group(0)
+            return f'{m.group(1)}="{base_url}{asset.hashed_path}"'
+
+        html = _REF_RE.sub(repl, source.body.decode("utf-8")).encode("utf-8")
+        digest = hashlib.sha256(html).hexdigest()[:10]
+        asset = Asset("index.html", "index.html", "text/html", digest, html,
+                      gzip=gzip.compress(html, compresslevel=9, mtime=0))
+        if brotli is not None:
+            asset.br = brotli.compress(html, quality=11)
+        self._index_cache[base_url] = asset
+        return asset
@@ -0,0 +1,187 @@
+import gzip
+import json
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func
+
+import config
+from models import metrics
+from models.database import get_session
+from models.db_models import AuditLogEntry
+
+
+def _parse_ts(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+class AuditArchive:
+    """Append-only, gzip-compressed JSONL segments for aged-out audit entries.
+
+    Layout under ``config.AUDIT_ARCHIVE_DIR``:
+      segment-<min_id>-<max_id>.jsonl.gz   entries in id order, never rewritten
+      index.jsonl                          one line per segment: id range,
+                                           time range and the file_ids it holds
+
+    Each archive run moves a contiguous id range, so the archive always holds
+    ids below every live row and readers can continue seamlessly from the
+    table into the segments.
+    """
+
+    _index_lock = threading.Lock()
+    _index_cache: tuple[tuple[int, int], list[dict]] | None = None
+
+    @staticmethod
+    def _index_path() -> str:
+        return os.path.join(config.AUDIT_ARCHIVE_DIR, "index.jsonl")
+
+    @classmethod
+    def load_index(cls) -> list[dict]:
+        """Segment descriptors in id order (cached until index.jsonl changes)."""
+        path = cls._index_path()
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return []
+        key = (st.st_mtime_ns, st.st_size)
+        with cls._index_lock:
+            if cls._index_cache and cls._index_cache[0] == key:
+                metrics.cache_lookup("audit_archive_index", True)
+                return cls._index_cache[1]
+            metrics.cache_lookup("audit_archive_index", False)
+            segments = []
+            with open(path, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        segments.append(json.loads(line))
+                    except ValueError:
+                        continue  # half-written line from a concurrent archive run
+            segments.sort(key=lambda s: s["min_id"])
+            cls._index_cache = (key, segments)
+            return segments
+
+    @classmethod
+    def archive(cls, max_age: timedelta | None = None) -> dict:
+        """Move entries older than ``max_age`` from the table into segments.
+
+        Returns a summary with the number of entries and segments written.
+        """
+        if max_age is None:
+            max_age = timedelta(days=config.AUDIT_RETENTION_DAYS)
+        cutoff = datetime.now(timezone.utc) - max_age
+        os.makedirs(config.AUDIT_ARCHIVE_DIR, exist_ok=True)
+
+        segments = cls.load_index()
+        archived_max = segments[-1]["max_id"] if segments else 0
+
+        session = get_session()
+        try:
+            # Finish a previous run that wrote its segment but died before deleting
+            session.query(AuditLogEntry).filter(AuditLogEntry.id <= archived_max) \
+                .delete(synchronize_session=False)
+            session.commit()
+
+            boundary = session.query(func.max(AuditLogEntry.id)) \
+                .filter(AuditLogEntry.timestamp < cutoff).scalar()
+            newest = session.query(func.max(AuditLogEntry.id)).scalar()
+            if boundary is None or newest is None:
+                return {"entries": 0, "segments": 0}
+            # Always keep the newest row live: SQLite reuses ids of an emptied table
+            boundary = min(boundary, newest - 1)
+
+            moved = written = 0
+            while archived_max < boundary:
+                rows = (
+                    session.query(AuditLogEntry)
+                    .filter(AuditLogEntry.id > archived_max, AuditLogEntry.id <= boundary)
+                    .order_by(AuditLogEntry.id)
+                    .limit(config.AUDIT_ARCHIVE_SEGMENT_SIZE)
+                    .all()
+                )
+                if not rows:
+                    break
+                entries = [r.to_dict(AuditLogEntry.FIELDS) for r in rows]
+                cls._write_segment(entries)
+                archived_max = entries[-1]["id"]
+                session.query(AuditLogEntry).filter(AuditLogEntry.id <= archived_max) \
+                    .delete(synchronize_session=False)
+                session.commit()
+                session.expunge_all()
+                moved += len(entries)
+                written += 1
+            return {"entries": moved, "segments": written}
+        finally:
+            session.close()
+
+    @classmethod
+    def _write_segment(cls, entries: list[dict]):
+        min_id, max_id = entries[0]["id"], entries[-1]["id"]
+        name = f"segment-{min_id:012d}-{max_id:012d}.jsonl.gz"
+        path = os.path.join(config.AUDIT_ARCHIVE_DIR, name)
+        tmp = path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+            for e in entries:
+                fh.write(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n")
+        with open(tmp, "rb") as fh:
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+
+        timestamps = [e["timestamp"] for e in entries if e["timestamp"]]
+        descriptor = {
+            "segment": name,
+            "min_id": min_id,
+            "max_id": max_id,
+            "count": len(entries),
+            "min_ts": min(timestamps) if timestamps else None,
+            "max_ts": max(timestamps) if timestamps else None,
+            "file_ids": sorted({e["file_id"] for e in entries if e["file_id"]}),
+        }
+        with open(cls._index_path(), "a", encoding="utf-8") as fh:
+            fh.write(json.dumps(descriptor, separators=(",", ":")) + "\n")
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    @classmethod
+    def read(cls, limit: int, before_id: int | None = None, file_id: str = "", user: str = "",
+             action: str = "", since: datetime | None = None, until: datetime | None = None,
+             fields: list[str] | None = None) -> list[tuple[int, dict]]:
+        """Return up to ``limit`` archived ``(id, entry)`` pairs, newest first."""
+        result = []
+        for seg in reversed(cls.load_index()):
+            if before_id is not None and seg["min_id"] >= before_id:
+                continue
+            if file_id and file_id not in seg["file_ids"]:
+                continue
+            if since and seg["max_ts"] and _parse_ts(seg["max_ts"]) < since:
+                continue
+            if until and seg["min_ts"] and _parse_ts(seg["min_ts"]) >= until:
+                continue
+            for e in reversed(cls._read_segment(seg["segment"])):
+                if before_id is not None and e["id"] >= before_id:
+                    continue
+                if file_id and e["file_id"] != file_id:
+                    continue
+                if user and e["user"] != user:
+                    continue
+                if action and e["action"] != action:
+                    continue
+                ts = _parse_ts(e["timestamp"])
+                if since and (ts is None or ts < since):
+                    continue
+                if until and (ts is None or ts >= until):
+                    continue
+                entry = {f: e[f] for f in fields or AuditLogEntry.DEFAULT_FIELDS}
+                result.append((e["id"], entry))
+                if len(result) >= limit:
+                    return result
+        return result
+
+    @staticmethod
+    def _read_segment(name: str) -> list[dict]:
+        path = os.path.join(config.AUDIT_ARCHIVE_DIR, name)
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            return [json.loads(line) for line in fh if line.strip()]
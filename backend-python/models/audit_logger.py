@@ -1,32 +1,217 @@
+import atexit
 import json
+import logging
+import os
+import queue
+import threading
 from datetime import datetime, timezone
 
+from sqlalchemy.orm import load_only
+
+import config
+from models.audit_archive import AuditArchive
 from models.database import get_session
 from models.db_models import AuditLogEntry
 
+log = logging.getLogger(__name__)
+
+
+def _write_entries(rows: list[dict]):
+    """Insert a batch of audit rows in a single transaction."""
+    session = get_session()
+    try:
+        session.add_all([AuditLogEntry(**row) for row in rows])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+class _BatchWriter:
+    """Background thread that commits queued audit rows in batches.
+
+    A batch is written once ``batch_size`` rows are waiting or ``flush_interval``
+    seconds have passed since the first row arrived, whichever comes first.
+    The queue is bounded: when it is full, ``submit`` blocks up to ``timeout``
+    seconds and reports failure so the caller can fall back to a direct write.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, queue_size: int):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+        self._queue = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._done = threading.Condition()
+        self._submitted = 0
+        self._committed = 0
+
+    def _ensure_running(self):
+        # Re-create queue and thread after fork (e.g. gunicorn --preload) so a
+        # child never replays or waits on the parent's pending rows.
+        if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                self._queue = queue.Queue(maxsize=self.queue_size)
+                self._submitted = self._committed = 0
+                self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, row: dict, timeout: float) -> bool:
+        self._ensure_running()
+        try:
+            self._queue.put(row, timeout=timeout)
+        except queue.Full:
+            return False
+        with self._done:
+            self._submitted += 1
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def flush(self):
+        """Block until every row submitted so far has been committed."""
+        if self._pid != os.getpid() or self._queue is None:
+            return
+        if not (self._thread and self._thread.is_alive()):
+            self._drain()
+            return
+        with self._done:
+            target = self._submitted
+        self._wake.set()
+        with self._done:
+            self._done.wait_for(lambda: self._committed >= target, timeout=30)
+
+    def stop(self):
+        """Write out pending rows and stop the background thread."""
+        if self._pid != os.getpid() or self._queue is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout=max(5.0, self.flush_interval * 2))
+        self._drain()
+
+    def _take(self, batch: list[dict]):
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+    def _commit(self, batch: list[dict]):
+        try:
+            _write_entries(batch)
+        except Exception:
+            log.exception("Failed to write %d audit log entries", len(batch))
+        finally:
+            with self._done:
+                self._committed += len(batch)
+                self._done.notify_all()
+
+    def _drain(self):
+        while True:
+            batch: list[dict] = []
+            self._take(batch)
+            if not batch:
+                return
+            self._commit(batch)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            if self._queue.qsize() + 1 < self.batch_size:
+                self._wake.wait(self.flush_interval)
+            batch = [first]
+            self._take(batch)
+            self._commit(batch)
+            if self._queue.empty():
+                self._wake.clear()
+
+
+_writer = _BatchWriter(config.AUDIT_BATCH_SIZE, config.AUDIT_FLUSH_INTERVAL, config.AUDIT_QUEUE_SIZE)
+atexit.register(_writer.stop)
+
 
 class AuditLogger:
     @classmethod
     def log(cls, action: str, file_id: str = "", user: str = "anonymous", details: dict | None = None):
-        session = get_session()
-        entry = AuditLogEntry(
-            timestamp=datetime.now(timezone.utc),
-            user=user,
-            action=action,
-            file_id=file_id,
-            details=json.dumps(details or {}),
-        )
-        session.add(entry)
-        session.commit()
-        session.close()
+        row = {
+            "timestamp": datetime.now(timezone.utc),
+            "user": user,
+            "action": action,
+            "file_id": file_id,
+            "details": json.dumps(details or {}),
+        }
+        if config.AUDIT_LOG_MODE == "sync":
+            _write_entries([row])
+        elif not _writer.submit(row, config.AUDIT_ENQUEUE_TIMEOUT):
+            # Queue still full after waiting: write directly rather than drop the entry
+            _write_entries([row])
 
     @classmethod
-    def get_log(cls, limit: int = 100, file_id: str = "") -> list[dict]:
+    def flush(cls):
+        """Commit all buffered entries (no-op in sync mode)."""
+        _writer.flush()
+
+    @classmethod
+    def get_page(cls, limit: int = 100, file_id: str = "", user: str = "", action: str = "",
+                 since: datetime | None = None, until: datetime | None = None,
+                 before_id: int | None = None,
+                 fields: list[str] | None = None) -> tuple[list[dict], int | None]:
+        """Return up to ``limit`` entries older than ``before_id`` (oldest first).
+
+        The second element is the id to pass as ``before_id`` for the next
+        (older) page, or None when there are no more entries.
+        """
+        cls.flush()
         session = get_session()
         query = session.query(AuditLogEntry)
+        if fields:
+            query = query.options(load_only(*[getattr(AuditLogEntry, f) for f in fields]))
         if file_id:
             query = query.filter(AuditLogEntry.file_id == file_id)
-        query = query.order_by(AuditLogEntry.id.desc()).limit(limit)
-        entries = [e.to_dict() for e in query.all()]
+        if user:
+            query = query.filter(AuditLogEntry.user == user)
+        if action:
+            query = query.filter(AuditLogEntry.action == action)
+        if since:
+            query = query.filter(AuditLogEntry.timestamp >= since)
+        if until:
+            query = query.filter(AuditLogEntry.timestamp < until)
+        if before_id is not None:
+            query = query.filter(AuditLogEntry.id < before_id)
+        rows = query.order_by(AuditLogEntry.id.desc()).limit(limit).all()
+        entries = [e.to_dict(fields) for e in rows]
+        oldest_id = rows[-1].id if rows else before_id
         session.close()
-        return list(reversed(entries))
+
+        if len(entries) < limit:
+            # Live rows exhausted: continue into the archive, which only holds older ids
+            archived = AuditArchive.read(
+                limit - len(entries), before_id=oldest_id, file_id=file_id, user=user,
+                action=action, since=since, until=until, fields=fields,
+            )
+            entries.extend(entry for _, entry in archived)
+            if archived:
+                oldest_id = archived[-1][0]
+        next_id = oldest_id if len(entries) == limit else None
+        return list(reversed(entries)), next_id
+
+    @classmethod
+    def get_log(cls, limit: int = 100, file_id: str = "") -> list[dict]:
+        return cls.get_page(limit, file_id)[0]
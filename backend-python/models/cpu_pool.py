@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import config
+from models import admission, metrics, tracing
+
+_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool, _pool_pid
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+    with _lock:
+        if _pool is None or _pool_pid != os.getpid():
+            # spawn, not fork: the parent runs threads (audit writer, OpenCV)
+            # whose locks must not be inherited mid-operation
+            ctx = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=config.CPU_POOL_WORKERS, mp_context=ctx)
+            _pool_pid = os.getpid()
+    return _pool
+
+
+def _run_captured(fn, args, kwargs, traced=False):
+    # Executed in the pool process: hand stage timings (and spans when the
+    # calling request is profiled) back to the caller
+    trace = tracing.start("pool_worker") if traced else None
+    try:
+        with metrics.capture() as samples:
+            result = fn(*args, **kwargs)
+    finally:
+        if trace is not None:
+            tracing.stop()
+    return result, samples, trace.finish() if trace is not None else None
+
+
+def run(operation: str, fn, *args, cost: int = 0, **kwargs):
+    """Run ``fn(*args, **kwargs)`` in the shared process pool and return its result.
+
+    ``fn`` must be importable by name (a module-level function or a static
+    method) and take/return picklable values - processors exchange file
+    paths, so only short strings cross the process boundary. With
+    ``CPU_POOL_WORKERS = 0`` calls run inline.
+
+    Calls are admitted by ``admission.admit(operation, cost)`` where ``cost``
+    is the estimated peak memory in bytes; raises ``admission.Overloaded``
+    when the operation's queue is full or the wait times out.
+
+    Pool processes are spawned, so the ``__main__`` module must be safe to
+    import (guard scripts with ``if __name__ == "__main__":``).
+    """
+    global _pool
+    with tracing.span(f"cpu_pool.{operation}"), admission.admit(operation, cost):
+        if config.CPU_POOL_WORKERS <= 0:
+            return fn(*args, **kwargs)
+        pool = _get_pool()
+        trace = tracing.active()
+        submitted_ms = trace.elapsed_ms() if trace is not None else 0.0
+        try:
+            result, samples, spans = pool.submit(
+                _run_captured, fn, args, kwargs, trace is not None
+            ).result()
+            metrics.replay(samples)
+            if spans is not None:
+                trace.graft([spans], submitted_ms)
+            return result
+        except BrokenProcessPool:
+            # A worker died (e.g. a crash inside a native library): start a
+            # fresh pool for the next call instead of failing forever
+            with _lock:
+                if _pool is pool:
+                    _pool = None
+            raise
+
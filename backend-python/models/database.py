@@ -1,24 +1,78 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import declarative_base, sessionmaker, scoped_session
 
+import config
+
 Base = declarative_base()
 engine = None
 SessionFactory = None
 ScopedSession = None
 
 
+def _sqlite_pragmas(database_url: str) -> list[str]:
+    pragmas = [
+        f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}",
+    ]
+    # WAL needs a real file; in-memory databases keep their MEMORY journal
+    if ":memory:" not in database_url and database_url.rstrip("/") != "sqlite:":
+        pragmas.insert(0, f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+    return pragmas
+
+
 def init_db(database_url: str):
     global engine, SessionFactory, ScopedSession
 
+    config.ensure_storage_dirs()
     connect_args = {}
+    engine_args = {}
     if database_url.startswith("sqlite"):
         connect_args["check_same_thread"] = False
+        # pysqlite's own lock wait, in seconds; kept in line with busy_timeout
+        connect_args["timeout"] = config.SQLITE_BUSY_TIMEOUT_MS / 1000
+    else:
+        engine_args.update(
+            pool_size=config.DB_POOL_SIZE,
+            max_overflow=config.DB_MAX_OVERFLOW,
+            pool_recycle=config.DB_POOL_RECYCLE,
+            pool_pre_ping=config.DB_POOL_PRE_PING,
+        )
+
+    engine = create_engine(database_url, connect_args=connect_args, **engine_args)
+
+    if database_url.startswith("sqlite"):
+        pragmas = _sqlite_pragmas(database_url)
+
+        @event.listens_for(engine, "connect")
+        def _set_sqlite_pragmas(dbapi_conn, connection_record):
+            cursor = dbapi_conn.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
 
-    engine = create_engine(database_url, connect_args=connect_args)
     SessionFactory = sessionmaker(bind=engine)
     ScopedSession = scoped_session(SessionFactory)
     Base.metadata.create_all(engine)
 
 
+def _dispose_after_fork():
+    # Pooled connections must not be shared with the parent (gunicorn --preload)
+    if engine is not None:
+        engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_dispose_after_fork)
+
+
 def get_session():
     return ScopedSession()
+
+
+def remove_session(exc=None):
+    """Release the current thread's session; registered as app teardown hook."""
+    if ScopedSession is not None:
+        ScopedSession.remove()
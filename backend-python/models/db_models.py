@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, DateTime, Integer, String, Text
+from sqlalchemy import DDL, BigInteger, Column, DateTime, Index, Integer, String, Text, event
 
 from models.database import Base
 
@@ -13,15 +13,33 @@ class File(Base):
     file_type = Column(String(32), nullable=False)  # "pdf" or "image"
     ext = Column(String(16), nullable=False)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    # Recorded while the upload is streamed to disk (NULL for files from before that)
+    size = Column(BigInteger)
+    sha256 = Column(String(64))
+    mime_type = Column(String(64))
+    page_count = Column(Integer)  # PDFs
+    width = Column(Integer)  # images: pixels; PDFs: largest page in points (see PageManifest)
+    height = Column(Integer)
+    # Bumped by every change of a PDF's pages (see PageManifest); NULL = no manifest yet
+    revision = Column(Integer)
 
-    def to_dict(self) -> dict:
-        return {
-            "file_id": self.file_id,
-            "original_name": self.original_name,
-            "file_type": self.file_type,
-            "ext": self.ext,
-            "created_at": self.created_at.isoformat() if self.created_at else None,
-        }
+    # Listing order is (created_at desc, file_id desc); file_id breaks ties for keyset paging
+    __table_args__ = (
+        Index("ix_files_created_at_file_id", "created_at", "file_id"),
+        Index("ix_files_file_type_created_at", "file_type", "created_at", "file_id"),
+    )
+
+    FIELDS = ("file_id", "original_name", "file_type", "ext", "created_at",
+              "size", "sha256", "mime_type", "page_count", "width", "height", "revision")
+
+    def to_dict(self, fields: list[str] | None = None) -> dict:
+        result = {}
+        for name in fields or self.FIELDS:
+            value = getattr(self, name)
+            if name == "created_at":
+                value = value.isoformat() if value else None
+            result[name] = value
+        return result
 
 
 class AuditLogEntry(Base):
@@ -34,12 +52,112 @@ class AuditLogEntry(Base):
     file_id = Column(String(64), default="")
     details = Column(Text, default="{}")  # JSON string
 
-    def to_dict(self) -> dict:
+    # Every listing filters on one column and pages by id (newest first)
+    __table_args__ = (
+        Index("ix_audit_log_file_id_id", "file_id", "id"),
+        Index("ix_audit_log_user_id", "user", "id"),
+        Index("ix_audit_log_action_id", "action", "id"),
+        Index("ix_audit_log_timestamp", "timestamp"),
+    )
+
+    FIELDS = ("id", "timestamp", "user", "action", "file_id", "details")
+    # The response shape from before paging; "id" only on request (fields=id,...)
+    DEFAULT_FIELDS = ("timestamp", "user", "action", "file_id", "details")
+
+    def to_dict(self, fields: list[str] | None = None) -> dict:
         import json
+        result = {}
+        for name in fields or self.DEFAULT_FIELDS:
+            value = getattr(self, name)
+            if name == "timestamp":
+                value = value.isoformat() if value else None
+            elif name == "details":
+                value = json.loads(value) if value else {}
+            result[name] = value
+        return result
+
+
+class HistoryEntry(Base):
+    """One version of a file; ``delta`` (JSON) holds what is needed to rebuild it.
+
+    PDFs: ``{"pages": [["o", n] | ["b", hash], ...]}``, page n of the original or
+    a stored page blob. Images: ``{"op": [name, args]}`` applied to the previous
+    version, ``{"snapshot": blob}`` or ``{"reset": true}``. ``"restored": v``
+    marks a version brought back from v (for images, that is all it holds).
+    """
+    __tablename__ = "history"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_id = Column(String(64), nullable=False)
+    version = Column(Integer, nullable=False)  # 0 = original
+    action = Column(String(64), nullable=False)
+    user = Column(String(128), default="anonymous")
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    delta = Column(Text, nullable=False, default="{}")
+
+    __table_args__ = (
+        Index("ix_history_file_id_version", "file_id", "version", unique=True),
+    )
+
+    def to_dict(self) -> dict:
         return {
-            "timestamp": self.timestamp.isoformat() if self.timestamp else None,
-            "user": self.user,
+            "version": self.version,
             "action": self.action,
-            "file_id": self.file_id,
-            "details": json.loads(self.details) if self.details else {},
+            "user": self.user,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
         }
+
+
+class Page(Base):
+    """One entry of a PDF's page manifest: a stable page identity and its content hash."""
+    __tablename__ = "pages"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_id = Column(String(64), nullable=False)
+    position = Column(Integer, nullable=False)  # 0-based, follows the current/ page order
+    page_id = Column(String(32), nullable=False)  # kept while the page moves or changes
+    content_hash = Column(String(64), nullable=False)
+    revision = Column(Integer, nullable=False)  # file revision in which the content last changed
+
+    __table_args__ = (
+        Index("ix_pages_file_id_position", "file_id", "position", unique=True),
+    )
+
+    def to_dict(self) -> dict:
+        return {"page_id": self.page_id, "hash": self.content_hash, "revision": self.revision}
+
+
+class PageText(Base):
+    """Extracted text of one PDF page; every page has a row, image-only pages an empty one."""
+    __tablename__ = "page_text"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    file_id = Column(String(64), nullable=False)
+    page = Column(Integer, nullable=False)  # 0-based, follows the current/ page order
+    text = Column(Text, nullable=False, default="")
+
+    # Not unique: renumbering after delete/reorder shifts pages in place
+    __table_args__ = (
+        Index("ix_page_text_file_id_page", "file_id", "page"),
+    )
+
+
+# Full-text index over page_text.text, maintained by the database itself.
+# SQLite: external-content FTS5 table kept in sync by triggers (renumbering
+# pages does not touch the index). PostgreSQL: GIN index on the tsvector.
+_SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS page_text_fts USING fts5("
+    "text, content='page_text', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS page_text_ai AFTER INSERT ON page_text BEGIN "
+    "INSERT INTO page_text_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER IF NOT EXISTS page_text_ad AFTER DELETE ON page_text BEGIN "
+    "INSERT INTO page_text_fts(page_text_fts, rowid, text) VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER IF NOT EXISTS page_text_au AFTER UPDATE OF text ON page_text BEGIN "
+    "INSERT INTO page_text_fts(page_text_fts, rowid, text) VALUES ('delete', old.id, old.text); "
+    "INSERT INTO page_text_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+for _statement in _SQLITE_FTS:
+    event.listen(PageText.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+event.listen(PageText.__table__, "after_create", DDL(
+    "CREATE INDEX IF NOT EXISTS ix_page_text_tsv ON page_text USING gin (to_tsvector('simple', text))"
+).execute_if(dialect="postgresql"))
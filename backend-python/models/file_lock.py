@@ -0,0 +1,188 @@
+"""Per-file locks shared by all worker processes (and nodes, on PostgreSQL).
+
+Each file has three locks:
+
+- ``edit(file_id)`` is exclusive and held for a whole read-modify-write of
+  current/ (read, process in the CPU pool, store), so two workers editing the
+  same file run one after the other instead of one losing its update.
+  ``edit(file_id, "annotations")`` does the same for the annotation layers.
+- ``write(file_id)`` is exclusive and held only while an edit commits:
+  current/ is replaced and the page manifest and tiles are brought in line.
+- ``read(file_id)`` is shared and held by readers that need current/ to match
+  its derived state (pages, tiles) or that resolve and open the file. Readers
+  wait for a commit, never for the processing before it.
+
+Backends (``LOCK_BACKEND``): "file" takes flock() locks on files under
+LOCKS_DIR, which covers every worker on one host; "postgres" takes advisory
+locks in the database, which covers every node using it. Locks are reentrant
+per thread (a read lock cannot be upgraded). Waiting longer than LOCK_TIMEOUT
+raises LockTimeout, answered with 503 and Retry-After.
+"""
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from models import metrics
+
+# Poll interval while a lock is taken: starts short, backs off to the maximum
+POLL_MIN, POLL_MAX = 0.002, 0.05
+
+
+class LockTimeout(Exception):
+    """A file lock was not acquired within LOCK_TIMEOUT; answered with 503 and Retry-After."""
+
+    status = 503
+
+    def __init__(self, key: str, mode: str):
+        super().__init__("File is being edited, retry later")
+        self.key = key
+        self.mode = mode
+        self.retry_after = config.ADMISSION_RETRY_AFTER
+
+
+_local = threading.local()
+_held_lock = threading.Lock()
+_held: dict[str, int] = {}  # mode -> locks held in this process
+
+
+def backend() -> str:
+    if config.LOCK_BACKEND != "auto":
+        return config.LOCK_BACKEND
+    return "postgres" if config.DATABASE_URL.startswith("postgresql") else "file"
+
+
+def _poll(try_acquire, key: str, mode: str):
+    """Call ``try_acquire`` until it succeeds; raises LockTimeout after LOCK_TIMEOUT."""
+    deadline = time.monotonic() + config.LOCK_TIMEOUT
+    delay = POLL_MIN
+    while not try_acquire():
+        if time.monotonic() >= deadline:
+            metrics.LOCK_TIMEOUTS.inc(mode=mode)
+            raise LockTimeout(key, mode)
+        time.sleep(delay)
+        delay = min(delay * 2, POLL_MAX)
+
+
+def _flock(key: str, shared: bool, mode: str):
+    import fcntl
+    os.makedirs(config.LOCKS_DIR, exist_ok=True)
+    fd = os.open(os.path.join(config.LOCKS_DIR, f"{key}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+    flag = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+
+    def try_acquire() -> bool:
+        try:
+            fcntl.flock(fd, flag | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    try:
+        _poll(try_acquire, key, mode)
+    except BaseException:
+        os.close(fd)
+        raise
+
+    def release():
+        # Unlock explicitly: a forked pool worker may share the descriptor
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+    return release
+
+
+def _pg_connection():
+    """The thread's lock connection (session-level advisory locks live on it)."""
+    from models import database
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _local.conn = database.engine.connect().execution_options(isolation_level="AUTOCOMMIT")
+        _local.conn_users = 0
+    _local.conn_users += 1
+    return conn
+
+
+def _pg_done():
+    _local.conn_users -= 1
+    if _local.conn_users == 0:
+        _local.conn.close()
+        _local.conn = None
+
+
+def _pg_lock(key: str, shared: bool, mode: str):
+    from sqlalchemy import text
+    lock_id = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big", signed=True)
+    suffix = "_shared" if shared else ""
+    conn = _pg_connection()
+    try:
+        _poll(lambda: conn.execute(text(f"SELECT pg_try_advisory_lock{suffix}(:id)"), {"id": lock_id}).scalar(),
+              key, mode)
+    except BaseException:
+        _pg_done()
+        raise
+
+    def release():
+        try:
+            conn.execute(text(f"SELECT pg_advisory_unlock{suffix}(:id)"), {"id": lock_id})
+        finally:
+            _pg_done()
+    return release
+
+
+@contextmanager
+def _lock(key: str, shared: bool, mode: str):
+    locks = _local.__dict__.setdefault("locks", {})
+    if key in locks:
+        if locks[key] and not shared:
+            raise RuntimeError(f"Cannot upgrade the read lock on {key} to a write lock")
+        yield
+        return
+    name = backend()
+    start = time.perf_counter()
+    release = (_pg_lock if name == "postgres" else _flock)(key, shared, mode)
+    metrics.LOCK_WAIT.observe(time.perf_counter() - start, mode=mode, backend=name)
+    locks[key] = shared
+    with _held_lock:
+        _held[mode] = _held.get(mode, 0) + 1
+    try:
+        yield
+    finally:
+        del locks[key]
+        with _held_lock:
+            _held[mode] -= 1
+        release()
+
+
+def read(file_id: str):
+    """Shared lock on a file's current state."""
+    return _lock(file_id, True, "read")
+
+
+def write(file_id: str):
+    """Exclusive lock for replacing a file's current state."""
+    return _lock(file_id, False, "write")
+
+
+def edit(file_id: str, scope: str = "content"):
+    """Exclusive lock serializing the editors of a file's ``scope`` (content, annotations, upload)."""
+    return _lock(f"{file_id}.{scope}", False, "edit")
+
+
+def discard(file_id: str, scopes: tuple[str, ...] = ("content", "annotations")):
+    """Remove a deleted file's lock files (file backend); called while holding its edit lock.
+
+    A worker still waiting on one of them gets the lock on the unlinked file
+    and then finds the file gone, which it has to handle anyway.
+    """
+    for name in (file_id, *(f"{file_id}.{scope}" for scope in scopes)):
+        try:
+            os.remove(os.path.join(config.LOCKS_DIR, f"{name}.lock"))
+        except OSError:
+            pass
+
+
+def held() -> dict[tuple, int]:
+    """Locks held in this process by mode, for the metrics gauge."""
+    with _held_lock:
+        return {(mode,): n for mode, n in _held.items()}
@@ -1,49 +1,203 @@
+import logging
 import os
 import shutil
 import tempfile
 import uuid
+import zipfile
+import zlib
 from typing import BinaryIO
 
 import config
+from models import admission, cpu_pool, file_lock, ingest, metrics, storage
 from models.annotation_store import AnnotationStore
 from models.audit_logger import AuditLogger
 from models.image_enhancer import ImageEnhancer
 from models.image_processor import ImageProcessor
 from models.pdf_processor import PdfProcessor
+from models.text_index import TextIndex
+from models.tile_cache import TileCache
+from models.upload_store import UploadStore
+from models.version_history import VersionHistory
 from models.version_store import VersionStore
 
+log = logging.getLogger(__name__)
+
 
 class FileManager:
     # --- File operations ---
 
     @staticmethod
-    def upload(filename: str, stream: BinaryIO, user: str = "anonymous") -> dict:
+    def upload_ext(filename: str) -> str:
+        """Validated lower-case extension of an upload's file name."""
         ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
         if ext not in config.ALL_ALLOWED:
             raise ValueError(f"File type .{ext} not allowed")
+        return ext
 
-        file_type = "pdf" if ext == "pdf" else "image"
+    @staticmethod
+    @metrics.timed("file_manager")
+    def upload(filename: str, stream: BinaryIO, user: str = "anonymous") -> dict:
+        """Stream ``stream`` into originals/ (hashed and sniffed on the way)."""
+        ext = FileManager.upload_ext(filename)
         file_id = uuid.uuid4().hex[:12]
-        dest = os.path.join(config.ORIGINALS_DIR, f"{file_id}.{ext}")
-        with open(dest, "wb") as f:
-            shutil.copyfileobj(stream, f)
+        key = VersionStore.original_key(file_id, ext)
+        dest = storage.staging_path(key)
+        try:
+            details = ingest.write_stream(stream, dest, ext, config.MAX_UPLOAD_SIZE)
+            storage.put(key, dest)
+        finally:
+            if os.path.exists(dest):
+                os.remove(dest)
+        return FileManager._register_upload(file_id, filename, ext, details, user)
 
-        meta = VersionStore.create_metadata(file_id, filename, file_type, ext)
-        AuditLogger.log("upload", file_id, user, {"original_name": filename})
-        return meta
+    @staticmethod
+    @metrics.timed("file_manager")
+    def upload_zip(archive: BinaryIO, user: str = "anonymous") -> list[dict]:
+        """Upload every file in a ZIP archive, one entry at a time.
+
+        Each entry is streamed from the archive into storage like a single
+        upload; one that fails does not stop the others. Returns per entry, in
+        archive order, ``{"name", "status": 201, "file": meta}`` or
+        ``{"name", "status": 400 | 413, "error"}``. Directories and macOS
+        metadata (``__MACOSX/``, dot files) are skipped. Raises ValueError for
+        an unreadable archive or more than ZIP_MAX_ENTRIES files.
+        """
+        spool = None
+        if not archive.seekable():
+            # The entry list sits at the end of a ZIP: keep the body in a temp file
+            spool = tempfile.TemporaryFile()
+            shutil.copyfileobj(archive, spool, ingest.CHUNK_SIZE)
+            spool.seek(0)
+            archive = spool
+        try:
+            try:
+                zf = zipfile.ZipFile(archive)
+            except zipfile.BadZipFile as e:
+                raise ValueError(f"Invalid ZIP archive: {e}") from e
+            with zf:
+                entries = [
+                    info for info in zf.infolist()
+                    if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+                    and not info.filename.rsplit("/", 1)[-1].startswith(".")
+                ]
+                if len(entries) > config.ZIP_MAX_ENTRIES:
+                    raise ValueError(f"Archive has more than {config.ZIP_MAX_ENTRIES} files")
+                results = []
+                for info in entries:
+                    try:
+                        if info.file_size > config.MAX_UPLOAD_SIZE:
+                            raise ingest.UploadTooLarge(f"File exceeds {config.MAX_UPLOAD_SIZE // (1024 * 1024)} MB")
+                        with zf.open(info) as stream:
+                            meta = FileManager.upload(info.filename.rsplit("/", 1)[-1], stream, user)
+                        results.append({"name": info.filename, "status": 201, "file": meta})
+                    except ingest.UploadTooLarge as e:
+                        results.append({"name": info.filename, "status": 413, "error": str(e)})
+                    except (ValueError, RuntimeError, NotImplementedError, zipfile.BadZipFile, zlib.error) as e:
+                        # RuntimeError: encrypted entry; NotImplementedError: unsupported compression
+                        results.append({"name": info.filename, "status": 400, "error": str(e)})
+                return results
+        finally:
+            if spool is not None:
+                spool.close()
+
+    @staticmethod
+    @metrics.timed("file_manager")
+    def finish_upload(upload_id: str) -> dict:
+        """Turn a complete chunked upload into a file; the chunks become the original."""
+        state = UploadStore.get(upload_id)
+        if state is None:
+            raise LookupError(upload_id)
+        file_id = uuid.uuid4().hex[:12]
+        key = VersionStore.original_key(file_id, state["ext"])
+        dest = storage.staging_path(key)
+        try:
+            details = UploadStore.take(upload_id, dest)
+            storage.put(key, dest)
+        finally:
+            if os.path.exists(dest):
+                os.remove(dest)
+        return FileManager._register_upload(file_id, state["filename"], state["ext"], details, state["user"])
+
+    @staticmethod
+    def _register_upload(file_id: str, filename: str, ext: str, details: dict, user: str) -> dict:
+        file_type = "pdf" if ext == "pdf" else "image"
+        try:
+            meta = VersionStore.create_metadata(file_id, filename, file_type, ext, **details)
+        except BaseException:
+            storage.delete(VersionStore.original_key(file_id, ext))
+            raise
+        AuditLogger.log("upload", file_id, user, {
+            "original_name": filename, "size": details["size"], "sha256": details["sha256"],
+        })
+        with file_lock.edit(file_id):
+            if file_type == "pdf":
+                FileManager._prepare_current(file_id)
+                FileManager._reindex(file_id, TextIndex.index_file, VersionStore.get_current_path(file_id))
+            FileManager._record_version(file_id, "upload", user)
+        # Re-read: preparing current/ set the manifest revision (and page size) since
+        return VersionStore.get_metadata(file_id) or meta
+
+    @staticmethod
+    def _reindex(file_id: str, update, *args):
+        """Bring the search index in line after an edit, without failing the edit.
+
+        If the update fails the file's rows are dropped, so index_page_text.py
+        picks it up again as unindexed.
+        """
+        try:
+            update(file_id, *args)
+        except Exception as e:
+            log.warning("Text index update for %s failed: %s", file_id, e)
+            try:
+                TextIndex.remove(file_id)
+            except Exception:
+                pass
+
+    @staticmethod
+    def _record_version(file_id: str, action: str, user: str, op: tuple[str, list] | None = None,
+                        restored: int | None = None):
+        """Add the new state of current/ to the version history, without failing the edit."""
+        try:
+            VersionHistory.record(file_id, action, user, op, restored)
+        except Exception as e:
+            log.warning("Version history for %s failed: %s", file_id, e)
+
+    @staticmethod
+    def _prepare_current(file_id: str):
+        """Give a PDF whose original is not linearized a linearized current/ copy.
+
+        originals/ stays byte-for-byte what was uploaded; the viewer is served
+        current/, which then has the same content in "fast web view" layout.
+        Either way the page manifest gets a new revision.
+        """
+        original = VersionStore.get_original_path(file_id)
+        if config.PDF_LINEARIZE and not PdfProcessor.is_linearized(original):
+            try:
+                VersionStore.update_current(file_id, original)
+                return
+            except Exception as e:  # a PDF pikepdf cannot rewrite is still served as is
+                log.warning("Could not linearize %s: %s", file_id, e)
+        VersionStore.record_pages(file_id, original)
 
     @staticmethod
     def list_files() -> list[dict]:
         return VersionStore.list_files()
 
+    @staticmethod
+    def list_files_page(limit: int | None = None, **filters) -> tuple[list[dict], tuple[str, str] | None]:
+        return VersionStore.list_files_page(limit, **filters)
+
     @staticmethod
     def get_file_info(file_id: str) -> dict | None:
         return VersionStore.get_metadata(file_id)
 
     @staticmethod
+    @metrics.timed("file_manager")
     def delete_file(file_id: str, user: str = "anonymous"):
-        VersionStore.delete_file(file_id)
-        AuditLogger.log("delete", file_id, user)
+        with file_lock.edit(file_id):
+            VersionStore.delete_file(file_id)
+            AuditLogger.log("delete", file_id, user)
+            file_lock.discard(file_id)
 
     @staticmethod
     def get_file_path(file_id: str, version=None) -> str | None:
@@ -53,56 +207,149 @@ class FileManager:
     # --- PDF structural operations (write to current/) ---
 
     @staticmethod
+    @metrics.timed("file_manager")
     def pdf_rotate_page(file_id: str, page_num: int, angle: int, user: str = "anonymous"):
-        src = VersionStore.get_current_path(file_id)
-        result = PdfProcessor.rotate_page(src, page_num, angle)
-        VersionStore.update_current(file_id, result)
-        os.unlink(result)
-        AuditLogger.log("pdf_rotate_page", file_id, user, {"page": page_num, "angle": angle})
+        with file_lock.edit(file_id):
+            src = VersionStore.get_current_path(file_id)
+            result = cpu_pool.run("pdf_edit", PdfProcessor.rotate_page, src, page_num, angle)
+            VersionStore.update_current(file_id, result)
+            os.unlink(result)
+            FileManager._reindex(file_id, TextIndex.update_pages, VersionStore.get_current_path(file_id), [page_num])
+            FileManager._record_version(file_id, "pdf_rotate_page", user)
+            AuditLogger.log("pdf_rotate_page", file_id, user, {"page": page_num, "angle": angle})
 
     @staticmethod
+    @metrics.timed("file_manager")
     def pdf_delete_page(file_id: str, page_num: int, user: str = "anonymous"):
-        src = VersionStore.get_current_path(file_id)
-        result = PdfProcessor.delete_page(src, page_num)
-        VersionStore.update_current(file_id, result)
-        os.unlink(result)
-        AuditLogger.log("pdf_delete_page", file_id, user, {"page": page_num})
+        with file_lock.edit(file_id):
+            src = VersionStore.get_current_path(file_id)
+            result = cpu_pool.run("pdf_edit", PdfProcessor.delete_page, src, page_num)
+            VersionStore.update_current(file_id, result)
+            os.unlink(result)
+            FileManager._reindex(file_id, TextIndex.delete_page, page_num)
+            FileManager._record_version(file_id, "pdf_delete_page", user)
+            AuditLogger.log("pdf_delete_page", file_id, user, {"page": page_num})
 
     @staticmethod
+    @metrics.timed("file_manager")
     def pdf_reorder_pages(file_id: str, new_order: list[int], user: str = "anonymous"):
-        src = VersionStore.get_current_path(file_id)
-        result = PdfProcessor.reorder_pages(src, new_order)
-        VersionStore.update_current(file_id, result)
-        os.unlink(result)
-        AuditLogger.log("pdf_reorder_pages", file_id, user, {"order": new_order})
+        with file_lock.edit(file_id):
+            src = VersionStore.get_current_path(file_id)
+            result = cpu_pool.run("pdf_edit", PdfProcessor.reorder_pages, src, new_order)
+            VersionStore.update_current(file_id, result, new_order)
+            os.unlink(result)
+            FileManager._reindex(file_id, TextIndex.reorder, VersionStore.get_current_path(file_id), new_order)
+            FileManager._record_version(file_id, "pdf_reorder_pages", user)
+            AuditLogger.log("pdf_reorder_pages", file_id, user, {"order": new_order})
 
     @staticmethod
-    def pdf_merge(file_ids: list[str], user: str = "anonymous") -> dict:
+    @metrics.timed("file_manager")
+    def pdf_merge(file_ids: list[str], user: str = "anonymous", name: str = "merged.pdf") -> dict:
         paths = []
         for fid in file_ids:
             p = VersionStore.get_current_path(fid)
             if not p:
                 raise ValueError(f"File not found: {fid}")
             paths.append(p)
-        result = PdfProcessor.merge(paths)
+        result = cpu_pool.run("merge", PdfProcessor.merge, paths, cost=admission.file_cost(paths))
+        result = FileManager._auto_optimize("merge", result)
         new_id = uuid.uuid4().hex[:12]
-        dest = os.path.join(config.ORIGINALS_DIR, f"{new_id}.pdf")
-        shutil.move(result, dest)
-        meta = VersionStore.create_metadata(new_id, "merged.pdf", "pdf", "pdf")
+        key = VersionStore.original_key(new_id, "pdf")
+        storage.put(key, result)
+        dest = storage.local_path(key)
+        meta = VersionStore.create_metadata(new_id, name, "pdf", "pdf",
+                                            **ingest.info(dest, "pdf", os.path.getsize(dest)))
+        FileManager._reindex(new_id, TextIndex.merge, dest, file_ids)
         AuditLogger.log("pdf_merge", new_id, user, {"source_files": file_ids})
         return meta
 
     @staticmethod
+    @metrics.timed("file_manager")
     def images_to_pdf(file_ids: list[str], enhance_options: dict | None = None,
-                      user: str = "anonymous") -> dict:
+                      user: str = "anonymous", name: str = "photo-to-pdf.pdf") -> dict:
         if enhance_options is None:
             enhance_options = {}
+        paths = []
+        for fid in file_ids:
+            src = VersionStore.get_current_path(fid)
+            if not src:
+                raise ValueError(f"File not found: {fid}")
+            paths.append(src)
+
+        result = cpu_pool.run("photo_to_pdf", FileManager.build_photo_pdf, paths, enhance_options,
+                              cost=admission.image_raster_cost(paths))
+        result = FileManager._auto_optimize("photo_to_pdf", result)
+        new_id = uuid.uuid4().hex[:12]
+        key = VersionStore.original_key(new_id, "pdf")
+        storage.put(key, result)
+        dest = storage.local_path(key)
+        meta = VersionStore.create_metadata(new_id, name, "pdf", "pdf",
+                                            **ingest.info(dest, "pdf", os.path.getsize(dest)))
+        FileManager._reindex(new_id, TextIndex.index_file, dest)
+        AuditLogger.log("images_to_pdf", new_id, user, {"source_files": file_ids})
+        return meta
+
+    @staticmethod
+    @metrics.timed("file_manager")
+    def pdf_optimize(file_id: str, target_dpi: int | None = None, jpeg_quality: int = 85,
+                     user: str = "anonymous") -> dict:
+        """Compact the current PDF; it is only replaced if the result is smaller."""
+        with file_lock.edit(file_id):
+            src = VersionStore.get_current_path(file_id)
+            if not src:
+                raise ValueError(f"File not found: {file_id}")
+            if not src.endswith(".pdf"):
+                raise ValueError("Not a PDF")
+            result, report = cpu_pool.run("optimize", PdfProcessor.optimize, src, target_dpi, jpeg_quality,
+                                          cost=admission.file_cost([src]))
+            try:
+                report["applied"] = report["bytes_saved"] > 0
+                if report["applied"]:
+                    VersionStore.update_current(file_id, result)
+                    FileManager._record_version(file_id, "pdf_optimize", user)
+            finally:
+                os.unlink(result)
+            AuditLogger.log("pdf_optimize", file_id, user, dict(report, target_dpi=target_dpi))
+            return report
+
+    @staticmethod
+    def _auto_optimize(operation: str, pdf_path: str) -> str:
+        """Optimize a freshly built temp PDF if configured for ``operation``.
+
+        Best effort: the unoptimized result is kept when optimizing does not
+        pay off or the pool is too busy to take the extra job.
+        """
+        if operation not in config.PDF_AUTO_OPTIMIZE:
+            return pdf_path
+        try:
+            result, report = cpu_pool.run("optimize", PdfProcessor.optimize, pdf_path,
+                                          config.PDF_OPTIMIZE_DPI or None,
+                                          cost=admission.file_cost([pdf_path]))
+        except admission.Overloaded:
+            return pdf_path
+        if report["bytes_saved"] <= 0:
+            os.unlink(result)
+            return pdf_path
+        os.unlink(pdf_path)
+        return result
+
+    @staticmethod
+    def _linearized(pdf_path: str) -> str:
+        """Replace a freshly built temp PDF by its linearized version (if enabled)."""
+        if not config.PDF_LINEARIZE:
+            return pdf_path
+        try:
+            return PdfProcessor.linearize(pdf_path)
+        finally:
+            os.unlink(pdf_path)
+
+    @staticmethod
+    @metrics.timed("file_manager")
+    def build_photo_pdf(image_paths: list[str], enhance_options: dict) -> str:
+        """Enhance each photo and combine them into a temp PDF (runs in the CPU pool)."""
         enhanced_paths = []
         try:
-            for fid in file_ids:
-                src = VersionStore.get_current_path(fid)
-                if not src:
-                    raise ValueError(f"File not found: {fid}")
+            for src in image_paths:
                 enhanced = ImageEnhancer.enhance(
                     src,
                     deskew=enhance_options.get("deskew", True),
@@ -111,39 +358,51 @@ class FileManager:
                     threshold=enhance_options.get("threshold", True),
                 )
                 enhanced_paths.append(enhanced)
-
-            result = PdfProcessor.images_to_pdf(enhanced_paths)
-            new_id = uuid.uuid4().hex[:12]
-            dest = os.path.join(config.ORIGINALS_DIR, f"{new_id}.pdf")
-            shutil.move(result, dest)
-            meta = VersionStore.create_metadata(new_id, "photo-to-pdf.pdf", "pdf", "pdf")
-            AuditLogger.log("images_to_pdf", new_id, user, {"source_files": file_ids})
-            return meta
+            return FileManager._linearized(PdfProcessor.images_to_pdf(enhanced_paths))
         finally:
             for p in enhanced_paths:
                 if os.path.exists(p):
                     os.unlink(p)
 
     @staticmethod
+    @metrics.timed("file_manager")
     def pdf_enhance(file_id: str, enhance_options: dict | None = None,
                     user: str = "anonymous"):
+        with file_lock.edit(file_id):
+            if enhance_options is None:
+                enhance_options = {}
+            src = VersionStore.get_current_path(file_id)
+            if not src:
+                raise ValueError(f"File not found: {file_id}")
+            result = cpu_pool.run("enhance", FileManager.build_enhanced_pdf, src, enhance_options,
+                                  cost=admission.pdf_raster_cost(file_id))
+            result = FileManager._auto_optimize("enhance", result)
+            try:
+                VersionStore.update_current(file_id, result)
+            finally:
+                os.unlink(result)
+            # Enhanced pages are images: their old text layer is gone
+            FileManager._reindex(file_id, TextIndex.index_file, VersionStore.get_current_path(file_id))
+            FileManager._record_version(file_id, "pdf_enhance", user)
+            AuditLogger.log("pdf_enhance", file_id, user, enhance_options)
+
+    @staticmethod
+    @metrics.timed("file_manager")
+    def build_enhanced_pdf(src: str, enhance_options: dict) -> str:
+        """Rasterize every page, enhance it and rebuild a temp PDF (runs in the CPU pool)."""
         import fitz
-        if enhance_options is None:
-            enhance_options = {}
-        src = VersionStore.get_current_path(file_id)
-        if not src:
-            raise ValueError(f"File not found: {file_id}")
         doc = fitz.open(src)
         tmp_files = []
         try:
             enhanced_paths = []
             for page in doc:
-                mat = fitz.Matrix(2, 2)
-                pix = page.get_pixmap(matrix=mat)
-                raw = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
-                raw.close()
-                tmp_files.append(raw.name)
-                pix.save(raw.name)
+                with metrics.stage("file_manager", "render_page"):
+                    mat = fitz.Matrix(2, 2)
+                    pix = page.get_pixmap(matrix=mat)
+                    raw = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
+                    raw.close()
+                    tmp_files.append(raw.name)
+                    pix.save(raw.name)
                 enhanced = ImageEnhancer.enhance(
                     raw.name,
                     deskew=enhance_options.get("deskew", True),
@@ -153,94 +412,193 @@ class FileManager:
                 )
                 tmp_files.append(enhanced)
                 enhanced_paths.append(enhanced)
-            result = PdfProcessor.images_to_pdf(enhanced_paths)
-            tmp_files.append(result)
-            VersionStore.update_current(file_id, result)
-            AuditLogger.log("pdf_enhance", file_id, user, enhance_options)
+            return FileManager._linearized(PdfProcessor.images_to_pdf(enhanced_paths))
         finally:
             doc.close()
             for p in tmp_files:
                 if os.path.exists(p):
                     os.unlink(p)
 
+    @staticmethod
+    @metrics.timed("file_manager")
+    def render_enhance_preview(src: str, page_num: int, enhance_options: dict) -> tuple[bytes, bytes]:
+        """Render one page as (original PNG, enhanced PNG) bytes (runs in the CPU pool)."""
+        import fitz
+        doc = fitz.open(src)
+        if page_num >= len(doc):
+            doc.close()
+            raise ValueError("Page out of range")
+        page = doc[page_num]
+        mat = fitz.Matrix(2, 2)
+        pix = page.get_pixmap(matrix=mat)
+        doc.close()
+
+        original = pix.tobytes("png")
+        tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
+        tmp.close()
+        try:
+            pix.save(tmp.name)
+            enhanced_path = ImageEnhancer.enhance(
+                tmp.name,
+                deskew=enhance_options.get("deskew", True),
+                sharpen=enhance_options.get("sharpen", True),
+                contrast=enhance_options.get("contrast", True),
+                threshold=enhance_options.get("threshold", False),
+            )
+            with open(enhanced_path, "rb") as f:
+                enhanced = f.read()
+            os.unlink(enhanced_path)
+        finally:
+            if os.path.exists(tmp.name):
+                os.unlink(tmp.name)
+        return original, enhanced
+
     # --- PDF annotation operations (save to AnnotationStore, no PDF modification) ---
 
     @staticmethod
+    @metrics.timed("file_manager")
     def pdf_add_text_overlay(file_id: str, page_num: int, text: str, x: float, y: float,
                              font_size: float = 12, font_name: str = "Helvetica",
                              color: tuple = (0, 0, 0), user: str = "anonymous"):
-        data = AnnotationStore.get(file_id, user)
-        data.setdefault("text_overlays", []).append({
-            "page": page_num, "text": text, "x": x, "y": y,
-            "font_size": font_size, "font_name": font_name, "color": list(color),
-        })
-        AnnotationStore.save(file_id, user, data)
-        AuditLogger.log("pdf_text_overlay", file_id, user, {"page": page_num, "text": text})
+        with file_lock.edit(file_id, "annotations"):
+            data = AnnotationStore.get(file_id, user)
+            data.setdefault("text_overlays", []).append({
+                "page": page_num, "text": text, "x": x, "y": y,
+                "font_size": font_size, "font_name": font_name, "color": list(color),
+            })
+            AnnotationStore.save(file_id, user, data)
+            AuditLogger.log("pdf_text_overlay", file_id, user, {"page": page_num, "text": text})
 
     @staticmethod
+    @metrics.timed("file_manager")
     def pdf_add_annotations(file_id: str, page_num: int, fabric_json: dict,
                             user: str = "anonymous"):
-        data = AnnotationStore.get(file_id, user)
-        data.setdefault("fabric_pages", {})[str(page_num)] = fabric_json
-        AnnotationStore.save(file_id, user, data)
-        AuditLogger.log("pdf_annotate", file_id, user, {"page": page_num})
+        with file_lock.edit(file_id, "annotations"):
+            data = AnnotationStore.get(file_id, user)
+            data.setdefault("fabric_pages", {})[str(page_num)] = fabric_json
+            AnnotationStore.save(file_id, user, data)
+            AuditLogger.log("pdf_annotate", file_id, user, {"page": page_num})
 
     # --- Image structural operations (write to current/) ---
 
     @staticmethod
+    @metrics.timed("file_manager")
     def image_crop(file_id: str, left: int, top: int, right: int, bottom: int,
                    user: str = "anonymous"):
-        src = VersionStore.get_current_path(file_id)
-        result = ImageProcessor.crop(src, left, top, right, bottom)
-        VersionStore.update_current(file_id, result)
-        os.unlink(result)
-        AuditLogger.log("image_crop", file_id, user,
-                        {"left": left, "top": top, "right": right, "bottom": bottom})
+        with file_lock.edit(file_id):
+            src = VersionStore.get_current_path(file_id)
+            result = cpu_pool.run("image_edit", ImageProcessor.crop, src, left, top, right, bottom,
+                                  cost=admission.image_raster_cost([src]))
+            VersionStore.update_current(file_id, result)
+            os.unlink(result)
+            FileManager._record_version(file_id, "image_crop", user, ("crop", [left, top, right, bottom]))
+            AuditLogger.log("image_crop", file_id, user,
+                            {"left": left, "top": top, "right": right, "bottom": bottom})
 
     @staticmethod
+    @metrics.timed("file_manager")
     def image_resize(file_id: str, width: int, height: int, user: str = "anonymous"):
-        src = VersionStore.get_current_path(file_id)
-        result = ImageProcessor.resize(src, width, height)
-        VersionStore.update_current(file_id, result)
-        os.unlink(result)
-        AuditLogger.log("image_resize", file_id, user, {"width": width, "height": height})
+        with file_lock.edit(file_id):
+            src = VersionStore.get_current_path(file_id)
+            result = cpu_pool.run("image_edit", ImageProcessor.resize, src, width, height,
+                                  cost=admission.image_raster_cost([src]))
+            VersionStore.update_current(file_id, result)
+            os.unlink(result)
+            FileManager._record_version(file_id, "image_resize", user, ("resize", [width, height]))
+            AuditLogger.log("image_resize", file_id, user, {"width": width, "height": height})
 
     @staticmethod
+    @metrics.timed("file_manager")
     def image_rotate(file_id: str, angle: float, user: str = "anonymous"):
-        src = VersionStore.get_current_path(file_id)
-        result = ImageProcessor.rotate(src, angle)
-        VersionStore.update_current(file_id, result)
-        os.unlink(result)
-        AuditLogger.log("image_rotate", file_id, user, {"angle": angle})
+        with file_lock.edit(file_id):
+            src = VersionStore.get_current_path(file_id)
+            result = cpu_pool.run("image_edit", ImageProcessor.rotate, src, angle,
+                                  cost=admission.image_raster_cost([src]))
+            VersionStore.update_current(file_id, result)
+            os.unlink(result)
+            FileManager._record_version(file_id, "image_rotate", user, ("rotate", [angle]))
+            AuditLogger.log("image_rotate", file_id, user, {"angle": angle})
 
     @staticmethod
+    @metrics.timed("file_manager")
     def image_adjust(file_id: str, brightness: float = 1.0, contrast: float = 1.0,
                      saturation: float = 1.0, user: str = "anonymous"):
-        src = VersionStore.get_current_path(file_id)
-        result = ImageProcessor.adjust(src, brightness, contrast, saturation)
-        VersionStore.update_current(file_id, result)
-        os.unlink(result)
-        AuditLogger.log("image_adjust", file_id, user,
-                        {"brightness": brightness, "contrast": contrast, "saturation": saturation})
+        with file_lock.edit(file_id):
+            src = VersionStore.get_current_path(file_id)
+            result = cpu_pool.run("image_edit", ImageProcessor.adjust, src, brightness, contrast, saturation,
+                                  cost=admission.image_raster_cost([src]))
+            VersionStore.update_current(file_id, result)
+            os.unlink(result)
+            FileManager._record_version(file_id, "image_adjust", user,
+                                        ("adjust", [brightness, contrast, saturation]))
+            AuditLogger.log("image_adjust", file_id, user,
+                            {"brightness": brightness, "contrast": contrast, "saturation": saturation})
 
     @staticmethod
+    @metrics.timed("file_manager")
     def image_annotate(file_id: str, overlay_data_url: str, user: str = "anonymous"):
-        src = VersionStore.get_current_path(file_id)
-        result = ImageProcessor.annotate(src, overlay_data_url)
-        VersionStore.update_current(file_id, result)
-        os.unlink(result)
-        AuditLogger.log("image_annotate", file_id, user)
+        with file_lock.edit(file_id):
+            src = VersionStore.get_current_path(file_id)
+            result = cpu_pool.run("image_edit", ImageProcessor.annotate, src, overlay_data_url,
+                                  cost=admission.image_raster_cost([src]))
+            VersionStore.update_current(file_id, result)
+            os.unlink(result)
+            FileManager._record_version(file_id, "image_annotate", user, ("annotate", [overlay_data_url]))
+            AuditLogger.log("image_annotate", file_id, user)
 
     # --- Reset ---
 
     @staticmethod
+    @metrics.timed("file_manager")
     def reset_to_original(file_id: str, user: str = "anonymous"):
         """Delete current/ file and all annotation layers, reverting to original."""
         meta = VersionStore.get_metadata(file_id)
         if not meta:
             raise ValueError(f"File not found: {file_id}")
-        curr = os.path.join(config.CURRENT_DIR, f"{file_id}.{meta['ext']}")
-        if os.path.exists(curr):
-            os.remove(curr)
-        AnnotationStore.delete_all(file_id)
-        AuditLogger.log("reset_to_original", file_id, user)
+        with file_lock.edit(file_id):
+            with file_lock.write(file_id):
+                storage.delete(VersionStore.current_key(file_id, meta["ext"]))
+                if meta["file_type"] == "pdf":
+                    TileCache.invalidate(file_id)
+                    FileManager._prepare_current(file_id)
+            if meta["file_type"] == "pdf":
+                FileManager._reindex(file_id, TextIndex.index_file, VersionStore.get_current_path(file_id))
+            AnnotationStore.delete_all(file_id)
+            FileManager._record_version(file_id, "reset_to_original", user)
+            AuditLogger.log("reset_to_original", file_id, user)
+
+    # --- Version history ---
+
+    @staticmethod
+    @metrics.timed("file_manager")
+    def restore_version(file_id: str, version: int, user: str = "anonymous",
+                        action: str = "restore") -> int | None:
+        """Make ``version`` the current state again; recorded as a new version (returned)."""
+        with file_lock.edit(file_id):
+            meta = VersionStore.get_metadata(file_id)
+            if not meta:
+                raise ValueError(f"File not found: {file_id}")
+            path = VersionHistory.materialize(file_id, version)
+            VersionStore.update_current(file_id, path)
+            if meta["file_type"] == "pdf":
+                FileManager._reindex(file_id, TextIndex.index_file, VersionStore.get_current_path(file_id))
+            new_version = VersionHistory.record(file_id, action, user, restored=version)
+            AuditLogger.log("undo" if action == "undo" else "restore_version", file_id, user, {"version": version})
+            return new_version
+
+    @staticmethod
+    def undo(file_id: str, user: str = "anonymous") -> int | None:
+        """Restore the state before the last change; repeated calls go further back."""
+        with file_lock.edit(file_id):
+            latest = VersionHistory.latest(file_id)
+            if latest is None:
+                raise LookupError("Nothing to undo")
+            # After an undo the newest version is a copy of v: the next undo goes to v - 1.
+            # Any other version, an explicit restore included, is undone by its predecessor.
+            if latest["action"] == "undo":
+                target = latest["restored"] - 1
+            else:
+                target = latest["version"] - 1
+            if target < 0:
+                raise LookupError("Nothing to undo")
+            return FileManager.restore_version(file_id, target, user, action="undo")
@@ -1,8 +1,11 @@
 import math
 import tempfile
+from typing import TYPE_CHECKING
 
-import cv2
-import numpy as np
+from models import metrics
+
+if TYPE_CHECKING:
+    import numpy as np
 
 
 class ImageEnhancer:
@@ -10,33 +13,45 @@ class ImageEnhancer:
     def enhance(input_path: str, deskew: bool = True, sharpen: bool = True,
                 contrast: bool = True, threshold: bool = True) -> str:
         """Enhance a document photo for scanner-like output. Returns path to temp PNG."""
-        gray = cv2.imread(input_path, cv2.IMREAD_GRAYSCALE)
-        if gray is None:
-            # Fallback: load via PIL (e.g. for unusual formats) and convert
-            from PIL import Image
-            gray = np.array(Image.open(input_path).convert("L"))
+        import cv2
+        import numpy as np
+
+        with metrics.stage("image_enhancer", "load"):
+            gray = cv2.imread(input_path, cv2.IMREAD_GRAYSCALE)
+            if gray is None:
+                # Fallback: load via PIL (e.g. for unusual formats) and convert
+                from PIL import Image
+                gray = np.array(Image.open(input_path).convert("L"))
 
         if deskew:
-            gray = ImageEnhancer._deskew(gray)
+            with metrics.stage("image_enhancer", "deskew"):
+                gray = ImageEnhancer._deskew(gray)
         if sharpen:
-            gray = ImageEnhancer._sharpen(gray)
+            with metrics.stage("image_enhancer", "sharpen"):
+                gray = ImageEnhancer._sharpen(gray)
         if contrast:
-            gray = ImageEnhancer._clahe(gray)
+            with metrics.stage("image_enhancer", "clahe"):
+                gray = ImageEnhancer._clahe(gray)
         if threshold:
-            gray = cv2.adaptiveThreshold(
-                gray, 255,
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY,
-                21, 10,
-            )
+            with metrics.stage("image_enhancer", "threshold"):
+                gray = cv2.adaptiveThreshold(
+                    gray, 255,
+                    cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                    cv2.THRESH_BINARY,
+                    21, 10,
+                )
 
         out = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
-        cv2.imwrite(out.name, gray)
+        with metrics.stage("image_enhancer", "encode"):
+            cv2.imwrite(out.name, gray)
         return out.name
 
     @staticmethod
-    def _deskew(gray: np.ndarray) -> np.ndarray:
+    def _deskew(gray: "np.ndarray") -> "np.ndarray":
         """Detect skew angle via Hough lines and rotate to straighten."""
+        import cv2
+        import numpy as np
+
         edges = cv2.Canny(gray, 50, 150, apertureSize=3)
         lines = cv2.HoughLinesP(
             edges, 1, math.pi / 180, threshold=100,
@@ -46,8 +61,8 @@ class ImageEnhancer:
             return gray
 
         angles = []
-        for line in lines:
-            x1, y1, x2, y2 = line[0]
+        # OpenCV returns (N, 1, 4) or (N, 4) depending on version
+        for x1, y1, x2, y2 in lines.reshape(-1, 4):
             angle = math.degrees(math.atan2(y2 - y1, x2 - x1))
             if abs(angle) < 45:
                 angles.append(angle)
@@ -68,13 +83,15 @@ class ImageEnhancer:
         )
 
     @staticmethod
-    def _sharpen(gray: np.ndarray) -> np.ndarray:
+    def _sharpen(gray: "np.ndarray") -> "np.ndarray":
         """Unsharp mask via Gaussian blur subtraction."""
+        import cv2
         blurred = cv2.GaussianBlur(gray, (0, 0), 2)
         return cv2.addWeighted(gray, 1.5, blurred, -0.5, 0)
 
     @staticmethod
-    def _clahe(gray: np.ndarray) -> np.ndarray:
+    def _clahe(gray: "np.ndarray") -> "np.ndarray":
         """CLAHE: adaptive histogram equalisation for uneven lighting."""
+        import cv2
         clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
         return clahe.apply(gray)
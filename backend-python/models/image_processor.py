@@ -2,12 +2,14 @@ import base64
 import io
 import tempfile
 
-from PIL import Image, ImageEnhance
+from models import metrics
 
 
 class ImageProcessor:
     @staticmethod
+    @metrics.timed("image_processor")
     def crop(input_path: str, left: int, top: int, right: int, bottom: int) -> str:
+        from PIL import Image
         img = Image.open(input_path)
         cropped = img.crop((left, top, right, bottom))
         out = tempfile.NamedTemporaryFile(suffix=_suffix(input_path), delete=False)
@@ -15,7 +17,9 @@ class ImageProcessor:
         return out.name
 
     @staticmethod
+    @metrics.timed("image_processor")
     def resize(input_path: str, width: int, height: int) -> str:
+        from PIL import Image
         img = Image.open(input_path)
         resized = img.resize((width, height), Image.LANCZOS)
         out = tempfile.NamedTemporaryFile(suffix=_suffix(input_path), delete=False)
@@ -23,7 +27,9 @@ class ImageProcessor:
         return out.name
 
     @staticmethod
+    @metrics.timed("image_processor")
     def rotate(input_path: str, angle: float) -> str:
+        from PIL import Image
         img = Image.open(input_path)
         rotated = img.rotate(-angle, expand=True)  # negative because PIL rotates counter-clockwise
         out = tempfile.NamedTemporaryFile(suffix=_suffix(input_path), delete=False)
@@ -31,7 +37,9 @@ class ImageProcessor:
         return out.name
 
     @staticmethod
+    @metrics.timed("image_processor")
     def adjust(input_path: str, brightness: float = 1.0, contrast: float = 1.0, saturation: float = 1.0) -> str:
+        from PIL import Image, ImageEnhance
         img = Image.open(input_path)
         if brightness != 1.0:
             img = ImageEnhance.Brightness(img).enhance(brightness)
@@ -44,8 +52,10 @@ class ImageProcessor:
         return out.name
 
     @staticmethod
+    @metrics.timed("image_processor")
     def annotate(input_path: str, overlay_data_url: str) -> str:
         """Composite a PNG overlay (from Fabric.js export as data URL) onto the image."""
+        from PIL import Image
         # Parse data URL
         header, data = overlay_data_url.split(",", 1)
         overlay_bytes = base64.b64decode(data)
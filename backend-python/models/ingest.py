@@ -0,0 +1,163 @@
+"""Streaming upload ingestion.
+
+Upload bodies are written to storage in ``CHUNK_SIZE`` pieces while a SHA-256
+runs over the same bytes and the first bytes are checked against the magic
+number of the claimed extension, so every byte is read and written once.
+Page count and image size are then taken from the PDF xref and the image
+header of the fresh file (still in the page cache), not from a full decode.
+"""
+import hashlib
+import os
+
+from models import metrics
+
+CHUNK_SIZE = 1024 * 1024
+# PDF readers accept junk before "%PDF-" within the first 1024 bytes
+SNIFF_BYTES = 1024
+
+# format -> (mime type, extensions in config.ALLOWED_EXTENSIONS)
+FORMATS = {
+    "pdf": ("application/pdf", ("pdf",)),
+    "png": ("image/png", ("png",)),
+    "jpeg": ("image/jpeg", ("jpg", "jpeg")),
+    "gif": ("image/gif", ("gif",)),
+    "bmp": ("image/bmp", ("bmp",)),
+    "tiff": ("image/tiff", ("tiff",)),
+    "webp": ("image/webp", ("webp",)),
+}
+
+
+class UploadTooLarge(ValueError):
+    """The body exceeds the size limit of the upload path it was sent to."""
+
+
+def sniff(head: bytes) -> str | None:
+    """Format of a file from its first bytes, or None if unrecognized."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head.startswith(b"BM"):
+        return "bmp"
+    if b"%PDF-" in head[:SNIFF_BYTES]:
+        return "pdf"
+    return None
+
+
+def format_for(ext: str) -> str:
+    return next(fmt for fmt, (_, exts) in FORMATS.items() if ext in exts)
+
+
+class Writer:
+    """Hash, sniff and size-check bytes on their way into ``fh``.
+
+    ``size``/``sha``/``head`` continue a partially written file (chunked
+    uploads); ``sha=None`` with ``size > 0`` means the hash of the bytes
+    already on disk is unknown and ``info`` recomputes it from the file.
+    """
+
+    def __init__(self, fh, ext: str, limit: int | None = None,
+                 size: int = 0, sha=None, head: bytes = b""):
+        self.fh = fh
+        self.ext = ext
+        self.limit = limit
+        self.size = size
+        self.sha = sha if sha is not None else (hashlib.sha256() if size == 0 else None)
+        self.head = head
+        self.fmt = None
+        self._sniff(final=False)
+
+    def _sniff(self, final: bool):
+        if self.fmt is not None or not (final or self.head):
+            return
+        fmt = sniff(self.head)
+        if fmt is None and not final and len(self.head) < SNIFF_BYTES:
+            return  # a PDF header may still follow
+        if fmt != format_for(self.ext):
+            found = f"{fmt.upper()} data" if fmt else "unrecognized content"
+            raise ValueError(f"File content does not match .{self.ext} ({found})")
+        self.fmt = fmt
+
+    def write(self, data: bytes):
+        if self.limit is not None and self.size + len(data) > self.limit:
+            raise UploadTooLarge(f"File exceeds {self.limit // (1024 * 1024)} MB")
+        if len(self.head) < SNIFF_BYTES:
+            self.head += data[:SNIFF_BYTES - len(self.head)]
+            self._sniff(final=False)
+        if self.sha is not None:
+            self.sha.update(data)
+        self.fh.write(data)
+        self.size += len(data)
+
+    def copy(self, stream, length: int | None = None):
+        """Write ``stream`` until EOF (or ``length`` bytes) in CHUNK_SIZE pieces."""
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = stream.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            self.write(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+
+    def finish(self):
+        if self.size == 0:
+            raise ValueError("Empty file")
+        self._sniff(final=True)
+
+
+def file_sha256(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while chunk := fh.read(CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def describe(path: str, fmt: str) -> dict:
+    """Page count of a PDF or dimensions of an image, from its header/xref only."""
+    with metrics.stage("ingest", "describe"):
+        if fmt == "pdf":
+            import fitz
+            try:
+                with fitz.open(path, filetype="pdf") as doc:
+                    return {"page_count": doc.page_count}
+            except (RuntimeError, ValueError):
+                raise ValueError("File is not a readable PDF")
+        from PIL import Image
+        try:
+            with Image.open(path) as img:
+                return {"width": img.width, "height": img.height}
+        except OSError:
+            raise ValueError("File is not a readable image")
+
+
+def info(path: str, fmt: str, size: int, sha=None) -> dict:
+    """Column values for the File row of a finished upload."""
+    digest = sha.hexdigest() if sha is not None else file_sha256(path)
+    result = {"size": size, "sha256": digest, "mime_type": FORMATS[fmt][0]}
+    result.update(describe(path, fmt))
+    return result
+
+
+def write_stream(stream, dest: str, ext: str, limit: int | None = None) -> dict:
+    """Stream an upload body to ``dest`` (atomically) and return its File columns."""
+    tmp = dest + ".part"
+    try:
+        with metrics.stage("ingest", "write"), open(tmp, "wb") as fh:
+            writer = Writer(fh, ext, limit)
+            writer.copy(stream)
+            writer.finish()
+        result = info(tmp, writer.fmt, writer.size, writer.sha)
+        os.replace(tmp, dest)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return result
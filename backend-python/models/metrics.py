@@ -0,0 +1,288 @@
+"""In-process metrics registry with Prometheus text exposition.
+
+Counters and histograms live per worker process. Code running inside the
+CPU pool records into a capture list instead (see ``capture``); cpu_pool
+ships those observations back with the result and replays them here, so
+stage timings from pool workers show up in the web worker's /metrics.
+"""
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import config
+from models import tracing
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_capture = threading.local()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        if _recording(self, "inc", amount, key):
+            return
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(labels.get(n, "") for n in self.labels), 0.0)
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, v in sorted(self._values.items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {v}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, labels, buckets
+        self._values: dict[tuple, list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        if _recording(self, "observe", value, key):
+            return
+        self._observe_key(key, value)
+
+    def _observe_key(self, key: tuple, value: float):
+        with _lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, state in sorted(self._values.items()):
+            for bound, n in zip(self.buckets, state):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {n}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_fmt_labels(self.labels, key, le)} {state[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, key)} {state[-1]}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose samples are computed at scrape time by ``fn`` -> {label tuple: value}."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...], fn):
+        self.name, self.help, self.labels, self.fn = name, help_text, labels, fn
+
+    def expose(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, v in sorted(self.fn().items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labels, key)} {v}")
+        return lines
+
+
+_registry: dict[str, object] = {}
+
+
+def _register(metric):
+    _registry[metric.name] = metric
+    return metric
+
+
+def _recording(metric, op: str, value: float, key: tuple) -> bool:
+    samples = getattr(_capture, "samples", None)
+    if samples is None:
+        return False
+    samples.append((metric.name, op, value, key))
+    return True
+
+
+@contextmanager
+def capture():
+    """Collect observations made in this thread instead of applying them."""
+    _capture.samples = []
+    try:
+        yield _capture.samples
+    finally:
+        _capture.samples = None
+
+
+def replay(samples: list[tuple]):
+    """Apply observations collected by ``capture`` (possibly in another process)."""
+    for name, op, value, key in samples:
+        metric = _registry.get(name)
+        if isinstance(metric, Histogram) and op == "observe":
+            metric._observe_key(key, value)
+        elif isinstance(metric, Counter) and op == "inc":
+            with _lock:
+                metric._values[key] = metric._values.get(key, 0.0) + value
+
+
+# --- Metric definitions ---
+
+REQUESTS = _register(Counter(
+    "doceditor_http_requests_total", "HTTP requests by route and status",
+    ("endpoint", "method", "status"),
+))
+REQUEST_LATENCY = _register(Histogram(
+    "doceditor_http_request_duration_seconds", "HTTP request latency by route",
+    ("endpoint", "method"),
+))
+STAGE_LATENCY = _register(Histogram(
+    "doceditor_stage_duration_seconds", "Time spent in processing stages",
+    ("component", "stage"),
+))
+ADMISSION_REJECTED = _register(Counter(
+    "doceditor_admission_rejected_total", "CPU-heavy requests turned away (queue_full=429, timeout=503)",
+    ("operation", "reason"),
+))
+CACHE_REQUESTS = _register(Counter(
+    "doceditor_cache_requests_total", "Cache lookups by cache and result (hit/miss)",
+    ("cache", "result"),
+))
+LOCK_WAIT = _register(Histogram(
+    "doceditor_lock_wait_seconds", "Time spent waiting for per-file locks",
+    ("mode", "backend"),
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+))
+LOCK_TIMEOUTS = _register(Counter(
+    "doceditor_lock_timeouts_total", "Per-file lock waits given up after DOCEDITOR_LOCK_TIMEOUT (503)",
+    ("mode",),
+))
+
+
+@contextmanager
+def stage(component: str, name: str):
+    """Context manager timing one processing stage (and tracing it when profiled)."""
+    with tracing.span(f"{component}.{name}"), STAGE_LATENCY.time(component=component, stage=name):
+        yield
+
+
+def timed(component: str):
+    """Decorator timing a function as stage ``component``/<function name>."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(component, fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _cache_hit_ratio() -> dict[tuple, float]:
+    totals: dict[str, list[float]] = {}
+    for (cache, result), v in list(CACHE_REQUESTS._values.items()):
+        t = totals.setdefault(cache, [0.0, 0.0])
+        t[0 if result == "hit" else 1] += v
+    return {(c,): round(h / (h + m), 4) for c, (h, m) in totals.items() if h + m}
+
+
+_storage_cache: tuple[float, dict] = (0.0, {})
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for e in entries:
+            if e.is_dir(follow_symlinks=False):
+                stack.append(e.path)
+            elif e.is_file(follow_symlinks=False):
+                total += e.stat(follow_symlinks=False).st_size
+    return total
+
+
+def _storage_usage() -> dict[tuple, int]:
+    # Walking the tree is O(files); refresh at most every STORAGE_METRICS_TTL seconds
+    global _storage_cache
+    stamp, values = _storage_cache
+    if time.monotonic() - stamp < config.STORAGE_METRICS_TTL and values:
+        return values
+    values = {
+        ("originals",): _dir_size(config.ORIGINALS_DIR),
+        ("current",): _dir_size(config.CURRENT_DIR),
+        ("annotations",): _dir_size(config.ANNOTATIONS_DIR),
+        ("audit_archive",): _dir_size(config.AUDIT_ARCHIVE_DIR),
+        ("tiles",): _dir_size(config.TILES_DIR),
+        ("history",): _dir_size(config.HISTORY_DIR),
+        ("object_cache",): _dir_size(config.OBJECT_CACHE_DIR),
+    }
+    _storage_cache = (time.monotonic(), values)
+    return values
+
+
+def _audit_queue_depth() -> dict[tuple, int]:
+    from models.audit_logger import _writer
+    q = _writer._queue
+    return {(): q.qsize() if q is not None and _writer._pid == os.getpid() else 0}
+
+
+def _admission(key: str) -> dict[tuple, int]:
+    from models import admission
+    return {(op,): n for op, n in admission.state()[key].items()}
+
+
+def _admission_memory() -> dict[tuple, int]:
+    from models import admission
+    return {(): admission.state()["memory"]}
+
+
+def _locks_held() -> dict[tuple, int]:
+    from models import file_lock
+    return file_lock.held()
+
+
+_register(Gauge("doceditor_cache_hit_ratio", "Hit ratio per cache since start", ("cache",), _cache_hit_ratio))
+_register(Gauge("doceditor_storage_bytes", "Bytes stored per storage area", ("area",), _storage_usage))
+_register(Gauge("doceditor_audit_queue_depth", "Audit entries waiting to be committed", (), _audit_queue_depth))
+_register(Gauge("doceditor_admission_running", "CPU-heavy operations running", ("operation",),
+                lambda: _admission("running")))
+_register(Gauge("doceditor_admission_waiting", "CPU-heavy operations queued", ("operation",),
+                lambda: _admission("waiting")))
+_register(Gauge("doceditor_admission_memory_bytes", "Estimated memory reserved by running operations", (),
+                _admission_memory))
+_register(Gauge("doceditor_locks_held", "Per-file locks currently held by mode", ("mode",), _locks_held))
+
+
+def expose() -> str:
+    lines = []
+    for metric in list(_registry.values()):
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
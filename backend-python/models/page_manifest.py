@@ -0,0 +1,103 @@
+import uuid
+
+from sqlalchemy import delete, select
+
+from models import cpu_pool
+from models.database import get_session
+from models.db_models import File, Page
+from models.pdf_processor import PdfProcessor
+
+
+class PageManifest:
+    """Page identities and content hashes of every PDF, with a revision per file.
+
+    Every write of a PDF's current/ file bumps File.revision and records, per
+    page, a ``page_id`` that stays with the page through rotations, moves and
+    deletions of other pages, its content hash and the revision in which that
+    content last changed. Clients compare two manifests and refetch only the
+    pages whose hash they do not have.
+    """
+
+    @staticmethod
+    def get(file_id: str) -> dict | None:
+        """{"file_id", "revision", "pages": [{"page_id", "hash", "revision"}, ...]}, or None."""
+        session = get_session()
+        f = session.get(File, file_id)
+        if f is None or f.revision is None:
+            session.close()
+            return None
+        pages = session.execute(select(Page).where(Page.file_id == file_id).order_by(Page.position)).scalars()
+        result = {"file_id": file_id, "revision": f.revision, "pages": [p.to_dict() for p in pages]}
+        session.close()
+        return result
+
+    @staticmethod
+    def update(file_id: str, path: str | None, pages: list[int | None] | None = None,
+               hashes: list[str] | None = None, size: tuple[int, int] | None = None):
+        """Record the pages of the PDF at ``path`` as the next revision.
+
+        ``hashes`` and ``size`` (PdfProcessor.page_summary of the file) may
+        be passed instead of ``path`` by callers that computed them outside a
+        lock. The size of the largest page is kept as File.width/height, for
+        the admission cost of rasterizing jobs.
+
+        ``pages[new]`` is the position the page had before the edit (None for
+        a new page), passed by callers that know how pages moved (reorder).
+        Otherwise pages are matched by content hash, and if the page count is
+        unchanged the remaining ones by position (a rotated or enhanced page
+        keeps its id).
+        """
+        if hashes is None:
+            hashes, size = cpu_pool.run("pdf_edit", PdfProcessor.page_summary, path)
+        session = get_session()
+        f = session.get(File, file_id)
+        if f is None:
+            session.close()
+            return
+        old = session.execute(select(Page).where(Page.file_id == file_id).order_by(Page.position)).scalars().all()
+        revision = (f.revision or 0) + 1
+
+        ids: list[str | None] = [None] * len(hashes)
+        if pages is not None:
+            for new, before in enumerate(pages[:len(hashes)]):
+                if before is not None and 0 <= before < len(old):
+                    ids[new] = old[before].page_id
+        else:
+            unused = {}
+            for p in old:
+                unused.setdefault(p.content_hash, []).append(p.page_id)
+            for new, h in enumerate(hashes):
+                if unused.get(h):
+                    ids[new] = unused[h].pop(0)
+            if len(old) == len(hashes):
+                taken = set(ids)
+                for new, p in enumerate(old):
+                    if ids[new] is None and p.page_id not in taken:
+                        ids[new] = p.page_id
+
+        before = {p.page_id: p for p in old}
+        rows = []
+        for position, (page_id, h) in enumerate(zip(ids, hashes)):
+            prev = before.get(page_id)
+            rows.append(Page(
+                file_id=file_id, position=position, page_id=page_id or uuid.uuid4().hex[:12],
+                content_hash=h,
+                revision=prev.revision if prev is not None and prev.content_hash == h else revision,
+            ))
+        session.execute(delete(Page).where(Page.file_id == file_id))
+        session.flush()
+        session.add_all(rows)
+        f.revision = revision
+        f.page_count = len(hashes)
+        if size is not None:
+            f.width, f.height = size
+        session.commit()
+        session.close()
+
+    @staticmethod
+    def remove(file_id: str):
+        """Drop the page rows; the next update starts over with fresh page ids."""
+        session = get_session()
+        session.execute(delete(Page).where(Page.file_id == file_id))
+        session.commit()
+        session.close()
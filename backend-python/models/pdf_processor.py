@@ -1,54 +1,253 @@
 import base64
+import hashlib
 import io
+import math
+import os
 import tempfile
 
-import pikepdf
-from PIL import Image
-from reportlab.lib.pagesizes import A4, letter
-from reportlab.lib.units import inch
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfgen import canvas as rl_canvas
+import config
+from models import metrics
+
+# Processing libraries are imported on first use (see HEAVY_MODULES in benchmarks/suites.py)
+
+
+def _save(pdf, path: str):
+    """Save a result that becomes a stored document: linearized unless disabled."""
+    pdf.save(path, linearize=config.PDF_LINEARIZE)
+
+
+def _image_dpi(path: str) -> dict[tuple[int, int], float]:
+    """Lowest effective resolution each image XObject is drawn at, by (obj, gen)."""
+    import fitz
+    dpi: dict[tuple[int, int], float] = {}
+    with fitz.open(path) as doc:
+        for page in doc:
+            for info in page.get_image_info(xrefs=True):
+                bbox = fitz.Rect(info["bbox"])
+                if not info["xref"] or bbox.is_empty:
+                    continue
+                # bbox is in points (1/72 in); an image shown larger needs more pixels
+                placed = max(info["width"] * 72 / bbox.width, info["height"] * 72 / bbox.height)
+                key = (info["xref"], 0)
+                dpi[key] = min(dpi.get(key, placed), placed)
+    return dpi
+
+
+def _downsample(image, scale: float, jpeg_quality: int) -> bool:
+    """Shrink an image XObject in place by ``scale``; False if it is left alone."""
+    import pikepdf
+    from PIL import Image
+    if image.get("/ImageMask") or image.get("/BitsPerComponent", 8) != 8:
+        return False
+    try:
+        pil = pikepdf.PdfImage(image).as_pil_image()
+    except (pikepdf.PdfError, NotImplementedError, ValueError):
+        return False  # colour spaces/filters PIL cannot represent
+    if pil.mode not in ("L", "RGB"):
+        return False
+    size = (max(1, round(pil.width * scale)), max(1, round(pil.height * scale)))
+    pil = pil.resize(size, Image.LANCZOS)
+    if image.get("/Filter") == pikepdf.Name.DCTDecode:
+        buf = io.BytesIO()
+        pil.save(buf, "JPEG", quality=jpeg_quality)
+        image.write(buf.getvalue(), filter=pikepdf.Name.DCTDecode)
+    else:
+        image.write(pil.tobytes())  # compressed on save
+    for key in ("/DecodeParms", "/Decode"):
+        if key in image:
+            del image[key]
+    image.Width, image.Height = size
+    image.ColorSpace = pikepdf.Name.DeviceGray if pil.mode == "L" else pikepdf.Name.DeviceRGB
+    return True
+
+
+def _dedupe_objects(pdf) -> dict[tuple[int, int], tuple[int, int]]:
+    """Point every reference to an identical object at one copy.
+
+    Returns the (obj, gen) of each dropped copy mapped to the one kept.
+
+    Covers streams (fonts, images, ICC profiles: merge copies them once per
+    source) and the shared dictionaries/arrays around them, but not the page
+    tree, annotations or anything else that links back to its parent.
+    Repeats until stable, since objects only become identical once the
+    objects they refer to have been merged.
+    """
+    import pikepdf
+    skip_types = {"/Page", "/Pages", "/Catalog", "/Annot"}
+
+    def unparse(value):
+        return value.unparse() if isinstance(value, pikepdf.Object) else repr(value).encode()
+
+    def content_key(obj):
+        if isinstance(obj, pikepdf.Stream):
+            header = tuple(sorted((str(k), unparse(v)) for k, v in obj.stream_dict.items() if k != "/Length"))
+            return hashlib.sha256(obj.read_raw_bytes()).digest(), header
+        if isinstance(obj, pikepdf.Dictionary):
+            if obj.get("/Type") in skip_types or "/Parent" in obj:
+                return None
+        elif not isinstance(obj, pikepdf.Array):
+            return None
+        return obj.unparse(resolved=True)
+
+    def retarget(obj, replace):
+        items = obj.items() if isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)) else enumerate(obj)
+        for key, value in list(items):
+            if not isinstance(value, pikepdf.Object):
+                continue
+            if value.is_indirect:
+                if value.objgen in replace:
+                    obj[key] = replace[value.objgen]
+            elif isinstance(value, (pikepdf.Dictionary, pikepdf.Array)):
+                retarget(value, replace)
+
+    dropped: dict[tuple[int, int], tuple[int, int]] = {}  # stay in pdf.objects until save
+    while True:
+        first: dict[object, object] = {}
+        replace: dict[tuple[int, int], object] = {}
+        for obj in pdf.objects:
+            if obj.objgen in dropped:
+                continue
+            try:
+                key = content_key(obj)
+            except pikepdf.PdfError:
+                continue
+            if key is None:
+                continue
+            canonical = first.setdefault(key, obj)
+            if canonical is not obj:
+                replace[obj.objgen] = canonical
+        if not replace:
+            for objgen in dropped:  # a kept copy may have been dropped in a later round
+                while dropped[objgen] in dropped:
+                    dropped[objgen] = dropped[dropped[objgen]]
+            return dropped
+        dropped.update((objgen, canonical.objgen) for objgen, canonical in replace.items())
+        for obj in pdf.objects:
+            if isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream, pikepdf.Array)) and obj.objgen not in dropped:
+                retarget(obj, replace)
+        retarget(pdf.trailer, replace)
+
+
+def _page_digest(page, memo: dict) -> str:
+    """SHA-256 over everything that determines how a page looks.
+
+    Covers /Rotate, the page boxes, the content streams and, recursively, the
+    resources and annotations they use. Object numbers are not part of the
+    digest (linearizing renumbers them); shared objects such as fonts are
+    digested once per file through ``memo``.
+    """
+    import pikepdf
+
+    def digest(obj, visiting: frozenset) -> bytes:
+        if not isinstance(obj, pikepdf.Object):  # numbers and booleans come back as Python values
+            return hashlib.sha256(b"V" + repr(obj).encode()).digest()
+        indirect = obj.is_indirect
+        if indirect:
+            key = obj.objgen
+            if key in memo:
+                return memo[key]
+            if key in visiting:  # reference cycle
+                return b"cycle"
+            visiting = visiting | {key}
+        sha = hashlib.sha256()
+        if isinstance(obj, pikepdf.Stream):
+            # Decoded data: the same content saved with other compression hashes the same
+            sha.update(b"S" + digest(pikepdf.Dictionary(
+                {k: v for k, v in obj.items() if k not in ("/Length", "/Filter", "/DecodeParms")}), visiting))
+            try:
+                sha.update(obj.read_bytes())
+            except pikepdf.PdfError:  # image codecs (DCT, JBIG2, ...) stay encoded
+                sha.update(obj.read_raw_bytes() + obj.get("/Filter", pikepdf.Name.Raw).unparse(resolved=True))
+        elif isinstance(obj, pikepdf.Dictionary):
+            sha.update(b"D")
+            for k in sorted(obj.keys()):
+                if k not in ("/Parent", "/P"):  # back references to the page tree
+                    sha.update(k.encode() + digest(obj[k], visiting))
+        elif isinstance(obj, pikepdf.Array):
+            sha.update(b"A")
+            for item in obj:
+                sha.update(digest(item, visiting))
+        else:
+            sha.update(b"O" + obj.unparse(resolved=True))
+        result = sha.digest()
+        if indirect:
+            memo[key] = result
+        return result
+
+    sha = hashlib.sha256()
+    for key in ("/Rotate", "/MediaBox", "/CropBox", "/Contents", "/Resources", "/Annots"):
+        value = page.obj.get(key)
+        sha.update(key.encode() + (digest(value, frozenset()) if value is not None else b"-"))
+    return sha.hexdigest()
+
+
+def _tile_levels(width: float, height: float, tile_size: int, max_dpi: int) -> list[dict]:
+    """Zoom levels of a ``width`` x ``height`` pt page: scale (px per pt) and tile grid.
+
+    Level 0 fits the page into one tile; each level doubles the scale until
+    the first one at or above ``max_dpi``.
+    """
+    base = tile_size / max(width, height, 1)
+    top = max(0, math.ceil(math.log2(max_dpi / 72 / base)))
+    levels = []
+    for zoom in range(top + 1):
+        scale = base * 2 ** zoom
+        levels.append({
+            "zoom": zoom,
+            "scale": scale,
+            "columns": math.ceil(width * scale / tile_size),
+            "rows": math.ceil(height * scale / tile_size),
+        })
+    return levels
 
 
 class PdfProcessor:
     @staticmethod
+    @metrics.timed("pdf_processor")
     def rotate_page(input_path: str, page_num: int, angle: int) -> str:
         """Rotate a single page by angle (90, 180, 270)."""
+        import pikepdf
         pdf = pikepdf.Pdf.open(input_path)
         page = pdf.pages[page_num]
         page.rotate(angle, relative=True)
         out = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
-        pdf.save(out.name)
+        _save(pdf, out.name)
         pdf.close()
         return out.name
 
     @staticmethod
+    @metrics.timed("pdf_processor")
     def delete_page(input_path: str, page_num: int) -> str:
+        import pikepdf
         pdf = pikepdf.Pdf.open(input_path)
         if len(pdf.pages) <= 1:
             pdf.close()
             raise ValueError("Cannot delete the only page")
         del pdf.pages[page_num]
         out = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
-        pdf.save(out.name)
+        _save(pdf, out.name)
         pdf.close()
         return out.name
 
     @staticmethod
+    @metrics.timed("pdf_processor")
     def reorder_pages(input_path: str, new_order: list[int]) -> str:
         """new_order is a list of 0-based page indices in desired order."""
+        import pikepdf
         pdf = pikepdf.Pdf.open(input_path)
         new_pdf = pikepdf.Pdf.new()
         for idx in new_order:
             new_pdf.pages.append(pdf.pages[idx])
         out = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
-        new_pdf.save(out.name)
+        _save(new_pdf, out.name)
         new_pdf.close()
         pdf.close()
         return out.name
 
     @staticmethod
+    @metrics.timed("pdf_processor")
     def merge(input_paths: list[str]) -> str:
+        import pikepdf
         new_pdf = pikepdf.Pdf.new()
         opened = []
         for path in input_paths:
@@ -56,16 +255,19 @@ class PdfProcessor:
             opened.append(pdf)
             new_pdf.pages.extend(pdf.pages)
         out = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
-        new_pdf.save(out.name)
+        _save(new_pdf, out.name)
         new_pdf.close()
         for pdf in opened:
             pdf.close()
         return out.name
 
     @staticmethod
+    @metrics.timed("pdf_processor")
     def text_overlay(input_path: str, page_num: int, text: str, x: float, y: float,
                      font_size: float = 12, font_name: str = "Helvetica", color: tuple = (0, 0, 0)) -> str:
         """Add vector text via reportlab overlay, then stamp onto page with pikepdf."""
+        import pikepdf
+        from reportlab.pdfgen import canvas as rl_canvas
         pdf = pikepdf.Pdf.open(input_path)
         page = pdf.pages[page_num]
         mediabox = page.mediabox
@@ -90,14 +292,18 @@ class PdfProcessor:
         page.add_overlay(overlay_page)
 
         out = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
-        pdf.save(out.name)
+        _save(pdf, out.name)
         pdf.close()
         overlay_pdf.close()
         return out.name
 
     @staticmethod
+    @metrics.timed("pdf_processor")
     def annotate(input_path: str, page_num: int, overlay_data_url: str) -> str:
         """Stamp a PNG annotation overlay (from Fabric.js) onto a PDF page via reportlab."""
+        import pikepdf
+        from reportlab.lib.utils import ImageReader
+        from reportlab.pdfgen import canvas as rl_canvas
         header, data = overlay_data_url.split(",", 1)
         overlay_bytes = base64.b64decode(data)
 
@@ -111,7 +317,6 @@ class PdfProcessor:
         overlay_buf = io.BytesIO()
         c = rl_canvas.Canvas(overlay_buf, pagesize=(pw, ph))
         img_reader = io.BytesIO(overlay_bytes)
-        from reportlab.lib.utils import ImageReader
         img = ImageReader(img_reader)
         c.drawImage(img, 0, 0, width=pw, height=ph, mask="auto")
         c.save()
@@ -121,14 +326,19 @@ class PdfProcessor:
         page.add_overlay(overlay_pdf.pages[0])
 
         out = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
-        pdf.save(out.name)
+        _save(pdf, out.name)
         pdf.close()
         overlay_pdf.close()
         return out.name
 
     @staticmethod
+    @metrics.timed("pdf_processor")
     def images_to_pdf(image_paths: list[str]) -> str:
         """One image per page, scaled to fit A4. Returns path to temp PDF."""
+        from PIL import Image
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.utils import ImageReader
+        from reportlab.pdfgen import canvas as rl_canvas
         a4_w, a4_h = A4
         out = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
         c = rl_canvas.Canvas(out.name, pagesize=A4)
@@ -147,6 +357,7 @@ class PdfProcessor:
         return out.name
 
     @staticmethod
+    @metrics.timed("pdf_processor")
     def apply_annotation_layers(src_pdf_path: str, layers: list[dict]) -> str:
         """Render annotation layers onto a PDF and return path to temp result PDF.
 
@@ -155,6 +366,10 @@ class PdfProcessor:
           type="image": page, png (data-url of client-rendered Fabric PNG)
         """
         from collections import defaultdict
+
+        import pikepdf
+        from reportlab.lib.utils import ImageReader
+        from reportlab.pdfgen import canvas as rl_canvas
         by_page: dict[int, list] = defaultdict(list)
         for layer in layers:
             by_page[int(layer["page"])].append(layer)
@@ -198,7 +413,177 @@ class PdfProcessor:
         return out.name
 
     @staticmethod
+    def is_linearized(path: str) -> bool:
+        """Cheap check: the linearization dictionary is the first object in the file."""
+        with open(path, "rb") as fh:
+            return b"/Linearized" in fh.read(1024)
+
+    @staticmethod
+    @metrics.timed("pdf_processor")
+    def linearize(input_path: str) -> str:
+        """Rewrite as a linearized ("fast web view") PDF. Returns path to temp PDF.
+
+        Linearized files start with page 1 and a hint table, so a viewer
+        fetching byte ranges can display the first page before the rest
+        of the file has arrived.
+        """
+        import pikepdf
+        with pikepdf.Pdf.open(input_path) as pdf:
+            out = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+            pdf.save(out.name, linearize=True)
+        return out.name
+
+    @staticmethod
+    @metrics.timed("pdf_processor")
+    def optimize(input_path: str, target_dpi: int | None = None, jpeg_quality: int = 85) -> tuple[str, dict]:
+        """Compact a PDF; returns (path to temp PDF, report).
+
+        Identical objects (fonts, images, ICC profiles copied in once per
+        source by merge) are merged into one, unreferenced objects dropped, streams recompressed and small objects packed into object
+        streams. With ``target_dpi`` images placed at a higher resolution are
+        downsampled to it.
+        """
+        import pikepdf
+        report = {"bytes_before": os.path.getsize(input_path), "images_downsampled": 0}
+        placements = _image_dpi(input_path) if target_dpi else {}
+        with pikepdf.Pdf.open(input_path) as pdf:
+            dropped = _dedupe_objects(pdf)
+            report["duplicates_removed"] = len(dropped)
+            kept: dict[tuple[int, int], float] = {}
+            for objgen, dpi in placements.items():
+                objgen = dropped.get(objgen, objgen)
+                kept[objgen] = min(kept.get(objgen, dpi), dpi)
+            for (num, gen), dpi in kept.items():
+                if dpi > target_dpi * 1.05 and _downsample(pdf.get_object(num, gen), target_dpi / dpi, jpeg_quality):
+                    report["images_downsampled"] += 1
+            pdf.remove_unreferenced_resources()
+            out = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+            pdf.save(out.name, compress_streams=True, recompress_flate=True,
+                     stream_decode_level=pikepdf.StreamDecodeLevel.generalized,
+                     object_stream_mode=pikepdf.ObjectStreamMode.generate,
+                     linearize=config.PDF_LINEARIZE)
+        report["bytes_after"] = os.path.getsize(out.name)
+        report["bytes_saved"] = report["bytes_before"] - report["bytes_after"]
+        return out.name, report
+
+    @staticmethod
+    @metrics.timed("pdf_processor")
+    def page_hashes(input_path: str) -> list[str]:
+        """Content hash of every page (see _page_digest), in page order."""
+        import pikepdf
+        memo: dict = {}
+        with pikepdf.Pdf.open(input_path) as pdf:
+            return [_page_digest(page, memo) for page in pdf.pages]
+
+    @staticmethod
+    @metrics.timed("pdf_processor")
+    def page_summary(input_path: str) -> tuple[list[str], tuple[int, int]]:
+        """page_hashes and the (width, height) in points of the largest page, in one pass."""
+        import pikepdf
+        memo: dict = {}
+        hashes, largest = [], (0, 0)
+        with pikepdf.Pdf.open(input_path) as pdf:
+            for page in pdf.pages:
+                hashes.append(_page_digest(page, memo))
+                x0, y0, x1, y1 = (float(v) for v in page.cropbox)
+                size = (math.ceil(abs(x1 - x0)), math.ceil(abs(y1 - y0)))
+                if size[0] * size[1] > largest[0] * largest[1]:
+                    largest = size
+        return hashes, largest
+
+    @staticmethod
+    @metrics.timed("pdf_processor")
+    def assemble(parts: list[tuple[str, int]]) -> str:
+        """Build a PDF from (source path, page index) pairs. Returns path to temp PDF.
+
+        Resources that several sources carry a copy of (fonts of single-page
+        blobs) are merged again before saving.
+        """
+        import pikepdf
+        sources = {}
+        try:
+            out = pikepdf.Pdf.new()
+            for path, index in parts:
+                if path not in sources:
+                    sources[path] = pikepdf.Pdf.open(path)
+                out.pages.append(sources[path].pages[index])
+            if len(sources) > 1:
+                _dedupe_objects(out)
+                out.remove_unreferenced_resources()
+            tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+            tmp.close()
+            _save(out, tmp.name)
+            return tmp.name
+        finally:
+            for pdf in sources.values():
+                pdf.close()
+
+    @staticmethod
+    @metrics.timed("pdf_processor")
+    def extract_page(input_path: str, page_num: int) -> bytes:
+        """A single page as a standalone PDF (with the resources it uses)."""
+        import pikepdf
+        with pikepdf.Pdf.open(input_path) as pdf:
+            if not 0 <= page_num < len(pdf.pages):
+                raise IndexError("Page out of range")
+            out = pikepdf.Pdf.new()
+            out.pages.append(pdf.pages[page_num])
+            buf = io.BytesIO()
+            out.save(buf, compress_streams=True)
+            return buf.getvalue()
+
+    @staticmethod
+    @metrics.timed("pdf_processor")
+    def render_page(input_path: str, page_num: int, scale: float) -> bytes:
+        """A single page rendered as PNG at ``scale`` pixels per point."""
+        import fitz
+        with fitz.open(input_path) as doc:
+            if not 0 <= page_num < doc.page_count:
+                raise IndexError("Page out of range")
+            return doc[page_num].get_pixmap(matrix=fitz.Matrix(scale, scale), alpha=False).tobytes("png")
+
+    @staticmethod
+    def tile_levels(input_path: str, page_num: int, tile_size: int, max_dpi: int) -> dict:
+        """Displayed page size in points and its deep-zoom levels (see _tile_levels)."""
+        import fitz
+        with fitz.open(input_path) as doc:
+            if not 0 <= page_num < doc.page_count:
+                raise IndexError("Page out of range")
+            rect = doc[page_num].rect
+        return {"width": rect.width, "height": rect.height, "tile_size": tile_size,
+                "levels": _tile_levels(rect.width, rect.height, tile_size, max_dpi)}
+
+    @staticmethod
+    @metrics.timed("pdf_processor")
+    def render_tile(input_path: str, page_num: int, zoom: int, x: int, y: int,
+                    tile_size: int, max_dpi: int) -> bytes:
+        """Render one deep-zoom tile as PNG; only the tile's clip of the page is rasterized.
+
+        Tiles count from the top left of the page as displayed (after its
+        /Rotate); tiles on the right and bottom edge are cut to the page.
+        """
+        import fitz
+        with fitz.open(input_path) as doc:
+            if not 0 <= page_num < doc.page_count:
+                raise IndexError("Page out of range")
+            page = doc[page_num]
+            levels = _tile_levels(page.rect.width, page.rect.height, tile_size, max_dpi)
+            if not 0 <= zoom < len(levels):
+                raise IndexError("Zoom level out of range")
+            level = levels[zoom]
+            if not (0 <= x < level["columns"] and 0 <= y < level["rows"]):
+                raise IndexError("Tile out of range")
+            step = tile_size / level["scale"]
+            clip = fitz.Rect(x * step, y * step, (x + 1) * step, (y + 1) * step) & page.rect
+            # get_pixmap applies /Rotate itself and takes the clip in displayed coordinates
+            pix = page.get_pixmap(matrix=fitz.Matrix(level["scale"], level["scale"]),
+                                  clip=clip, alpha=False)
+            return pix.tobytes("png")
+
+    @staticmethod
+    @metrics.timed("pdf_processor")
     def get_page_count(input_path: str) -> int:
+        import pikepdf
         pdf = pikepdf.Pdf.open(input_path)
         count = len(pdf.pages)
         pdf.close()
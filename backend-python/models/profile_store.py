@@ -0,0 +1,86 @@
+import json
+import os
+import re
+import time
+import uuid
+
+import config
+
+_ID_RE = re.compile(r"^[0-9]{8}T[0-9]{9}-[0-9a-f]{8}$")
+
+
+class ProfileStore:
+    """Captured request traces: ``<id>.json`` (metadata + span tree) and ``<id>.prof``.
+
+    ``<id>.prof`` is a pstats dump (``python -m pstats``, snakeviz, ...). Only
+    the newest ``config.PROFILE_KEEP`` traces are kept.
+    """
+
+    @staticmethod
+    def new_id() -> str:
+        """Sortable id: UTC timestamp with milliseconds plus a random suffix."""
+        now = time.time()
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)) + f"{int(now * 1000) % 1000:03d}"
+        return f"{stamp}-{uuid.uuid4().hex[:8]}"
+
+    @staticmethod
+    def _path(trace_id: str, ext: str) -> str | None:
+        if not _ID_RE.match(trace_id):
+            return None
+        return os.path.join(config.PROFILE_DIR, f"{trace_id}.{ext}")
+
+    @classmethod
+    def save(cls, trace_id: str, meta: dict, spans: dict, profiler=None):
+        os.makedirs(config.PROFILE_DIR, exist_ok=True)
+        if profiler is not None:
+            profiler.dump_stats(cls._path(trace_id, "prof"))
+        record = dict(meta, id=trace_id, has_profile=profiler is not None, spans=spans)
+        tmp = cls._path(trace_id, "json") + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(record, fh, ensure_ascii=False)
+        os.replace(tmp, cls._path(trace_id, "json"))
+        cls._prune()
+
+    @classmethod
+    def _prune(cls):
+        ids = cls.list_ids()
+        for trace_id in ids[config.PROFILE_KEEP:]:
+            for ext in ("json", "prof"):
+                try:
+                    os.remove(cls._path(trace_id, ext))
+                except FileNotFoundError:
+                    pass
+
+    @staticmethod
+    def list_ids() -> list[str]:
+        """Trace ids, newest first."""
+        try:
+            names = os.listdir(config.PROFILE_DIR)
+        except FileNotFoundError:
+            return []
+        ids = [n[:-5] for n in names if n.endswith(".json") and _ID_RE.match(n[:-5])]
+        return sorted(ids, reverse=True)
+
+    @classmethod
+    def get(cls, trace_id: str) -> dict | None:
+        path = cls._path(trace_id, "json")
+        if path is None or not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+
+    @classmethod
+    def list_traces(cls) -> list[dict]:
+        """Metadata of all kept traces (without span trees), newest first."""
+        result = []
+        for trace_id in cls.list_ids():
+            record = cls.get(trace_id)
+            if record is not None:
+                record.pop("spans", None)
+                result.append(record)
+        return result
+
+    @classmethod
+    def profile_path(cls, trace_id: str) -> str | None:
+        path = cls._path(trace_id, "prof")
+        return path if path is not None and os.path.exists(path) else None
@@ -0,0 +1,311 @@
+"""Object storage for originals, current versions, annotations and history blobs.
+
+Objects are addressed by keys such as ``originals/<id>.pdf``,
+``current/<id>.pdf``, ``annotations/<id>/<user>.json`` and
+``history/<id>/pages/<hash>.pdf``. The processors work on local files, so
+readers ask for ``local_path(key)`` (``exists(key)`` only checks) and writers produce a file at
+``staging_path(key)`` and hand it over with ``put``.
+
+STORAGE_BACKEND "local" keeps every object as the file ``STORAGE_DIR/<key>``
+(the layout from before this module). "s3" keeps them in an S3-compatible
+bucket, so several nodes can share one storage without NFS: ``local_path``
+downloads into a read-through cache under OBJECT_CACHE_DIR (originals and
+history blobs never change and are served from it directly; other keys are
+revalidated by ETag), ``put`` uploads in parts above S3_MULTIPART_THRESHOLD
+and keeps the file in the cache. boto3 is only imported by the s3 backend.
+"""
+import os
+import shutil
+import threading
+import time
+import uuid
+
+import config
+from models import metrics
+
+# Keys under these prefixes are written once and never change
+IMMUTABLE_PREFIXES = ("originals/", "history/")
+# How often (seconds) a process checks OBJECT_CACHE_SIZE after filling the cache
+PRUNE_INTERVAL = 60
+
+
+class LocalBackend:
+    """Objects as files under STORAGE_DIR, replaced atomically by rename."""
+
+    def _file(self, key: str) -> str:
+        return os.path.join(config.STORAGE_DIR, *key.split("/"))
+
+    def staging_path(self, key: str) -> str:
+        dest = self._file(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        return f"{dest}.{uuid.uuid4().hex[:8]}.tmp"
+
+    def put(self, key: str, path: str):
+        dest = self._file(key)
+        if os.path.dirname(os.path.abspath(path)) != os.path.dirname(dest):
+            # Other filesystem (e.g. /tmp): copy next to the target first, then rename
+            staged = self.staging_path(key)
+            shutil.move(path, staged)
+            path = staged
+        os.replace(path, dest)
+
+    def local_path(self, key: str) -> str | None:
+        path = self._file(key)
+        return path if os.path.exists(path) else None
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._file(key))
+
+    def read(self, key: str) -> bytes | None:
+        try:
+            with open(self._file(key), "rb") as fh:
+                return fh.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key: str, data: bytes):
+        staged = self.staging_path(key)
+        with open(staged, "wb") as fh:
+            fh.write(data)
+        os.replace(staged, self._file(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._file(key))
+        except FileNotFoundError:
+            pass
+
+    def delete_prefix(self, prefix: str):
+        shutil.rmtree(self._file(prefix.rstrip("/")), ignore_errors=True)
+
+    def list_keys(self, prefix: str) -> list[str]:
+        """Names directly below ``prefix`` (a "directory" ending in /)."""
+        d = self._file(prefix.rstrip("/"))
+        if not os.path.isdir(d):
+            return []
+        return [name for name in os.listdir(d) if not name.endswith(".tmp")]
+
+
+class S3Backend:
+    """Objects in an S3-compatible bucket, read through a local file cache."""
+
+    _lock = threading.Lock()
+    _last_prune = 0.0
+
+    def __init__(self):
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        if not config.S3_BUCKET:
+            raise RuntimeError("DOCEDITOR_S3_BUCKET is required for the s3 storage backend")
+        self.client = boto3.client("s3", endpoint_url=config.S3_ENDPOINT or None,
+                                   region_name=config.S3_REGION or None)
+        self.bucket = config.S3_BUCKET
+        self.transfer = TransferConfig(multipart_threshold=config.S3_MULTIPART_THRESHOLD,
+                                       multipart_chunksize=config.S3_MULTIPART_CHUNK_SIZE)
+
+    def _name(self, key: str) -> str:
+        return config.S3_PREFIX + key
+
+    def _cached(self, key: str) -> str:
+        return os.path.join(config.OBJECT_CACHE_DIR, *key.split("/"))
+
+    @staticmethod
+    def _missing(e) -> bool:
+        return e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def _head_etag(self, key: str) -> str | None:
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._name(key))["ETag"]
+        except ClientError as e:
+            if self._missing(e):
+                return None
+            raise
+
+    def _cache(self, key: str, path: str, etag: str | None):
+        """Move a downloaded or uploaded file into the cache, with its ETag alongside."""
+        cached = self._cached(key)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        if etag is not None:
+            with open(f"{cached}.etag", "w") as fh:
+                fh.write(etag)
+        os.replace(path, cached)
+        self._maybe_prune()
+
+    def _drop_cached(self, key: str):
+        for path in (self._cached(key), f"{self._cached(key)}.etag"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def staging_path(self, key: str) -> str:
+        staging = os.path.join(config.OBJECT_CACHE_DIR, ".staging")
+        os.makedirs(staging, exist_ok=True)
+        return os.path.join(staging, f"{uuid.uuid4().hex}.tmp")
+
+    @metrics.timed("storage")
+    def put(self, key: str, path: str):
+        # upload_file switches to a multipart upload above multipart_threshold
+        self.client.upload_file(path, self.bucket, self._name(key), Config=self.transfer)
+        staged = self.staging_path(key)
+        shutil.move(path, staged)
+        self._cache(key, staged, None if key.startswith(IMMUTABLE_PREFIXES) else self._head_etag(key))
+
+    @metrics.timed("storage")
+    def local_path(self, key: str) -> str | None:
+        cached = self._cached(key)
+        immutable = key.startswith(IMMUTABLE_PREFIXES)
+        if immutable and os.path.exists(cached):
+            metrics.cache_lookup("objects", True)
+            os.utime(cached)
+            return cached
+        etag = self._head_etag(key)
+        if etag is None:
+            self._drop_cached(key)
+            return None
+        if not immutable and os.path.exists(cached):
+            try:
+                with open(f"{cached}.etag") as fh:
+                    fresh = fh.read() == etag
+            except FileNotFoundError:
+                fresh = False
+            if fresh:
+                metrics.cache_lookup("objects", True)
+                os.utime(cached)
+                return cached
+        metrics.cache_lookup("objects", False)
+        staged = self.staging_path(key)
+        try:
+            self.client.download_file(self.bucket, self._name(key), staged, Config=self.transfer)
+            self._cache(key, staged, None if immutable else etag)
+        finally:
+            if os.path.exists(staged):
+                os.remove(staged)
+        return cached
+
+    def exists(self, key: str) -> bool:
+        # A cached immutable object cannot have changed; anything else costs a HEAD, never a download
+        if key.startswith(IMMUTABLE_PREFIXES) and os.path.exists(self._cached(key)):
+            return True
+        return self._head_etag(key) is not None
+
+    def read(self, key: str) -> bytes | None:
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self._name(key))["Body"].read()
+        except ClientError as e:
+            if self._missing(e):
+                return None
+            raise
+
+    def write(self, key: str, data: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self._name(key), Body=data)
+        self._drop_cached(key)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._name(key))
+        self._drop_cached(key)
+
+    def _names(self, prefix: str):
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self._name(prefix)):
+            for obj in page.get("Contents", []):
+                yield obj["Key"]
+
+    def delete_prefix(self, prefix: str):
+        names = list(self._names(prefix))
+        for i in range(0, len(names), 1000):
+            self.client.delete_objects(Bucket=self.bucket, Delete={
+                "Objects": [{"Key": name} for name in names[i:i + 1000]], "Quiet": True,
+            })
+        shutil.rmtree(self._cached(prefix.rstrip("/")), ignore_errors=True)
+
+    def list_keys(self, prefix: str) -> list[str]:
+        start = len(self._name(prefix))
+        return [name[start:] for name in self._names(prefix) if "/" not in name[start:]]
+
+    @classmethod
+    def _maybe_prune(cls):
+        with cls._lock:
+            if time.monotonic() - cls._last_prune < PRUNE_INTERVAL:
+                return
+            cls._last_prune = time.monotonic()
+        prune_cache()
+
+
+def prune_cache():
+    """Delete the least recently used cached objects until the cache fits OBJECT_CACHE_SIZE."""
+    files = []
+    for root, _, names in os.walk(config.OBJECT_CACHE_DIR):
+        for name in names:
+            if name.endswith((".etag", ".tmp")):
+                continue
+            try:
+                st = os.stat(os.path.join(root, name))
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, os.path.join(root, name)))
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= config.OBJECT_CACHE_SIZE:
+            break
+        for p in (path, f"{path}.etag"):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        total -= size
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend() -> LocalBackend | S3Backend:
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = S3Backend() if config.STORAGE_BACKEND == "s3" else LocalBackend()
+    return _backend
+
+
+def staging_path(key: str) -> str:
+    """Local path to write a new object for ``key`` to, before ``put``."""
+    return backend().staging_path(key)
+
+
+def put(key: str, path: str):
+    """Store the file at ``path`` (moved, not copied) as ``key``, replacing it atomically."""
+    backend().put(key, path)
+
+
+def local_path(key: str) -> str | None:
+    """A local file with the object's content, or None if there is no such object."""
+    return backend().local_path(key)
+
+
+def exists(key: str) -> bool:
+    """Whether there is an object ``key``, without fetching it."""
+    return backend().exists(key)
+
+
+def read(key: str) -> bytes | None:
+    return backend().read(key)
+
+
+def write(key: str, data: bytes):
+    backend().write(key, data)
+
+
+def delete(key: str):
+    backend().delete(key)
+
+
+def delete_prefix(prefix: str):
+    backend().delete_prefix(prefix)
+
+
+def list_keys(prefix: str) -> list[str]:
+    return backend().list_keys(prefix)
@@ -0,0 +1,190 @@
+import html
+import re
+
+from sqlalchemy import delete, select, text, update
+
+from models import cpu_pool, metrics
+from models.database import get_session
+from models.db_models import PageText
+
+# Hits are delimited with control characters in SQL, then the snippet is
+# HTML-escaped and they become <mark> tags (page text is untrusted)
+SNIPPET_START, SNIPPET_END = "\x02", "\x03"
+SNIPPET_WORDS = 12
+
+
+def _highlight(snippet: str) -> str:
+    """Escape a snippet and turn the hit delimiters into <mark> tags."""
+    return html.escape(snippet).replace(SNIPPET_START, "<mark>").replace(SNIPPET_END, "</mark>")
+
+
+def _fts5_query(q: str) -> str:
+    """User input as an FTS5 query: every word must occur, ``word*`` is a prefix."""
+    terms = re.findall(r"(\w+)(\*?)", q)
+    return " ".join(f'"{word}"{star}' for word, star in terms)
+
+
+class TextIndex:
+    """Per-page text of every PDF, extracted once and searched through the DB's full-text index.
+
+    Rows follow the page order of current/: structural edits renumber or
+    re-extract only the pages they touch instead of re-parsing the file.
+    """
+
+    @staticmethod
+    @metrics.timed("text_index")
+    def extract(path: str, pages: list[int] | None = None) -> list[tuple[int, str]]:
+        """(page, text) for ``pages`` (default: all); runs in the CPU pool for whole files."""
+        import fitz
+        with fitz.open(path) as doc:
+            indices = range(doc.page_count) if pages is None else [p for p in pages if 0 <= p < doc.page_count]
+            # NUL is not allowed in PostgreSQL text columns
+            return [(i, doc[i].get_text("text").replace("\x00", "")) for i in indices]
+
+    @classmethod
+    def index_file(cls, file_id: str, path: str):
+        """(Re)build all rows of a file from the PDF at ``path``."""
+        pages = cpu_pool.run("index", cls.extract, path)
+        cls._replace(file_id, pages)
+
+    @staticmethod
+    def _replace(file_id: str, pages: list[tuple[int, str]]):
+        session = get_session()
+        session.execute(delete(PageText).where(PageText.file_id == file_id))
+        session.add_all(PageText(file_id=file_id, page=page, text=body) for page, body in pages)
+        session.commit()
+        session.close()
+
+    @staticmethod
+    def _texts(file_id: str) -> dict[int, str]:
+        session = get_session()
+        rows = session.execute(select(PageText.page, PageText.text).where(PageText.file_id == file_id)).all()
+        session.close()
+        return dict(rows)
+
+    @classmethod
+    def update_pages(cls, file_id: str, path: str, pages: list[int]):
+        """Re-extract ``pages`` only (e.g. after a rotation)."""
+        session = get_session()
+        for page, body in cls.extract(path, pages):
+            session.execute(update(PageText)
+                            .where(PageText.file_id == file_id, PageText.page == page)
+                            .values(text=body))
+        session.commit()
+        session.close()
+
+    @staticmethod
+    def delete_page(file_id: str, page: int):
+        """Drop a page and move the following ones up; no text is re-extracted."""
+        session = get_session()
+        session.execute(delete(PageText).where(PageText.file_id == file_id, PageText.page == page))
+        session.execute(update(PageText)
+                        .where(PageText.file_id == file_id, PageText.page > page)
+                        .values(page=PageText.page - 1))
+        session.commit()
+        session.close()
+
+    @classmethod
+    def reorder(cls, file_id: str, path: str, new_order: list[int]):
+        """Rearrange rows like PdfProcessor.reorder_pages; falls back to extraction if rows are missing."""
+        texts = cls._texts(file_id)
+        if not all(old in texts for old in new_order):
+            cls.index_file(file_id, path)
+            return
+        cls._replace(file_id, [(new, texts[old]) for new, old in enumerate(new_order)])
+
+    @classmethod
+    def merge(cls, file_id: str, path: str, source_ids: list[str]):
+        """Index a merged file from the rows of its sources, in merge order."""
+        pages = []
+        for source_id in source_ids:
+            texts = cls._texts(source_id)
+            if not texts:
+                cls.index_file(file_id, path)
+                return
+            pages += [(len(pages) + i, texts.get(i, "")) for i in range(max(texts) + 1)]
+        cls._replace(file_id, pages)
+
+    @staticmethod
+    def remove(file_id: str):
+        session = get_session()
+        session.execute(delete(PageText).where(PageText.file_id == file_id))
+        session.commit()
+        session.close()
+
+    @staticmethod
+    def indexed(file_id: str) -> bool:
+        session = get_session()
+        found = session.execute(select(PageText.id).where(PageText.file_id == file_id).limit(1)).first()
+        session.close()
+        return found is not None
+
+    @classmethod
+    @metrics.timed("text_index")
+    def search(cls, q: str, limit: int = 20, file_id: str = "") -> list[dict]:
+        """Best matching pages: file_id, original_name, page and a snippet with <mark> around hits.
+
+        Snippets are HTML: the page text is escaped, only the <mark> tags are markup.
+        """
+        session = get_session()
+        dialect = session.get_bind().dialect.name
+        params = {"limit": limit, "file_id": file_id, "start": SNIPPET_START, "end": SNIPPET_END}
+        where_file = "AND p.file_id = :file_id" if file_id else ""
+        if dialect == "sqlite":
+            params["q"] = _fts5_query(q)
+            if not params["q"]:
+                session.close()
+                return []
+            sql = f"""
+                SELECT p.file_id, f.original_name, p.page,
+                       snippet(page_text_fts, 0, :start, :end, '…', {SNIPPET_WORDS}) AS snippet
+                FROM page_text_fts
+                JOIN page_text p ON p.id = page_text_fts.rowid
+                JOIN files f ON f.file_id = p.file_id
+                WHERE page_text_fts MATCH :q {where_file}
+                ORDER BY bm25(page_text_fts)
+                LIMIT :limit"""
+        elif dialect == "postgresql":
+            params["q"] = q
+            params["options"] = (f"StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, "
+                                 f"MaxWords={SNIPPET_WORDS * 2}, MinWords={SNIPPET_WORDS // 2}")
+            sql = f"""
+                SELECT p.file_id, f.original_name, p.page,
+                       ts_headline('simple', p.text, query, :options) AS snippet
+                FROM page_text p
+                JOIN files f ON f.file_id = p.file_id,
+                     plainto_tsquery('simple', :q) query
+                WHERE to_tsvector('simple', p.text) @@ query {where_file}
+                ORDER BY ts_rank(to_tsvector('simple', p.text), query) DESC
+                LIMIT :limit"""
+        else:
+            session.close()
+            return cls._search_scan(q, limit, file_id)
+        rows = session.execute(text(sql), params).mappings().all()
+        session.close()
+        return [dict(row, snippet=_highlight(row["snippet"])) for row in rows]
+
+    @staticmethod
+    def _search_scan(q: str, limit: int, file_id: str) -> list[dict]:
+        """Databases without a full-text index (MySQL, ...): substring match on every word."""
+        from models.db_models import File
+        words = re.findall(r"\w+", q)
+        if not words:
+            return []
+        session = get_session()
+        query = (session.query(PageText.file_id, File.original_name, PageText.page, PageText.text)
+                 .join(File, File.file_id == PageText.file_id))
+        for word in words:
+            query = query.filter(PageText.text.ilike(f"%{word}%"))
+        if file_id:
+            query = query.filter(PageText.file_id == file_id)
+        rows = query.limit(limit).all()
+        session.close()
+        results = []
+        for fid, name, page, body in rows:
+            pos = body.lower().find(words[0].lower())
+            start = max(0, pos - 60)
+            snippet = body[start:pos] + SNIPPET_START + body[pos:pos + len(words[0])] + SNIPPET_END
+            snippet += body[pos + len(words[0]):pos + len(words[0]) + 60]
+            results.append({"file_id": fid, "original_name": name, "page": page, "snippet": _highlight(snippet)})
+        return results
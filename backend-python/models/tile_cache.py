@@ -0,0 +1,111 @@
+import logging
+import os
+import shutil
+import threading
+import time
+
+import config
+from models import admission, cpu_pool, metrics
+from models.pdf_processor import PdfProcessor
+
+log = logging.getLogger(__name__)
+
+# How often (seconds) a process checks TILE_CACHE_SIZE after writing tiles
+PRUNE_INTERVAL = 60
+
+
+class TileCache:
+    """Rendered deep-zoom tiles, stored as ``TILES_DIR/<file_id>/<version>/<page>/<z>/<x>_<y>.png``.
+
+    ``version`` is derived from the stat of the file the tiles were rendered
+    from, so a tile of an older state is never served even if current/ was
+    replaced without going through ``invalidate`` (which update_current,
+    reset and delete call to free the space right away).
+    """
+
+    _lock = threading.Lock()
+    _last_prune = 0.0
+
+    @staticmethod
+    def version(path: str) -> str:
+        st = os.stat(path)
+        return f"{st.st_ino:x}-{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    @staticmethod
+    def levels(path: str, page: int) -> dict:
+        """Tile grid of a page; raises IndexError for a page out of range."""
+        result = PdfProcessor.tile_levels(path, page, config.TILE_SIZE, config.TILE_MAX_DPI)
+        result["version"] = TileCache.version(path)
+        return result
+
+    @classmethod
+    def get(cls, file_id: str, path: str, page: int, zoom: int, x: int, y: int) -> bytes:
+        """PNG of a tile, rendered and stored on a miss; IndexError if out of range."""
+        version = cls.version(path)
+        version_dir = os.path.join(config.TILES_DIR, file_id, version)
+        tile = os.path.join(version_dir, str(page), str(zoom), f"{x}_{y}.png")
+        try:
+            with open(tile, "rb") as fh:
+                png = fh.read()
+            metrics.cache_lookup("tiles", True)
+            return png
+        except FileNotFoundError:
+            metrics.cache_lookup("tiles", False)
+        png = cpu_pool.run("tile", PdfProcessor.render_tile, path, page, zoom, x, y,
+                           config.TILE_SIZE, config.TILE_MAX_DPI,
+                           cost=config.TILE_SIZE * config.TILE_SIZE * admission.RASTER_BYTES_PER_PIXEL)
+        try:
+            if not os.path.isdir(version_dir):
+                cls._drop_versions(file_id, keep=version)
+            os.makedirs(os.path.dirname(tile), exist_ok=True)
+            tmp = f"{tile}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(png)
+            os.replace(tmp, tile)
+        except OSError as e:
+            # Racing an invalidate or a full disk: serve the tile uncached
+            log.warning("Could not cache tile %s: %s", tile, e)
+        cls._maybe_prune()
+        return png
+
+    @staticmethod
+    def _drop_versions(file_id: str, keep: str):
+        """Remove tiles of earlier versions when the first tile of a new one is written."""
+        file_dir = os.path.join(config.TILES_DIR, file_id)
+        if os.path.isdir(file_dir):
+            for name in os.listdir(file_dir):
+                if name != keep:
+                    shutil.rmtree(os.path.join(file_dir, name), ignore_errors=True)
+
+    @staticmethod
+    def invalidate(file_id: str):
+        shutil.rmtree(os.path.join(config.TILES_DIR, file_id), ignore_errors=True)
+
+    @classmethod
+    def _maybe_prune(cls):
+        with cls._lock:
+            if time.monotonic() - cls._last_prune < PRUNE_INTERVAL:
+                return
+            cls._last_prune = time.monotonic()
+        cls.prune()
+
+    @staticmethod
+    def prune():
+        """Delete the least recently written tiles until the cache fits TILE_CACHE_SIZE."""
+        tiles = []
+        for root, _, names in os.walk(config.TILES_DIR):
+            for name in names:
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                tiles.append((st.st_mtime, st.st_size, os.path.join(root, name)))
+        total = sum(size for _, size, _ in tiles)
+        for _, size, path in sorted(tiles):
+            if total <= config.TILE_CACHE_SIZE:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
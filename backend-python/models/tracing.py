@@ -0,0 +1,118 @@
+"""Per-request span trees for opt-in profiling.
+
+A trace is bound to the current thread while a profiled request runs.
+``span`` is a no-op unless a trace is active, and the SQLAlchemy hooks that
+record queries are only installed once the first trace starts, so requests
+pay nothing for tracing until it is actually used.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+_local = threading.local()
+_db_hooks_installed = False
+_install_lock = threading.Lock()
+
+MAX_SQL_LENGTH = 500
+
+
+class Trace:
+    def __init__(self, name: str = "request"):
+        self._t0 = time.perf_counter()
+        self.root = {"name": name, "start_ms": 0.0, "duration_ms": None, "children": []}
+        self._stack = [self.root]
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self._t0) * 1000, 3)
+
+    def open(self, name: str, **attrs) -> dict:
+        span = {"name": name, "start_ms": self.elapsed_ms(), "duration_ms": None, "children": []}
+        span.update(attrs)
+        self._stack[-1]["children"].append(span)
+        self._stack.append(span)
+        return span
+
+    def close(self, span: dict):
+        span["duration_ms"] = round(self.elapsed_ms() - span["start_ms"], 3)
+        # Tolerate unbalanced closes (exceptions unwinding several levels)
+        while self._stack[-1] is not span and len(self._stack) > 1:
+            self._stack.pop()
+        if len(self._stack) > 1:
+            self._stack.pop()
+
+    def add(self, name: str, start_ms: float, duration_ms: float, **attrs):
+        span = {"name": name, "start_ms": start_ms, "duration_ms": duration_ms, "children": []}
+        span.update(attrs)
+        self._stack[-1]["children"].append(span)
+
+    def graft(self, spans: list[dict], offset_ms: float):
+        """Attach spans recorded by another trace (e.g. in a pool process)."""
+        def shift(span):
+            span["start_ms"] = round(span["start_ms"] + offset_ms, 3)
+            for child in span["children"]:
+                shift(child)
+        for span in spans:
+            shift(span)
+            self._stack[-1]["children"].append(span)
+
+    def finish(self) -> dict:
+        self.root["duration_ms"] = self.elapsed_ms()
+        return self.root
+
+
+def active() -> Trace | None:
+    return getattr(_local, "trace", None)
+
+
+def start(name: str = "request") -> Trace:
+    _install_db_hooks()
+    trace = _local.trace = Trace(name)
+    return trace
+
+
+def stop() -> Trace | None:
+    trace = getattr(_local, "trace", None)
+    _local.trace = None
+    return trace
+
+
+@contextmanager
+def span(name: str, **attrs):
+    trace = getattr(_local, "trace", None)
+    if trace is None:
+        yield
+        return
+    s = trace.open(name, **attrs)
+    try:
+        yield
+    finally:
+        trace.close(s)
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and getattr(_local, "trace", None) is not None:
+        context.trace_query_start = time.perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    trace = getattr(_local, "trace", None)
+    started = getattr(context, "trace_query_start", None)
+    if trace is None or started is None:
+        return
+    duration = (time.perf_counter() - started) * 1000
+    trace.add("db.query", round((started - trace._t0) * 1000, 3), round(duration, 3),
+              sql=" ".join(statement.split())[:MAX_SQL_LENGTH])
+
+
+def _install_db_hooks():
+    global _db_hooks_installed
+    if _db_hooks_installed:
+        return
+    with _install_lock:
+        if _db_hooks_installed:
+            return
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+        event.listen(Engine, "before_cursor_execute", _before_execute)
+        event.listen(Engine, "after_cursor_execute", _after_execute)
+        _db_hooks_installed = True
@@ -0,0 +1,154 @@
+import json
+import os
+import re
+import threading
+import time
+import uuid
+
+import config
+from models import file_lock, ingest
+
+_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+class OffsetMismatch(ValueError):
+    """A chunk was sent for another offset than the upload is at."""
+
+    def __init__(self, offset: int):
+        super().__init__(f"Offset mismatch: upload is at {offset}")
+        self.offset = offset
+
+
+class UploadStore:
+    """Resumable chunked uploads: ``<id>.json`` (filename, size, user) and ``<id>.part``.
+
+    Chunks are appended at the offset the client names; a mismatch (lost or
+    repeated chunk) is refused with the current offset so the client can
+    resume from there. The running SHA-256 of each upload is kept in memory
+    of the process that received its chunks; if a chunk lands in another
+    worker process the hash is recomputed from disk once, on completion.
+    Each upload has its own lock (``file_lock.edit(upload_id, "upload")``,
+    shared by all worker processes), held while a chunk is checked and
+    written, so two requests for the same upload cannot both append.
+    """
+
+    _lock = threading.Lock()  # guards _hashes only
+    _hashes: dict[str, tuple[int, object]] = {}  # upload_id -> (offset, sha256)
+
+    @staticmethod
+    def _path(upload_id: str, ext: str) -> str | None:
+        if not _ID_RE.match(upload_id):
+            return None
+        return os.path.join(config.UPLOADS_DIR, f"{upload_id}.{ext}")
+
+    @classmethod
+    def create(cls, filename: str, ext: str, size: int, user: str) -> dict:
+        if size <= 0:
+            raise ValueError("size must be positive")
+        if size > config.MAX_RESUMABLE_UPLOAD_SIZE:
+            raise ingest.UploadTooLarge(f"File exceeds {config.MAX_RESUMABLE_UPLOAD_SIZE // (1024 * 1024)} MB")
+        cls.prune()
+        os.makedirs(config.UPLOADS_DIR, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        state = {"upload_id": upload_id, "filename": filename, "ext": ext, "size": size, "user": user}
+        open(cls._path(upload_id, "part"), "wb").close()
+        with open(cls._path(upload_id, "json"), "w", encoding="utf-8") as fh:
+            json.dump(state, fh)
+        return cls.get(upload_id)
+
+    @classmethod
+    def get(cls, upload_id: str) -> dict | None:
+        """Upload state with the current ``offset`` and ``chunk_size``, or None."""
+        meta, part = cls._path(upload_id, "json"), cls._path(upload_id, "part")
+        if meta is None or not os.path.exists(meta) or not os.path.exists(part):
+            return None
+        with open(meta, encoding="utf-8") as fh:
+            state = json.load(fh)
+        stat = os.stat(part)
+        return dict(state, offset=stat.st_size, chunk_size=config.UPLOAD_CHUNK_SIZE,
+                    expires_at=int(stat.st_mtime) + config.UPLOAD_EXPIRY)
+
+    @classmethod
+    def append(cls, upload_id: str, offset: int, stream, length: int) -> dict:
+        """Write ``length`` bytes from ``stream`` at ``offset``; return the new state.
+
+        Raises LookupError for an unknown upload, OffsetMismatch for a chunk
+        at the wrong offset and ValueError for an oversized chunk or content
+        that does not match the file extension.
+        """
+        if not _ID_RE.match(upload_id):
+            raise LookupError(upload_id)
+        with file_lock.edit(upload_id, "upload"):
+            state = cls.get(upload_id)
+            if state is None:
+                raise LookupError(upload_id)
+            if offset != state["offset"]:
+                raise OffsetMismatch(state["offset"])
+            if length > config.UPLOAD_CHUNK_SIZE:
+                raise ingest.UploadTooLarge(f"Chunk exceeds {config.UPLOAD_CHUNK_SIZE} bytes")
+            if offset + length > state["size"]:
+                raise ValueError("Chunk extends beyond the announced size")
+            part = cls._path(upload_id, "part")
+            head = b""
+            if offset:
+                with open(part, "rb") as fh:
+                    head = fh.read(ingest.SNIFF_BYTES)
+            with cls._lock:
+                hashed_to, sha = cls._hashes.get(upload_id, (0, None))
+            with open(part, "ab") as fh:
+                writer = ingest.Writer(fh, state["ext"], state["size"], offset,
+                                       sha if hashed_to == offset else None, head)
+                try:
+                    writer.copy(stream, length)
+                    if writer.size == state["size"]:
+                        writer.finish()
+                except BaseException:
+                    fh.truncate(offset)
+                    raise
+            if writer.sha is not None:
+                with cls._lock:
+                    cls._hashes[upload_id] = (writer.size, writer.sha)
+            return dict(state, offset=writer.size)
+
+    @classmethod
+    def take(cls, upload_id: str, dest: str) -> dict:
+        """Move a complete upload to ``dest``; return its File columns."""
+        if not _ID_RE.match(upload_id):
+            raise LookupError(upload_id)
+        with file_lock.edit(upload_id, "upload"):
+            state = cls.get(upload_id)
+            if state is None or state["offset"] != state["size"]:
+                raise LookupError(upload_id)
+            with cls._lock:
+                hashed_to, sha = cls._hashes.get(upload_id, (0, None))
+            part = cls._path(upload_id, "part")
+            result = ingest.info(part, ingest.format_for(state["ext"]), state["size"],
+                                 sha if hashed_to == state["size"] else None)
+            os.replace(part, dest)
+            cls.delete(upload_id)
+        return result
+
+    @classmethod
+    def delete(cls, upload_id: str):
+        if not _ID_RE.match(upload_id):
+            return
+        with file_lock.edit(upload_id, "upload"):
+            with cls._lock:
+                cls._hashes.pop(upload_id, None)
+            for ext in ("part", "json"):
+                path = cls._path(upload_id, ext)
+                if os.path.exists(path):
+                    os.remove(path)
+            file_lock.discard(upload_id, ("upload",))
+
+    @classmethod
+    def prune(cls):
+        """Drop uploads that received no chunk for UPLOAD_EXPIRY seconds."""
+        if not os.path.isdir(config.UPLOADS_DIR):
+            return
+        cutoff = time.time() - config.UPLOAD_EXPIRY
+        for name in os.listdir(config.UPLOADS_DIR):
+            upload_id, _, ext = name.partition(".")
+            path = os.path.join(config.UPLOADS_DIR, name)
+            if ext == "part" and os.path.getmtime(path) < cutoff:
+                cls.delete(upload_id)
@@ -0,0 +1,284 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+from sqlalchemy import delete, select
+
+import config
+from models import admission, cpu_pool, metrics, storage
+from models.database import get_session
+from models.db_models import File, HistoryEntry
+from models.image_processor import ImageProcessor
+from models.page_manifest import PageManifest
+from models.pdf_processor import PdfProcessor
+
+# Image operation arguments longer than this (annotation overlays) are stored as blobs
+INLINE_ARG_LIMIT = 1024
+
+IMAGE_OPS = {
+    "crop": ImageProcessor.crop,
+    "resize": ImageProcessor.resize,
+    "rotate": ImageProcessor.rotate,
+    "adjust": ImageProcessor.adjust,
+    "annotate": ImageProcessor.annotate,
+}
+
+
+class VersionHistory:
+    """Undo history that stores deltas instead of full copies.
+
+    Objects live under the storage keys ``history/<file_id>/``:
+    ``pages/<hash>.pdf`` holds one single-page PDF per page content that is
+    neither in the original nor stored already, ``blobs/<sha256>`` large
+    image-operation arguments and snapshots. Recently rebuilt versions are
+    cached locally in ``HISTORY_DIR/<file_id>/cache/<version>.<ext>``. A PDF
+    version is a list of page references (a rotation stores one page); an
+    image version is the operation applied, replayed from the original.
+    """
+
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _dir(file_id: str, *parts: str) -> str:
+        return os.path.join(config.HISTORY_DIR, file_id, *parts)
+
+    @staticmethod
+    def _key(file_id: str, *parts: str) -> str:
+        return "/".join(("history", file_id) + parts)
+
+    @staticmethod
+    def _entries(session, file_id: str) -> list[HistoryEntry]:
+        return session.execute(select(HistoryEntry).where(HistoryEntry.file_id == file_id)
+                               .order_by(HistoryEntry.version)).scalars().all()
+
+    @classmethod
+    def _put_blob(cls, file_id: str, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        key = cls._key(file_id, "blobs", digest)
+        if not storage.exists(key):
+            storage.write(key, data)
+        return digest
+
+    @classmethod
+    def _original_delta(cls, f: File, original: str) -> dict:
+        if f.file_type != "pdf":
+            return {}
+        hashes = cpu_pool.run("history", PdfProcessor.page_hashes, original)
+        return {"pages": [["o", i] for i in range(len(hashes))], "original": hashes}
+
+    @classmethod
+    def _pdf_delta(cls, file_id: str, base: dict, current: str) -> dict:
+        """Page references for ``current``; stores the pages the history does not have yet."""
+        manifest = PageManifest.get(file_id)
+        if manifest and manifest["pages"]:
+            hashes = [p["hash"] for p in manifest["pages"]]
+        else:
+            hashes = cpu_pool.run("history", PdfProcessor.page_hashes, current)
+        in_original = {h: i for i, h in reversed(list(enumerate(base.get("original", []))))}
+        refs = []
+        for index, h in enumerate(hashes):
+            if h in in_original:
+                refs.append(["o", in_original[h]])
+                continue
+            key = cls._key(file_id, "pages", f"{h}.pdf")
+            if not storage.exists(key):
+                storage.write(key, cpu_pool.run("history", PdfProcessor.extract_page, current, index))
+            refs.append(["b", h])
+        return {"pages": refs}
+
+    @classmethod
+    @metrics.timed("version_history")
+    def record(cls, file_id: str, action: str, user: str = "anonymous",
+               op: tuple[str, list] | None = None, restored: int | None = None) -> int | None:
+        """Append the state of current/ as a new version; returns its number.
+
+        ``op`` is the image operation that produced it (name, args),
+        ``restored`` the version it was restored from. Version 0 (the
+        original) is created on the first call.
+        """
+        from models.version_store import VersionStore
+        session = get_session()
+        try:
+            f = session.get(File, file_id)
+            if f is None:
+                return None
+            original = VersionStore.get_original_path(file_id)
+            current = VersionStore.get_current_path(file_id)
+            with cls._lock:
+                entries = cls._entries(session, file_id)
+                if not entries:
+                    base = HistoryEntry(file_id=file_id, version=0, action="upload", user=user,
+                                        delta=json.dumps(cls._original_delta(f, original)))
+                    session.add(base)
+                    entries = [base]
+                    if action == "upload":
+                        session.commit()
+                        return 0
+                    if f.file_type != "pdf" and op is not None:
+                        # History starts after earlier edits: the first image
+                        # version cannot be replayed from the original
+                        op, restored = None, None
+                base = json.loads(entries[0].delta)
+                if f.file_type == "pdf":
+                    delta = cls._pdf_delta(file_id, base, current)
+                elif restored is not None:
+                    delta = {}
+                elif action == "reset_to_original":
+                    delta = {"reset": True}
+                elif op is not None:
+                    name, args = op
+                    delta = {"op": [name, [
+                        {"blob": cls._put_blob(file_id, a.encode())}
+                        if isinstance(a, str) and len(a) > INLINE_ARG_LIMIT else a
+                        for a in args
+                    ]]}
+                else:
+                    with open(current, "rb") as fh:
+                        delta = {"snapshot": cls._put_blob(file_id, fh.read())}
+                if restored is not None:
+                    delta["restored"] = restored
+                version = entries[-1].version + 1
+                session.add(HistoryEntry(file_id=file_id, version=version, action=action, user=user,
+                                         delta=json.dumps(delta)))
+                session.commit()
+            return version
+        finally:
+            session.close()
+
+    @classmethod
+    def versions(cls, file_id: str) -> list[dict]:
+        session = get_session()
+        entries = cls._entries(session, file_id)
+        result = []
+        for e in entries:
+            item = e.to_dict()
+            delta = json.loads(e.delta)
+            if "pages" in delta:
+                item["pages"] = len(delta["pages"])
+                item["pages_changed"] = sum(1 for kind, _ in delta["pages"] if kind == "b")
+            if "restored" in delta:
+                item["restored"] = delta["restored"]
+            result.append(item)
+        session.close()
+        return result
+
+    @staticmethod
+    def latest(file_id: str) -> dict | None:
+        """Number, action and restore source of the newest version, or None without history."""
+        session = get_session()
+        e = session.execute(select(HistoryEntry).where(HistoryEntry.file_id == file_id)
+                            .order_by(HistoryEntry.version.desc()).limit(1)).scalar_one_or_none()
+        session.close()
+        if e is None:
+            return None
+        return {"version": e.version, "action": e.action, "restored": json.loads(e.delta).get("restored")}
+
+    @classmethod
+    @metrics.timed("version_history")
+    def materialize(cls, file_id: str, version: int) -> str:
+        """Path of the file as it was at ``version`` (rebuilt and cached on a miss).
+
+        Raises LookupError for an unknown version.
+        """
+        from models.version_store import VersionStore
+        session = get_session()
+        f = session.get(File, file_id)
+        entries = {e.version: json.loads(e.delta) for e in cls._entries(session, file_id)} if f else {}
+        ext, file_type = (f.ext, f.file_type) if f else (None, None)
+        session.close()
+        if version not in entries:
+            raise LookupError(f"Unknown version: {version}")
+        cached = cls._dir(file_id, "cache", f"{version}.{ext}")
+        if os.path.exists(cached):
+            metrics.cache_lookup("history", True)
+            os.utime(cached)
+            return cached
+        metrics.cache_lookup("history", False)
+        original = VersionStore.get_original_path(file_id)
+        if file_type == "pdf":
+            refs = entries[version]["pages"]
+            parts = [(original, ref) if kind == "o"
+                     else (storage.local_path(cls._key(file_id, "pages", f"{ref}.pdf")), 0)
+                     for kind, ref in refs]
+            if refs == [["o", i] for i in range(len(entries[0]["pages"]))]:
+                built = f"{cached}.build"
+                os.makedirs(os.path.dirname(built), exist_ok=True)
+                shutil.copyfile(original, built)
+            else:
+                built = cpu_pool.run("history", PdfProcessor.assemble, parts,
+                                     cost=admission.file_cost(sorted({path for path, _ in parts})))
+        else:
+            built = cls._replay(file_id, original, ext, entries, version)
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        shutil.move(built, f"{cached}.tmp")
+        os.replace(f"{cached}.tmp", cached)
+        cls.prune_cache()
+        return cached
+
+    @classmethod
+    def _replay(cls, file_id: str, original: str, ext: str, entries: dict, version: int) -> str:
+        """Rebuild an image version by applying its operations to the original (or a snapshot)."""
+        ops, start = [], original
+        v = version
+        while v > 0:
+            delta = entries[v]
+            if "restored" in delta:
+                v = delta["restored"]
+                continue
+            if delta.get("reset"):
+                break
+            if "snapshot" in delta:
+                start = storage.local_path(cls._key(file_id, "blobs", delta["snapshot"]))
+                break
+            ops.append(delta["op"])
+            v -= 1
+        path = f"{cls._dir(file_id, 'cache', str(version))}.build.{ext}"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(start, path)
+        for name, args in reversed(ops):
+            args = [cls._read_blob(file_id, a["blob"]) if isinstance(a, dict) else a for a in args]
+            result = cpu_pool.run("history", IMAGE_OPS[name], path, *args,
+                                  cost=admission.image_raster_cost([path]))
+            os.replace(result, path)
+        return path
+
+    @classmethod
+    def _read_blob(cls, file_id: str, digest: str) -> str:
+        return storage.read(cls._key(file_id, "blobs", digest)).decode("utf-8")
+
+    @staticmethod
+    def prune_cache():
+        """Delete the least recently used rebuilt versions beyond HISTORY_CACHE_SIZE."""
+        if not os.path.isdir(config.HISTORY_DIR):
+            return
+        cached = []
+        for file_id in os.listdir(config.HISTORY_DIR):
+            cache_dir = os.path.join(config.HISTORY_DIR, file_id, "cache")
+            if not os.path.isdir(cache_dir):
+                continue
+            for name in os.listdir(cache_dir):
+                try:
+                    st = os.stat(os.path.join(cache_dir, name))
+                except OSError:
+                    continue
+                cached.append((st.st_mtime, st.st_size, os.path.join(cache_dir, name)))
+        total = sum(size for _, size, _ in cached)
+        for _, size, path in sorted(cached):
+            if total <= config.HISTORY_CACHE_SIZE:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    @classmethod
+    def remove(cls, file_id: str):
+        session = get_session()
+        session.execute(delete(HistoryEntry).where(HistoryEntry.file_id == file_id))
+        session.commit()
+        session.close()
+        storage.delete_prefix(cls._key(file_id) + "/")
+        shutil.rmtree(cls._dir(file_id), ignore_errors=True)
@@ -1,26 +1,46 @@
+import logging
 import os
 import shutil
+import uuid
 from datetime import datetime, timezone
 
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
+
 import config
+from models import admission, cpu_pool, file_lock, metrics, storage
 from models.database import get_session
 from models.db_models import File
+from models.page_manifest import PageManifest
+from models.pdf_processor import PdfProcessor
+from models.tile_cache import TileCache
+
+log = logging.getLogger(__name__)
 
 
 class VersionStore:
     @staticmethod
-    def get_original_path(file_id: str) -> str | None:
+    def original_key(file_id: str, ext: str) -> str:
+        return f"originals/{file_id}.{ext}"
+
+    @staticmethod
+    def current_key(file_id: str, ext: str) -> str:
+        return f"current/{file_id}.{ext}"
+
+    @classmethod
+    def get_original_path(cls, file_id: str) -> str | None:
+        """Local path of the original (fetched into the cache with remote storage)."""
         session = get_session()
         f = session.get(File, file_id)
         if not f:
             session.close()
             return None
-        path = os.path.join(config.ORIGINALS_DIR, f"{file_id}.{f.ext}")
+        ext = f.ext
         session.close()
-        return path
+        return storage.local_path(cls.original_key(file_id, ext))
 
-    @staticmethod
-    def get_current_path(file_id: str) -> str | None:
+    @classmethod
+    def get_current_path(cls, file_id: str) -> str | None:
         """Return current/ path if it exists, otherwise fall back to original."""
         session = get_session()
         f = session.get(File, file_id)
@@ -29,15 +49,37 @@ class VersionStore:
             return None
         ext = f.ext
         session.close()
-        current = os.path.join(config.CURRENT_DIR, f"{file_id}.{ext}")
-        if os.path.exists(current):
-            return current
-        original = os.path.join(config.ORIGINALS_DIR, f"{file_id}.{ext}")
-        return original if os.path.exists(original) else None
+        return (storage.local_path(cls.current_key(file_id, ext))
+                or storage.local_path(cls.original_key(file_id, ext)))
+
+    @staticmethod
+    def pin(path: str) -> str:
+        """A private name for the file at ``path``, to read it after the read lock is released.
+
+        Stored files are only ever replaced by rename, so a hard link keeps
+        this version's content (a copy where links are not supported). The
+        caller removes it.
+        """
+        pinned = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        try:
+            os.link(path, pinned)
+        except OSError:
+            shutil.copyfile(path, pinned)
+        return pinned
 
     @classmethod
-    def update_current(cls, file_id: str, source_path: str):
-        """Replace the current/ file with a copy of source_path."""
+    @metrics.timed("version_store")
+    def update_current(cls, file_id: str, source_path: str, pages: list[int | None] | None = None):
+        """Replace the current/ file with a copy of source_path.
+
+        PDFs are stored linearized (config.PDF_LINEARIZE); the processors
+        already save their results that way, anything else is rewritten here.
+        The new file is staged and then stored in one step (a rename on local
+        storage), so a reader sees either the old or the new file, never a
+        partial one.
+        For PDFs the next page manifest revision is recorded; ``pages`` maps
+        each new page to its previous position (see PageManifest.update).
+        """
         session = get_session()
         f = session.get(File, file_id)
         if not f:
@@ -45,13 +87,57 @@ class VersionStore:
             raise ValueError(f"Unknown file: {file_id}")
         ext = f.ext
         session.close()
-        dest = os.path.join(config.CURRENT_DIR, f"{file_id}.{ext}")
-        if os.path.exists(dest):
-            os.remove(dest)
-        shutil.copy2(source_path, dest)
+        key = cls.current_key(file_id, ext)
+        tmp = storage.staging_path(key)
+        try:
+            if ext == "pdf" and config.PDF_LINEARIZE and not PdfProcessor.is_linearized(source_path):
+                linearized = cpu_pool.run("pdf_edit", PdfProcessor.linearize, source_path,
+                                          cost=admission.file_cost([source_path]))
+                shutil.move(linearized, tmp)
+            else:
+                shutil.copy2(source_path, tmp)
+            hashes, size = None, None
+            if ext == "pdf":
+                # Hashed before the write lock: readers wait for the swap only
+                try:
+                    hashes, size = cpu_pool.run("pdf_edit", PdfProcessor.page_summary, tmp)
+                except Exception as e:
+                    log.warning("Page hashes for %s failed: %s", file_id, e)
+            with file_lock.write(file_id):
+                storage.put(key, tmp)
+                TileCache.invalidate(file_id)
+                if ext == "pdf":
+                    cls.record_pages(file_id, None, pages, hashes, size)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    @staticmethod
+    def record_pages(file_id: str, path: str | None, pages: list[int | None] | None = None,
+                     hashes: list[str] | None = None, size: tuple[int, int] | None = None):
+        """Update the page manifest without failing the edit that triggered it.
+
+        ``hashes`` and ``size`` are the PdfProcessor.page_summary of the new
+        file if the caller has them (then ``path`` is not read). Without either, or on failure, the page
+        rows are dropped; the manifest is rebuilt (with new page ids) when it
+        is requested next.
+        """
+        try:
+            if path is None and hashes is None:
+                raise ValueError("no page hashes")
+            PageManifest.update(file_id, path, pages, hashes, size)
+        except Exception as e:
+            log.warning("Page manifest update for %s failed: %s", file_id, e)
+            try:
+                PageManifest.remove(file_id)
+            except Exception:
+                pass
 
     @classmethod
-    def create_metadata(cls, file_id: str, original_name: str, file_type: str, ext: str) -> dict:
+    @metrics.timed("version_store")
+    def create_metadata(cls, file_id: str, original_name: str, file_type: str, ext: str,
+                        **details) -> dict:
+        """Insert the File row; ``details`` are the ingest columns (size, sha256, ...)."""
         session = get_session()
         now = datetime.now(timezone.utc)
         f = File(
@@ -60,6 +146,7 @@ class VersionStore:
             file_type=file_type,
             ext=ext,
             created_at=now,
+            **details,
         )
         session.add(f)
         session.commit()
@@ -78,9 +165,20 @@ class VersionStore:
         session.close()
         return result
 
+    @staticmethod
+    def get_metadata_many(file_ids: list[str]) -> dict[str, dict]:
+        """Metadata of the existing files among ``file_ids``, by id (one query)."""
+        session = get_session()
+        files = session.query(File).filter(File.file_id.in_(file_ids)).all()
+        result = {f.file_id: f.to_dict() for f in files}
+        session.close()
+        return result
+
     @classmethod
     def delete_file(cls, file_id: str):
         from models.annotation_store import AnnotationStore
+        from models.text_index import TextIndex
+        from models.version_history import VersionHistory
         session = get_session()
         f = session.get(File, file_id)
         if not f:
@@ -91,18 +189,53 @@ class VersionStore:
         session.commit()
         session.close()
 
-        orig = os.path.join(config.ORIGINALS_DIR, f"{file_id}.{ext}")
-        if os.path.exists(orig):
-            os.remove(orig)
-        curr = os.path.join(config.CURRENT_DIR, f"{file_id}.{ext}")
-        if os.path.exists(curr):
-            os.remove(curr)
+        with file_lock.write(file_id):
+            storage.delete(cls.original_key(file_id, ext))
+            storage.delete(cls.current_key(file_id, ext))
         AnnotationStore.delete_all(file_id)
+        TextIndex.remove(file_id)
+        TileCache.invalidate(file_id)
+        PageManifest.remove(file_id)
+        VersionHistory.remove(file_id)
 
     @classmethod
     def list_files(cls) -> list[dict]:
+        return cls.list_files_page()[0]
+
+    @classmethod
+    def list_files_page(cls, limit: int | None = None, file_type: str = "",
+                        since: datetime | None = None, until: datetime | None = None,
+                        after: tuple[datetime, str] | None = None,
+                        fields: list[str] | None = None) -> tuple[list[dict], tuple[str, str] | None]:
+        """Return files newest first, optionally paged by (created_at, file_id).
+
+        ``after`` is the key of the last file on the previous page. The second
+        element of the result is the key for the next page, or None.
+        """
         session = get_session()
-        files = session.query(File).order_by(File.created_at.desc()).all()
-        result = [f.to_dict() for f in files]
+        query = session.query(File)
+        if fields:
+            query = query.options(load_only(*[getattr(File, f) for f in fields]))
+        if file_type:
+            query = query.filter(File.file_type == file_type)
+        if since:
+            query = query.filter(File.created_at >= since)
+        if until:
+            query = query.filter(File.created_at < until)
+        if after is not None:
+            created_at, file_id = after
+            query = query.filter(or_(
+                File.created_at < created_at,
+                and_(File.created_at == created_at, File.file_id < file_id),
+            ))
+        query = query.order_by(File.created_at.desc(), File.file_id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        files = query.all()
+        result = [f.to_dict(fields) for f in files]
+        next_key = None
+        if limit is not None and files and len(files) == limit:
+            last = files[-1]
+            next_key = (last.created_at.isoformat(), last.file_id)
         session.close()
-        return result
+        return result, next_key
@@ -0,0 +1,22 @@
+from flask import Blueprint, jsonify
+
+from models.admission import Overloaded
+from models.file_lock import LockTimeout
+
+errors_bp = Blueprint("errors", __name__)
+
+
+@errors_bp.app_errorhandler(Overloaded)
+def overloaded(e: Overloaded):
+    response = jsonify({"error": str(e), "operation": e.operation})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+@errors_bp.app_errorhandler(LockTimeout)
+def lock_timeout(e: LockTimeout):
+    response = jsonify({"error": str(e)})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
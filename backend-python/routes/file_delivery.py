@@ -0,0 +1,130 @@
+"""Sending stored files: from the worker, or offloaded to the front server (FILE_DELIVERY)."""
+import io
+import os
+import time
+import zipfile
+from collections.abc import Iterable
+from typing import BinaryIO
+from urllib.parse import quote
+
+from flask import Response, current_app, request, send_file
+from werkzeug.wsgi import FileWrapper
+
+import config
+
+OFFLOAD_MODES = ("x-sendfile", "x-accel-redirect")
+
+
+def _chunked_file_wrapper(file, buffer_size: int = 8192) -> FileWrapper:
+    # Werkzeug reads 8 KB per iteration; through asgiref every block is its own message
+    return FileWrapper(file, max(buffer_size, config.FILE_CHUNK_SIZE))
+
+
+def _storage_relpath(path: str) -> str | None:
+    storage = os.path.realpath(config.STORAGE_DIR)
+    real = os.path.realpath(path)
+    if os.path.commonpath([storage, real]) != storage:
+        return None
+    return os.path.relpath(real, storage)
+
+
+def send_stored_file(path: str, mimetype: str | None = None, as_attachment: bool = False,
+                     download_name: str | None = None):
+    """Like send_file for a file under STORAGE_DIR, delivered as configured.
+
+    "app" streams the file from this worker (Range and conditional requests
+    included), in FILE_CHUNK_SIZE blocks or zero-copy where the WSGI server
+    provides wsgi.file_wrapper (gunicorn). "x-sendfile" and "x-accel-redirect"
+    answer with headers only and the front server sends the bytes, handling
+    Range and caching itself; Content-Type and Content-Disposition are still
+    set here. Files outside STORAGE_DIR are always sent by the app.
+    """
+    relpath = _storage_relpath(path) if config.FILE_DELIVERY in OFFLOAD_MODES else None
+    if relpath is None:
+        # Keep a server-provided wrapper: gunicorn's uses sendfile()
+        request.environ.setdefault("wsgi.file_wrapper", _chunked_file_wrapper)
+        return send_file(path, mimetype=mimetype, as_attachment=as_attachment,
+                         download_name=download_name, conditional=True)
+
+    from werkzeug.utils import send_file as werkzeug_send_file
+    response = werkzeug_send_file(
+        os.path.realpath(path), request.environ, mimetype=mimetype, as_attachment=as_attachment,
+        download_name=download_name, conditional=False, etag=False, use_x_sendfile=True,
+        response_class=current_app.response_class,
+    )
+    if config.FILE_DELIVERY == "x-accel-redirect":
+        del response.headers["X-Sendfile"]
+        response.headers["X-Accel-Redirect"] = config.FILE_ACCEL_PREFIX.rstrip("/") + "/" + quote(
+            relpath.replace(os.sep, "/"))
+        # nginx takes the length from the file it serves
+        response.content_length = 0
+    return response
+
+
+class _ZipSink(io.RawIOBase):
+    """Unseekable target for ZipFile; whatever was written is handed out by ``take``."""
+
+    def __init__(self):
+        super().__init__()
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _zip_name(name: str, used: set[str]) -> str:
+    """``name`` without path separators, numbered if the archive already has it."""
+    name = name.replace("/", "_").replace("\\", "_") or "file"
+    stem, dot, ext = name.rpartition(".")
+    if not dot:
+        stem, ext = name, ""
+    candidate, n = name, 1
+    while candidate.lower() in used:
+        n += 1
+        candidate = f"{stem} ({n}){dot}{ext}"
+    used.add(candidate.lower())
+    return candidate
+
+
+def send_zip(members: Iterable[tuple[str, BinaryIO]], download_name: str) -> Response:
+    """A ZIP of ``members`` (name, open binary file), built while it is sent.
+
+    ``members`` is consumed lazily, one file at a time, and each file is
+    closed once it is in the archive. Entries are stored uncompressed (PDFs
+    and images are compressed already) with data descriptors, so at most one
+    FILE_CHUNK_SIZE block is buffered and no temporary file is written; the
+    length is unknown up front, the response is chunked.
+    """
+    def generate():
+        sink = _ZipSink()
+        used: set[str] = set()
+        with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as zf:
+            for name, fh in members:
+                with fh:
+                    st = os.fstat(fh.fileno())
+                    # ZIP timestamps start in 1980
+                    date_time = max(time.localtime(st.st_mtime)[:6], (1980, 1, 1, 0, 0, 0))
+                    info = zipfile.ZipInfo(_zip_name(name, used), date_time)
+                    # Known up front, so ZIP64 headers are only used where needed
+                    info.file_size = st.st_size
+                    with zf.open(info, "w") as entry:
+                        while chunk := fh.read(config.FILE_CHUNK_SIZE):
+                            entry.write(chunk)
+                            yield sink.take()
+                yield sink.take()
+        yield sink.take()
+
+    response = Response((chunk for chunk in generate() if chunk), mimetype="application/zip")
+    response.headers.set("Content-Disposition", "attachment", filename=download_name)
+    # Let nginx pass the stream through instead of buffering it to disk
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
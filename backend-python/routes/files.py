@@ -2,32 +2,192 @@ import os
 
 from flask import Blueprint, after_this_request, jsonify, request, send_file
 
+import config
+from models import admission, cpu_pool, file_lock, ingest
 from models.annotation_store import AnnotationStore
+from models.db_models import File
 from models.file_manager import FileManager
 from models.pdf_processor import PdfProcessor
+from models.upload_store import OffsetMismatch, UploadStore
 from models.version_store import VersionStore
+from routes.file_delivery import send_stored_file, send_zip
+from routes.query_params import decode_cursor, encode_cursor, page_size, parse_fields, parse_time
 
 files_bp = Blueprint("files", __name__)
 
 
 @files_bp.route("/api/files", methods=["GET"])
 def api_list_files():
-    return jsonify(FileManager.list_files())
+    """All files, newest first. With ``limit`` the list is paged via ``X-Next-Cursor``."""
+    try:
+        limit = page_size(request.args.get("limit"), None)
+        fields = parse_fields(request.args.get("fields"), File.FIELDS)
+        cursor = request.args.get("cursor")
+        after = None
+        if cursor:
+            key = decode_cursor(cursor)
+            if len(key) != 2:
+                raise ValueError("Invalid cursor")
+            after = (parse_time(key[0]), str(key[1]))
+        files, next_key = FileManager.list_files_page(
+            limit,
+            file_type=request.args.get("type", ""),
+            since=parse_time(request.args.get("since")),
+            until=parse_time(request.args.get("until")),
+            after=after,
+            fields=fields,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify(files)
+    if next_key is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(next_key)
+    return response
 
 
 @files_bp.route("/api/files/upload", methods=["POST"])
 def api_upload():
-    if "file" not in request.files:
-        return jsonify({"error": "No file provided"}), 400
-    f = request.files["file"]
-    if not f.filename:
+    """Upload as multipart field ``file`` or as raw body with ``?filename=``.
+
+    A raw body is streamed straight into storage; multipart bodies are first
+    spooled by Werkzeug. Both are limited to MAX_UPLOAD_SIZE, larger files
+    go through /api/uploads.
+    """
+    if request.mimetype == "multipart/form-data":
+        if "file" not in request.files:
+            return jsonify({"error": "No file provided"}), 400
+        f = request.files["file"]
+        filename, stream, user = f.filename, f.stream, request.form.get("user", "anonymous")
+    else:
+        filename, stream = request.args.get("filename", ""), request.stream
+        user = request.args.get("user", "anonymous")
+    if not filename:
         return jsonify({"error": "Empty filename"}), 400
-    user = request.form.get("user", "anonymous")
     try:
-        meta = FileManager.upload(f.filename, f.stream, user)
+        meta = FileManager.upload(filename, stream, user)
         return jsonify(meta), 201
+    except ingest.UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@files_bp.route("/api/files/upload-zip", methods=["POST"])
+def api_upload_zip():
+    """Upload every file in a ZIP, as multipart field ``file`` or raw body.
+
+    Answers 200 with one result per entry (``status`` 201, 400 or 413);
+    entries succeed or fail independently.
+    """
+    request.max_content_length = config.MAX_ZIP_UPLOAD_SIZE
+    if request.mimetype == "multipart/form-data":
+        if "file" not in request.files:
+            return jsonify({"error": "No file provided"}), 400
+        archive, user = request.files["file"].stream, request.form.get("user", "anonymous")
+    else:
+        archive, user = request.stream, request.args.get("user", "anonymous")
+    try:
+        results = FileManager.upload_zip(archive, user)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    uploaded = sum(1 for r in results if r["status"] == 201)
+    return jsonify({"files": results, "uploaded": uploaded, "failed": len(results) - uploaded})
+
+
+@files_bp.route("/api/files/download-zip")
+def api_download_zip():
+    """Several files as one ZIP streamed while it is built: ``?ids=a,b,c&mode=original``."""
+    ids = list(dict.fromkeys(i for i in request.args.get("ids", "").split(",") if i))
+    mode = request.args.get("mode", "current")
+    if not ids:
+        return jsonify({"error": "No files specified"}), 400
+    if len(ids) > config.ZIP_MAX_ENTRIES:
+        return jsonify({"error": f"At most {config.ZIP_MAX_ENTRIES} files per archive"}), 400
+    if mode not in ("current", "original"):
+        return jsonify({"error": "mode must be current or original"}), 400
+    metas = VersionStore.get_metadata_many(ids)
+    missing = [i for i in ids if i not in metas]
+    if missing:
+        return jsonify({"error": "Not found", "missing": missing}), 404
+
+    def members():
+        for file_id in ids:
+            # Locked only while opening: the open file survives a later replace
+            with file_lock.read(file_id):
+                if mode == "original":
+                    path = VersionStore.get_original_path(file_id)
+                else:
+                    path = VersionStore.get_current_path(file_id)
+                fh = open(path, "rb") if path else None
+            if fh is not None:  # deleted since the check above
+                yield metas[file_id]["original_name"], fh
+
+    return send_zip(members(), "documents.zip")
+
+
+# --- Resumable chunked uploads ---
+
+@files_bp.route("/api/uploads", methods=["POST"])
+def api_create_upload():
+    """Start a chunked upload: JSON ``{"filename", "size", "user"}``."""
+    data = request.get_json(silent=True) or {}
+    filename = str(data.get("filename", ""))
+    try:
+        ext = FileManager.upload_ext(filename)
+        size = int(data.get("size", 0))
+        state = UploadStore.create(filename, ext, size, data.get("user", "anonymous"))
+    except ingest.UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(state), 201
+
+
+@files_bp.route("/api/uploads/<upload_id>", methods=["GET"])
+def api_get_upload(upload_id):
+    """Current offset of an upload, to resume after an interruption."""
+    state = UploadStore.get(upload_id)
+    if state is None:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(state)
+
+
+@files_bp.route("/api/uploads/<upload_id>", methods=["PATCH"])
+def api_upload_chunk(upload_id):
+    """Append the body at ``Upload-Offset``; the last chunk creates the file (201)."""
+    length = request.content_length
+    if length is None:
+        return jsonify({"error": "Content-Length required"}), 411
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        return jsonify({"error": "Upload-Offset header required"}), 400
+    try:
+        state = UploadStore.append(upload_id, offset, request.stream, length)
+    except LookupError:
+        return jsonify({"error": "Not found"}), 404
+    except OffsetMismatch as e:
+        return jsonify({"error": str(e), "offset": e.offset}), 409
+    except ingest.UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if state["offset"] < state["size"]:
+        return jsonify(state)
+    try:
+        meta = FileManager.finish_upload(upload_id)
+    except LookupError:
+        return jsonify({"error": "Not found"}), 404
     except ValueError as e:
+        UploadStore.delete(upload_id)
         return jsonify({"error": str(e)}), 400
+    return jsonify(meta), 201
+
+
+@files_bp.route("/api/uploads/<upload_id>", methods=["DELETE"])
+def api_abort_upload(upload_id):
+    UploadStore.delete(upload_id)
+    return jsonify({"ok": True})
 
 
 @files_bp.route("/api/files/<file_id>", methods=["GET"])
@@ -48,14 +208,15 @@ def api_delete_file(file_id):
 @files_bp.route("/api/files/<file_id>/download")
 def api_download(file_id):
     mode = request.args.get("mode", "current")
-    if mode == "original":
-        path = VersionStore.get_original_path(file_id)
-    else:
-        path = VersionStore.get_current_path(file_id)
-    if not path or not os.path.exists(path):
-        return jsonify({"error": "Not found"}), 404
-    info = VersionStore.get_metadata(file_id)
-    return send_file(path, as_attachment=True, download_name=info["original_name"])
+    with file_lock.read(file_id):
+        if mode == "original":
+            path = VersionStore.get_original_path(file_id)
+        else:
+            path = VersionStore.get_current_path(file_id)
+        if not path or not os.path.exists(path):
+            return jsonify({"error": "Not found"}), 404
+        info = VersionStore.get_metadata(file_id)
+        return send_stored_file(path, as_attachment=True, download_name=info["original_name"])
 
 
 @files_bp.route("/api/files/<file_id>/export-annotated", methods=["POST"])
@@ -64,10 +225,6 @@ def api_export_annotated(file_id):
     users = data.get("users", [])
     fabric_overlays = data.get("fabric_overlays", [])  # [{page, user, png: data-url}]
 
-    src = VersionStore.get_current_path(file_id)
-    if not src or not os.path.exists(src):
-        return jsonify({"error": "File not found"}), 404
-
     # Collect text overlay layers from annotation store for selected users
     layers = []
     for user in users:
@@ -79,10 +236,23 @@ def api_export_annotated(file_id):
     for fo in fabric_overlays:
         layers.append({"type": "image", "page": fo["page"], "png": fo["png"]})
 
+    with file_lock.read(file_id):
+        src = VersionStore.get_current_path(file_id)
+        if not src or not os.path.exists(src):
+            return jsonify({"error": "File not found"}), 404
+        # Exported outside the lock, from this version
+        src = VersionStore.pin(src)
+
     try:
-        out_path = PdfProcessor.apply_annotation_layers(src, layers)
+        # Fabric overlays are decoded at page size; text-only exports stay cheap
+        cost = admission.pdf_raster_cost(file_id) if fabric_overlays else admission.file_cost([src])
+        out_path = cpu_pool.run("export", PdfProcessor.apply_annotation_layers, src, layers, cost=cost)
+    except admission.Overloaded:
+        raise
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    finally:
+        os.remove(src)
 
     @after_this_request
     def _cleanup(response):
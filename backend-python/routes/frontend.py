@@ -0,0 +1,56 @@
+import os
+
+from flask import Blueprint, Response, current_app, request, url_for
+
+from models.asset_manifest import AssetManifest
+
+# Path to the frontend SPA directory (sibling of backend-python)
+FRONTEND_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "frontend"
+)
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+frontend_bp = Blueprint("frontend", __name__)
+manifest = AssetManifest(FRONTEND_DIR)
+
+
+def _respond(asset, cache_control: str):
+    if request.if_none_match and asset.etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        body, encoding = asset.variant(request.headers.get("Accept-Encoding", ""))
+        response = Response(body, mimetype=asset.mimetype)
+        if encoding:
+            response.headers["Content-Encoding"] = encoding
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers["Cache-Control"] = cache_control
+    response.set_etag(asset.etag)
+    return response
+
+
+def _serve_index():
+    asset = manifest.index(url_for("frontend.serve_index"))
+    if asset is None:
+        return "Not found", 404
+    # The HTML itself must be revalidated so clients pick up new asset hashes
+    return _respond(asset, "no-cache")
+
+
+@frontend_bp.route("/")
+def serve_index():
+    manifest.load(check_changes=current_app.debug)
+    return _serve_index()
+
+
+@frontend_bp.route("/<path:path>")
+def serve_frontend(path):
+    manifest.load(check_changes=current_app.debug)
+    asset, hashed = manifest.lookup(path)
+    if asset is not None and asset.path != "index.html":
+        return _respond(asset, IMMUTABLE if hashed else "no-cache")
+    # Only serve index.html for navigational routes, not missing assets
+    if path.endswith((".js", ".css", ".map", ".png", ".jpg", ".ico")):
+        return "Not found", 404
+    # Fallback to index.html for SPA routing (e.g. old /view/... bookmarks)
+    return _serve_index()
@@ -1,8 +1,10 @@
 import os
 
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, jsonify, request
 
+from models import file_lock
 from models.file_manager import FileManager
+from routes.file_delivery import send_stored_file
 
 image_bp = Blueprint("image", __name__)
 
@@ -10,10 +12,11 @@ image_bp = Blueprint("image", __name__)
 @image_bp.route("/api/image/<file_id>/serve")
 def serve_image(file_id):
     version = request.args.get("version", None, type=int)
-    path = FileManager.get_file_path(file_id, version)
-    if not path or not os.path.exists(path):
-        return jsonify({"error": "Not found"}), 404
-    return send_file(path)
+    with file_lock.read(file_id):
+        path = FileManager.get_file_path(file_id, version)
+        if not path or not os.path.exists(path):
+            return jsonify({"error": "Not found"}), 404
+        return send_stored_file(path)
 
 
 @image_bp.route("/api/image/<file_id>/crop", methods=["POST"])
@@ -0,0 +1,39 @@
+import time
+
+from flask import Blueprint, Response, g, request
+
+from models import metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+# Only requests routed to DocEditor itself are counted (not the host app's)
+INSTRUMENTED_BLUEPRINTS = {"files", "pdf", "image", "versions", "annotations", "search", "frontend"}
+
+
+@metrics_bp.before_app_request
+def _start_timer():
+    if request.blueprint in INSTRUMENTED_BLUEPRINTS:
+        g.metrics_start = time.perf_counter()
+
+
+@metrics_bp.after_app_request
+def _note_status(response):
+    if "metrics_start" in g:
+        g.metrics_status = response.status_code
+    return response
+
+
+@metrics_bp.teardown_app_request
+def _record_request(exc=None):
+    # Recorded at teardown, which also runs when an unhandled exception skipped
+    # the after-request hooks: no status noted means the request failed with 500
+    start = g.pop("metrics_start", None)
+    if start is not None:
+        endpoint, method = request.endpoint or "", request.method
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, method=method)
+        metrics.REQUESTS.inc(endpoint=endpoint, method=method, status=str(g.pop("metrics_status", 500)))
+
+
+@metrics_bp.route("/metrics")
+def expose():
+    return Response(metrics.expose(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,33 +1,161 @@
 import base64
 import os
-import tempfile
 
-from flask import Blueprint, jsonify, request, send_file
+from flask import Blueprint, Response, jsonify, request
 
+from models import admission, cpu_pool, file_lock
 from models.file_manager import FileManager
+from models.page_manifest import PageManifest
 from models.pdf_processor import PdfProcessor
+from models.tile_cache import TileCache
 from models.version_store import VersionStore
+from routes.file_delivery import send_stored_file
 
 pdf_bp = Blueprint("pdf", __name__)
 
 
 @pdf_bp.route("/api/pdf/<file_id>/serve")
 def serve_pdf(file_id):
-    path = VersionStore.get_current_path(file_id)
-    if not path or not os.path.exists(path):
-        return jsonify({"error": "Not found"}), 404
-    return send_file(path, mimetype="application/pdf")
+    """Current PDF; answers Range requests with 206 so pdf.js can load it in chunks.
+
+    With ``?r=<revision>`` (from the manifest) the answer is 409 once the
+    file has a newer revision, so chunks of two versions are never mixed.
+    """
+    revision = request.args.get("r", type=int)
+    with file_lock.read(file_id):
+        path = VersionStore.get_current_path(file_id)
+        if not path or not os.path.exists(path):
+            return jsonify({"error": "Not found"}), 404
+        if revision is not None:
+            current = VersionStore.get_metadata(file_id)["revision"]
+            if current != revision:
+                return jsonify({"error": "File has changed", "revision": current}), 409
+        # The file is opened now (or by the front server right after); current/
+        # is only ever replaced by rename, so either way it is complete
+        return send_stored_file(path, mimetype="application/pdf")
 
 
 @pdf_bp.route("/api/pdf/<file_id>/page-count")
 def page_count(file_id):
-    path = VersionStore.get_current_path(file_id)
-    if not path:
-        return jsonify({"error": "Not found"}), 404
-    count = PdfProcessor.get_page_count(path)
+    with file_lock.read(file_id):
+        path = VersionStore.get_current_path(file_id)
+        if not path:
+            return jsonify({"error": "Not found"}), 404
+        count = PdfProcessor.get_page_count(path)
     return jsonify({"page_count": count})
 
 
+@pdf_bp.route("/api/pdf/<file_id>/manifest")
+def page_manifest(file_id):
+    """Revision and per-page ids/hashes; clients refetch only pages with an unknown hash."""
+    with file_lock.read(file_id):
+        path = VersionStore.get_current_path(file_id)
+        if not path or not os.path.exists(path):
+            return jsonify({"error": "Not found"}), 404
+        manifest = PageManifest.get(file_id)
+        if manifest is None or not manifest["pages"]:
+            # Files from before the manifest, merge/photo-to-pdf results, failed updates
+            VersionStore.record_pages(file_id, path)
+            manifest = PageManifest.get(file_id)
+            if manifest is None:
+                return jsonify({"error": "Could not read the PDF"}), 500
+        response = jsonify(manifest)
+        response.headers["Cache-Control"] = "no-cache"
+        response.set_etag(f"{file_id}.{manifest['revision']}")
+        return response.make_conditional(request)
+
+
+@pdf_bp.route("/api/pdf/<file_id>/pages/<int:page>")
+def serve_page(file_id, page):
+    """One page as a standalone PDF, or as PNG with ``?format=png&scale=1.5``.
+
+    ``?h=<hash>`` from the manifest makes the response cacheable for good;
+    if the page no longer has that hash the answer is 409 (fetch the
+    manifest again).
+    """
+    png = request.args.get("format", "pdf") == "png"
+    try:
+        scale = float(request.args.get("scale", 1.5)) if png else None
+        if png and not 0.1 <= scale <= 8:
+            raise ValueError("scale must be between 0.1 and 8")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with file_lock.read(file_id):
+        path = VersionStore.get_current_path(file_id)
+        if not path or not os.path.exists(path):
+            return jsonify({"error": "Not found"}), 404
+        manifest = PageManifest.get(file_id)
+        if manifest is None or not 0 <= page < len(manifest["pages"]):
+            return jsonify({"error": "Page not found"}), 404
+        content_hash = manifest["pages"][page]["hash"]
+        wanted = request.args.get("h")
+        if wanted and wanted != content_hash:
+            return jsonify({"error": "Page has changed", "revision": manifest["revision"]}), 409
+        etag = f"{content_hash}.png.{scale}" if png else f"{content_hash}.pdf"
+        not_modified = request.if_none_match and etag in request.if_none_match
+        # Rendered from a pinned copy of this version: writers wait for the lookup, not the rendering
+        pinned = None if not_modified else VersionStore.pin(path)
+    if not_modified:
+        response = Response(status=304)
+    else:
+        try:
+            if png:
+                data = cpu_pool.run("page", PdfProcessor.render_page, pinned, page, scale,
+                                    cost=admission.pdf_raster_cost(file_id, scale))
+            else:
+                data = cpu_pool.run("page", PdfProcessor.extract_page, pinned, page)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except IndexError as e:
+            return jsonify({"error": str(e)}), 404
+        finally:
+            os.remove(pinned)
+        response = Response(data, mimetype="image/png" if png else "application/pdf")
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable" if wanted else "no-cache"
+    response.set_etag(etag)
+    return response
+
+
+@pdf_bp.route("/api/pdf/<file_id>/pages/<int:page>/tiles")
+def page_tiles(file_id, page):
+    """Page size in points, tile size and zoom levels (scale, columns, rows) for the tile endpoint."""
+    with file_lock.read(file_id):
+        path = VersionStore.get_current_path(file_id)
+        if not path or not os.path.exists(path):
+            return jsonify({"error": "Not found"}), 404
+        try:
+            return jsonify(TileCache.levels(path, page))
+        except IndexError as e:
+            return jsonify({"error": str(e)}), 404
+
+
+@pdf_bp.route("/api/pdf/<file_id>/pages/<int:page>/tiles/<int:zoom>/<int:x>/<int:y>")
+def page_tile(file_id, page, zoom, x, y):
+    """One PNG tile of a page; only this clip is rendered, at the scale of ``zoom``.
+
+    With ``?v=<version>`` from the levels response the tile is cacheable for
+    good (a changed file gets a new version); without it clients revalidate.
+    """
+    with file_lock.read(file_id):
+        path = VersionStore.get_current_path(file_id)
+        if not path or not os.path.exists(path):
+            return jsonify({"error": "Not found"}), 404
+        version = TileCache.version(path)
+        etag = f"{version}.{page}.{zoom}.{x}.{y}"
+        if request.if_none_match and etag in request.if_none_match:
+            response = Response(status=304)
+        else:
+            try:
+                response = Response(TileCache.get(file_id, path, page, zoom, x, y), mimetype="image/png")
+            except IndexError as e:
+                return jsonify({"error": str(e)}), 404
+        response.headers["Cache-Control"] = (
+            "public, max-age=31536000, immutable" if request.args.get("v") == version else "no-cache"
+        )
+        response.set_etag(etag)
+        return response
+
+
 @pdf_bp.route("/api/pdf/<file_id>/rotate-page", methods=["POST"])
 def rotate_page(file_id):
     data = request.get_json()
@@ -106,50 +234,49 @@ def photo_to_pdf():
         return jsonify({"error": str(e)}), 400
 
 
+@pdf_bp.route("/api/pdf/<file_id>/optimize", methods=["POST"])
+def optimize_pdf(file_id):
+    """Deduplicate, recompress and optionally downsample; reports the bytes saved."""
+    data = request.get_json() or {}
+    user = data.get("user", "anonymous")
+    try:
+        target_dpi = int(data["target_dpi"]) if data.get("target_dpi") else None
+        jpeg_quality = int(data.get("jpeg_quality", 85))
+        if target_dpi is not None and target_dpi < 36:
+            raise ValueError("target_dpi must be at least 36")
+        if not 1 <= jpeg_quality <= 95:
+            raise ValueError("jpeg_quality must be between 1 and 95")
+        report = FileManager.pdf_optimize(file_id, target_dpi, jpeg_quality, user)
+        return jsonify(report)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+
 @pdf_bp.route("/api/pdf/<file_id>/enhance-preview", methods=["POST"])
 def enhance_preview(file_id):
     """Render one page as before/after PNG without modifying the stored PDF."""
-    import fitz
-    from models.image_enhancer import ImageEnhancer
-
     data = request.get_json() or {}
     page_num = int(data.get("page", 0))
     enhance = data.get("enhance", {})
 
-    path = VersionStore.get_current_path(file_id)
-    if not path or not os.path.exists(path):
-        return jsonify({"error": "Not found"}), 404
-
-    doc = fitz.open(path)
-    if page_num >= len(doc):
-        doc.close()
-        return jsonify({"error": "Page out of range"}), 400
+    with file_lock.read(file_id):
+        path = VersionStore.get_current_path(file_id)
+        if not path or not os.path.exists(path):
+            return jsonify({"error": "Not found"}), 404
+        pinned = VersionStore.pin(path)
 
-    page = doc[page_num]
-    mat = fitz.Matrix(2, 2)
-    pix = page.get_pixmap(matrix=mat)
-    doc.close()
-
-    orig_b64 = base64.b64encode(pix.tobytes("png")).decode()
-
-    tmp = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
-    tmp.close()
     try:
-        pix.save(tmp.name)
-        enhanced_path = ImageEnhancer.enhance(
-            tmp.name,
-            deskew=enhance.get("deskew", True),
-            sharpen=enhance.get("sharpen", True),
-            contrast=enhance.get("contrast", True),
-            threshold=enhance.get("threshold", False),
+        original, enhanced = cpu_pool.run(
+            "enhance", FileManager.render_enhance_preview, pinned, page_num, enhance,
+            cost=admission.pdf_raster_cost(file_id),
         )
-        with open(enhanced_path, "rb") as f:
-            enh_b64 = base64.b64encode(f.read()).decode()
-        os.unlink(enhanced_path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     finally:
-        if os.path.exists(tmp.name):
-            os.unlink(tmp.name)
+        os.remove(pinned)
 
+    orig_b64 = base64.b64encode(original).decode()
+    enh_b64 = base64.b64encode(enhanced).decode()
     return jsonify({
         "original": f"data:image/png;base64,{orig_b64}",
         "enhanced": f"data:image/png;base64,{enh_b64}",
@@ -0,0 +1,146 @@
+"""Opt-in request profiling (only registered when DOCEDITOR_PROFILE_TOKEN is set).
+
+A request is profiled when it carries ``X-DocEditor-Profile: <token>`` or when
+the next requests of this worker process were armed via
+``POST /api/admin/profiling``. The trace id is returned in ``X-DocEditor-Trace``.
+"""
+import cProfile
+import hmac
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import Blueprint, g, jsonify, request, send_file
+
+import config
+from models import tracing
+from models.profile_store import ProfileStore
+from routes.metrics_routes import INSTRUMENTED_BLUEPRINTS
+
+PROFILE_HEADER = "X-DocEditor-Profile"
+MAX_ARMED = 100
+
+profiling_bp = Blueprint("profiling", __name__)
+
+_armed = 0
+_armed_lock = threading.Lock()
+# cProfile can only be active once per process on Python 3.12+; concurrent
+# profiled requests still get a span tree, just no .prof file
+_profiler_lock = threading.Lock()
+
+
+def _authorized() -> bool:
+    token = request.headers.get(PROFILE_HEADER, "")
+    return bool(config.PROFILE_TOKEN) and hmac.compare_digest(token, config.PROFILE_TOKEN)
+
+
+def _take_armed() -> bool:
+    global _armed
+    if not _armed:
+        return False
+    with _armed_lock:
+        if _armed <= 0:
+            return False
+        _armed -= 1
+        return True
+
+
+def _start_profiler():
+    if not _profiler_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiling tool (debugger, coverage) is active
+        _profiler_lock.release()
+        return None
+    return profiler
+
+
+def _stop(state):
+    _, trace, profiler, _ = state
+    if profiler is not None:
+        profiler.disable()
+        _profiler_lock.release()
+    tracing.stop()
+    return trace.finish()
+
+
+@profiling_bp.before_app_request
+def _begin_profile():
+    if request.blueprint not in INSTRUMENTED_BLUEPRINTS:
+        return
+    if not (PROFILE_HEADER in request.headers and _authorized()) and not _take_armed():
+        return
+    g.profile = (ProfileStore.new_id(), tracing.start(), _start_profiler(), time.time())
+
+
+@profiling_bp.after_app_request
+def _end_profile(response):
+    state = g.pop("profile", None)
+    if state is None:
+        return response
+    trace_id, _, profiler, started = state
+    spans = _stop(state)
+    meta = {
+        "method": request.method,
+        "path": request.full_path.rstrip("?"),
+        "endpoint": request.endpoint,
+        "status": response.status_code,
+        "started_at": datetime.fromtimestamp(started, timezone.utc).isoformat(),
+        "duration_ms": spans["duration_ms"],
+    }
+    ProfileStore.save(trace_id, meta, spans, profiler)
+    response.headers["X-DocEditor-Trace"] = trace_id
+    return response
+
+
+@profiling_bp.teardown_app_request
+def _abort_profile(exc=None):
+    # Only reached with state left when the response was never finalized
+    state = g.pop("profile", None)
+    if state is not None:
+        _stop(state)
+
+
+@profiling_bp.before_request
+def _require_token():
+    if not _authorized():
+        return jsonify({"error": "Forbidden"}), 403
+
+
+@profiling_bp.route("/api/admin/profiling", methods=["GET", "POST"])
+def arm_profiling():
+    """Profile the next ``requests`` requests handled by this worker process."""
+    global _armed
+    if request.method == "POST":
+        data = request.get_json(silent=True) or {}
+        try:
+            count = int(data.get("requests", 1))
+        except (TypeError, ValueError):
+            return jsonify({"error": "requests must be an integer"}), 400
+        with _armed_lock:
+            _armed = max(0, min(count, MAX_ARMED))
+    return jsonify({"armed": _armed})
+
+
+@profiling_bp.route("/api/admin/traces")
+def list_traces():
+    return jsonify(ProfileStore.list_traces())
+
+
+@profiling_bp.route("/api/admin/traces/<trace_id>")
+def get_trace(trace_id):
+    record = ProfileStore.get(trace_id)
+    if record is None:
+        return jsonify({"error": "Trace not found"}), 404
+    return jsonify(record)
+
+
+@profiling_bp.route("/api/admin/traces/<trace_id>/profile")
+def download_profile(trace_id):
+    path = ProfileStore.profile_path(trace_id)
+    if path is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_file(path, mimetype="application/octet-stream",
+                     as_attachment=True, download_name=f"{trace_id}.prof")
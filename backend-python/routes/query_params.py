@@ -0,0 +1,61 @@
+"""Helpers for list endpoints: opaque cursors, field projection, time filters."""
+import base64
+import json
+from datetime import datetime, timezone
+
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> list:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def parse_fields(value: str | None, allowed: tuple[str, ...]) -> list[str] | None:
+    """Parse ``fields=a,b`` into a list, rejecting unknown names."""
+    if not value:
+        return None
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+
+def parse_time(value: str | None) -> datetime | None:
+    """Parse an ISO 8601 timestamp; naive values are taken as UTC."""
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid timestamp: {value}")
+    try:
+        dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        raise ValueError(f"Invalid timestamp: {value}")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def page_size(value: str | None, default: int | None) -> int | None:
+    """Parse ``limit=n`` (a positive integer, capped at MAX_PAGE_SIZE)."""
+    if value is None:
+        return default
+    try:
+        size = int(value)
+    except ValueError:
+        size = 0
+    if size < 1:
+        raise ValueError(f"Invalid limit: {value}")
+    return min(size, MAX_PAGE_SIZE)
@@ -0,0 +1,21 @@
+from flask import Blueprint, jsonify, request
+
+from models.text_index import TextIndex
+from routes.query_params import page_size
+
+search_bp = Blueprint("search", __name__)
+
+MAX_RESULTS = 100
+
+
+@search_bp.route("/api/search")
+def search():
+    """Full-text search over PDF pages: best matches first, one entry per page."""
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "q must not be empty"}), 400
+    try:
+        limit = min(page_size(request.args.get("limit"), 20), MAX_RESULTS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(TextIndex.search(q, limit, file_id=request.args.get("file_id", "")))
@@ -1,13 +1,89 @@
+import os
+
 from flask import Blueprint, jsonify, request
 
 from models.audit_logger import AuditLogger
+from models.db_models import AuditLogEntry
+from models.file_manager import FileManager
+from models.version_history import VersionHistory
+from models.version_store import VersionStore
+from routes.file_delivery import send_stored_file
+from routes.query_params import decode_cursor, encode_cursor, page_size, parse_fields, parse_time
 
 version_bp = Blueprint("versions", __name__)
 
 
 @version_bp.route("/api/audit-log")
 def audit_log():
-    limit = request.args.get("limit", 100, type=int)
-    file_id = request.args.get("file_id", "")
-    entries = AuditLogger.get_log(limit, file_id)
-    return jsonify(entries)
+    """Newest ``limit`` entries (oldest first); ``X-Next-Cursor`` pages further back."""
+    try:
+        limit = page_size(request.args.get("limit"), 100)
+        fields = parse_fields(request.args.get("fields"), AuditLogEntry.FIELDS)
+        cursor = request.args.get("cursor")
+        before_id = None
+        if cursor:
+            key = decode_cursor(cursor)
+            if len(key) != 1 or not isinstance(key[0], int) or isinstance(key[0], bool):
+                raise ValueError("Invalid cursor")
+            before_id = key[0]
+        entries, next_id = AuditLogger.get_page(
+            limit,
+            file_id=request.args.get("file_id", ""),
+            user=request.args.get("user", ""),
+            action=request.args.get("action", ""),
+            since=parse_time(request.args.get("since")),
+            until=parse_time(request.args.get("until")),
+            before_id=before_id,
+            fields=fields,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify(entries)
+    if next_id is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor([next_id])
+    return response
+
+
+@version_bp.route("/api/files/<file_id>/history")
+def history(file_id):
+    """All versions, oldest (0 = original) first."""
+    if not VersionStore.get_metadata(file_id):
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(VersionHistory.versions(file_id))
+
+
+@version_bp.route("/api/files/<file_id>/history/<int:version>/download")
+def history_download(file_id, version):
+    info = VersionStore.get_metadata(file_id)
+    if not info:
+        return jsonify({"error": "Not found"}), 404
+    try:
+        path = VersionHistory.materialize(file_id, version)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    name, ext = os.path.splitext(info["original_name"])
+    return send_stored_file(path, as_attachment=True, download_name=f"{name}_v{version}{ext}")
+
+
+@version_bp.route("/api/files/<file_id>/history/<int:version>/restore", methods=["POST"])
+def history_restore(file_id, version):
+    user = (request.get_json(silent=True) or {}).get("user", "anonymous")
+    try:
+        new_version = FileManager.restore_version(file_id, version, user)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify({"ok": True, "version": new_version})
+
+
+@version_bp.route("/api/files/<file_id>/undo", methods=["POST"])
+def undo(file_id):
+    user = (request.get_json(silent=True) or {}).get("user", "anonymous")
+    try:
+        new_version = FileManager.undo(file_id, user)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify({"ok": True, "version": new_version})
@@ -4,6 +4,60 @@
     let mergeIds = [];
     let photoPdfIds = [];
 
+    // Files up to this size go in one request, larger ones in resumable chunks
+    const CHUNKED_UPLOAD_THRESHOLD = 16 * 1024 * 1024;
+
+    // Raw body upload: streamed to storage without multipart spooling
+    function uploadFile(file, onProgress) {
+        if (file.size > CHUNKED_UPLOAD_THRESHOLD) return uploadChunked(file, onProgress);
+        return fetch(API_BASE + '/api/files/upload?filename=' + encodeURIComponent(file.name), {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/octet-stream' },
+            body: file,
+        }).then(r => r.json());
+    }
+
+    // ZIP archive: every entry becomes a file, the answer lists the result per entry
+    function uploadZip(file) {
+        return fetch(API_BASE + '/api/files/upload-zip', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/zip' },
+            body: file,
+        }).then(r => r.json());
+    }
+
+    // Chunked upload; a failed chunk is retried from the offset the server reports
+    async function uploadChunked(file, onProgress) {
+        let r = await fetch(API_BASE + '/api/uploads', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ filename: file.name, size: file.size }),
+        });
+        let state = await r.json();
+        if (state.error) return state;
+        const url = API_BASE + '/api/uploads/' + state.upload_id;
+        let offset = 0;
+        let retries = 0;
+        while (true) {
+            try {
+                r = await fetch(url, {
+                    method: 'PATCH',
+                    headers: { 'Content-Type': 'application/octet-stream', 'Upload-Offset': String(offset) },
+                    body: file.slice(offset, offset + state.chunk_size),
+                });
+                const data = await r.json();
+                if (r.status === 201 || (data.error && r.status !== 409)) return data;
+                offset = data.offset;
+                retries = 0;
+            } catch (e) {
+                if (++retries > 5) throw e;
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                offset = (await (await fetch(url)).json()).offset;
+            }
+            onProgress(Math.floor(offset * 100 / file.size));
+        }
+    }
+
     window.initFileBrowser = function () {
         const fileList = document.getElementById('file-list');
         const uploadForm = document.getElementById('upload-form');
@@ -20,14 +74,21 @@
                 e.preventDefault();
                 const fileInput = document.getElementById('file-input');
                 if (!fileInput.files.length) return;
-                const fd = new FormData();
-                fd.append('file', fileInput.files[0]);
                 uploadStatus.innerHTML = '<span class="text-info">Uploading...</span>';
-                fetch(API_BASE + '/api/files/upload', { method: 'POST', body: fd })
-                    .then(r => r.json())
+                const file = fileInput.files[0];
+                const upload = file.name.toLowerCase().endsWith('.zip') ? uploadZip(file) : uploadFile(file, pct => {
+                    uploadStatus.innerHTML = `<span class="text-info">Uploading... ${pct}%</span>`;
+                });
+                upload
                     .then(data => {
                         if (data.error) {
                             uploadStatus.innerHTML = `<span class="text-danger">${data.error}</span>`;
+                        } else if (data.files) {
+                            const failed = data.files.filter(f => f.error).map(f => `${f.name}: ${f.error}`);
+                            uploadStatus.innerHTML = `<span class="${failed.length ? 'text-warning' : 'text-success'}">${data.uploaded} Dateien hochgeladen`
+                                + (failed.length ? `, ${failed.length} fehlgeschlagen</span><small class="d-block text-muted">${failed.join('<br>')}</small>` : '</span>');
+                            fileInput.value = '';
+                            loadFiles();
                         } else {
                             uploadStatus.innerHTML = '<span class="text-success">Erfolgreich!</span>';
                             fileInput.value = '';
@@ -1,6 +1,14 @@
 // PDF.js viewer (v3, classic script)
 (function () {
-    let pdfDoc = null;
+    let manifest = null;
+    // The document as first opened, fetched by byte range on demand (the
+    // server stores PDFs linearized, so page 1 renders from the first chunks),
+    // and the page number of each content hash in it
+    let fullDoc = null;
+    let fullPages = new Map();
+    // Single-page documents by content hash: after an edit only pages whose
+    // hash is in neither yet are downloaded (see /api/pdf/<id>/manifest)
+    let pageDocs = new Map();
     let currentPage = 1;
     let totalPages = 0;
     let currentScale = 1.5;
@@ -10,15 +18,66 @@
     let ctx = null;
 
     async function loadPdf() {
-        const url = API_BASE + `/api/pdf/${FILE_ID}/serve?t=${Date.now()}`;
-        pdfDoc = await pdfjsLib.getDocument(url).promise;
-        totalPages = pdfDoc.numPages;
+        const r = await fetch(API_BASE + `/api/pdf/${FILE_ID}/manifest`, { cache: 'no-cache' });
+        manifest = await r.json();
+        if (manifest.error) { alert(manifest.error); return; }
+        if (!fullDoc) {
+            // ?r= pins the revision: once the file changes the server answers
+            // 409 and the pages still missing are fetched one by one instead
+            const url = API_BASE + `/api/pdf/${FILE_ID}/serve?r=${manifest.revision}`;
+            fullDoc = pdfjsLib.getDocument({
+                url,
+                disableStream: true,
+                disableAutoFetch: true,
+                rangeChunkSize: 256 * 1024,
+            }).promise;
+            fullPages = new Map();
+            manifest.pages.forEach((p, i) => { if (!fullPages.has(p.hash)) fullPages.set(p.hash, i + 1); });
+        }
+        const hashes = new Set(manifest.pages.map(p => p.hash));
+        for (const [hash, doc] of pageDocs) {
+            if (!hashes.has(hash)) {
+                doc.then(d => d.destroy()).catch(() => {});
+                pageDocs.delete(hash);
+            }
+        }
+        totalPages = manifest.pages.length;
         if (currentPage > totalPages) currentPage = totalPages;
         await renderPage(currentPage);
     }
 
+    function getPageDoc(num) {
+        const hash = manifest.pages[num - 1].hash;
+        if (!pageDocs.has(hash)) {
+            // ?h= makes the page immutable in the HTTP cache as well
+            const url = API_BASE + `/api/pdf/${FILE_ID}/pages/${num - 1}?h=${hash}`;
+            const doc = pdfjsLib.getDocument(url).promise;
+            doc.catch(() => pageDocs.delete(hash));
+            pageDocs.set(hash, doc);
+        }
+        return pageDocs.get(hash);
+    }
+
+    function dropFullDoc() {
+        if (fullDoc) fullDoc.then(d => d.destroy()).catch(() => {});
+        fullDoc = null;
+        fullPages = new Map();
+    }
+
+    async function getPage(num) {
+        const hash = manifest.pages[num - 1].hash;
+        if (fullDoc && fullPages.has(hash) && !pageDocs.has(hash)) {
+            try {
+                return await (await fullDoc).getPage(fullPages.get(hash));
+            } catch (e) {
+                dropFullDoc();  // changed while loading (409): single pages from now on
+            }
+        }
+        return (await getPageDoc(num)).getPage(1);
+    }
+
     async function renderPage(num) {
-        const page = await pdfDoc.getPage(num);
+        const page = await getPage(num);
         const viewport = page.getViewport({ scale: currentScale });
         pdfCanvas.width = viewport.width;
         pdfCanvas.height = viewport.height;
@@ -42,7 +101,10 @@
         pdfCanvas = document.getElementById('pdf-canvas');
         ctx = pdfCanvas.getContext('2d');
         currentPage = 1;
-        pdfDoc = null;
+        manifest = null;
+        dropFullDoc();
+        for (const doc of pageDocs.values()) doc.then(d => d.destroy()).catch(() => {});
+        pageDocs = new Map();
 
         if (!listenersAttached) {
             listenersAttached = true;
@@ -78,6 +78,20 @@
   </div>
 </div>`;
 
+        // --- Version history ---
+        html += `
+<div class="card mb-2">
+  <div class="card-body py-2">
+    <div class="d-flex justify-content-between align-items-center mb-1">
+      <h6 class="card-title mb-0">Verlauf</h6>
+      <button id="undo-btn" class="btn btn-outline-secondary btn-sm py-0" title="Letzte Änderung rückgängig machen">
+        <i class="bi bi-arrow-90deg-left"></i> Rückgängig
+      </button>
+    </div>
+    <div id="history-entries" class="small" style="max-height:200px;overflow-y:auto;"></div>
+  </div>
+</div>`;
+
         // --- Audit log ---
         html += `
 <div class="card">
@@ -116,6 +130,11 @@
             });
         });
 
+        // Bind: undo
+        panel.querySelector('#undo-btn').addEventListener('click', () => {
+            historyAction(`/api/files/${FILE_ID}/undo`);
+        });
+
         if (isPdf) {
             loadAnnotationLayers(panel);
 
@@ -125,9 +144,64 @@
             });
         }
 
+        loadHistory();
         loadAudit();
     }
 
+    function historyAction(url) {
+        fetch(API_BASE + url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ user: window.ANNO_USER }),
+        }).then(r => r.json()).then(data => {
+            if (data.error) { alert(data.error); return; }
+            if (window.reloadPdf) window.reloadPdf();
+            else if (window.initImageEditor) window.initImageEditor();
+            refreshPanel();
+        });
+    }
+
+    function loadHistory() {
+        fetch(API_BASE + `/api/files/${FILE_ID}/history`)
+            .then(r => r.json())
+            .then(versions => {
+                const container = document.getElementById('history-entries');
+                if (!container || !Array.isArray(versions)) return;
+                const latest = versions.length ? versions[versions.length - 1].version : null;
+                container.innerHTML = versions.slice().reverse().map(v => {
+                    const date = new Date(v.created_at).toLocaleString('de-DE');
+                    const detail = v.restored !== undefined ? `aus v${v.restored}`
+                        : v.pages_changed ? `${v.pages_changed} Seite(n) gespeichert` : '';
+                    const restore = v.version === latest ? '' : `
+                        <button class="btn btn-outline-primary btn-sm py-0 restore-version-btn"
+                            data-version="${v.version}" title="Diese Version wiederherstellen">
+                            <i class="bi bi-arrow-counterclockwise"></i>
+                        </button>`;
+                    return `<div class="border-bottom py-1 d-flex justify-content-between align-items-start">
+                        <div>
+                            <strong>v${v.version}</strong> ${escHtml(v.action)}
+                            <span class="text-muted"> ${date}</span><br>
+                            <small>${escHtml(v.user)}${detail ? ' · ' + escHtml(detail) : ''}</small>
+                        </div>
+                        <div class="text-nowrap">
+                            <a class="btn btn-outline-secondary btn-sm py-0" title="Herunterladen" download
+                               href="${API_BASE}/api/files/${FILE_ID}/history/${v.version}/download">
+                                <i class="bi bi-download"></i>
+                            </a>${restore}
+                        </div>
+                    </div>`;
+                }).join('') || '<small class="text-muted">Noch keine Versionen</small>';
+
+                container.querySelectorAll('.restore-version-btn').forEach(btn => {
+                    btn.addEventListener('click', () => {
+                        const version = btn.dataset.version;
+                        if (!confirm(`Version ${version} wiederherstellen?`)) return;
+                        historyAction(`/api/files/${FILE_ID}/history/${version}/restore`);
+                    });
+                });
+            });
+    }
+
     function loadAnnotationLayers(panel) {
         fetch(API_BASE + `/api/files/${FILE_ID}/annotations`)
             .then(r => r.json())